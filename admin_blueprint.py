@@ -1,4 +1,5 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request, flash, current_app
+from flask import Blueprint, render_template, redirect, url_for, session, request, flash, current_app, send_from_directory, abort
+import os
 import json
 import math
 from flask import request
@@ -8,6 +9,9 @@ from routes.models import db
 from routes.models import User, Project, Admin, Engineer, CustomerService, Trainee, Role, Permission, OperationLog
 from routes.decorators import login_required, admin_required, super_admin_required, log_operation
 from routes.models import TrainingMaterial
+from routes.user_cache import invalidate_user_cache
+from routes.reference_data import get_engineers
+from routes.profiling import list_profiles, profile_summary, profiles_dir, profiling_enabled, PROFILE_SUFFIX
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -187,7 +191,7 @@ def admin_stats():
     unassigned_count = Project.query.filter(Project.assigned_engineer_id.is_(None)).count()
     
     # 获取工程师列表
-    engineers = db.session.query(Engineer).all()
+    engineers = get_engineers()
     
     # 准备图表数据
     engineer_names = []
@@ -509,6 +513,7 @@ def set_admin_permission():
                 return redirect(url_for('admin.admin_users'))
         
         db.session.commit()
+        invalidate_user_cache()
     except Exception as e:
         db.session.rollback()
         flash(f'更新失败: {str(e)}')
@@ -591,6 +596,7 @@ def remove_admin():
         db.session.add(engineer_info)
         
         db.session.commit()
+        invalidate_user_cache()
         flash('管理员已降级为工程师')
     except Exception as e:
         db.session.rollback()
@@ -641,9 +647,40 @@ def remove_engineer():
         db.session.delete(user)
         
         db.session.commit()
+        invalidate_user_cache()
         flash('工程师已移除')
     except Exception as e:
         db.session.rollback()
         flash(f'操作失败: {str(e)}')
     
     return redirect(url_for('admin.admin_users'))
+
+
+@admin_bp.route('/profiles')
+@login_required
+@admin_required
+@log_operation('访问性能分析页面')
+def profiles():
+    selected = request.args.get('name')
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        sort = 'cumulative'
+    summary = profile_summary(selected, sort=sort) if selected else None
+    return render_template('admin/profiles.html',
+                          current_user=current_user,
+                          profiles=list_profiles(),
+                          enabled=profiling_enabled(current_app.config),
+                          selected=selected,
+                          sort=sort,
+                          summary=summary)
+
+
+@admin_bp.route('/profiles/<name>/download')
+@login_required
+@admin_required
+@log_operation('下载性能分析结果')
+def download_profile(name):
+    filename = name + PROFILE_SUFFIX
+    if not os.path.isfile(os.path.join(profiles_dir(), os.path.basename(filename))):
+        abort(404)
+    return send_from_directory(profiles_dir(), filename, as_attachment=True)
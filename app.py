@@ -1,5 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g, current_app
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_wtf import CSRFProtect
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -9,113 +8,99 @@ import os
 import uuid
 import json
 import logging
-from logging.handlers import RotatingFileHandler
-from logging import Formatter
 from functools import wraps
-from routes.models import User
-import hashlib
-import subprocess
+from routes.models import User, db
+from routes.logging_setup import start_queue_logging, DailyFileHandler, console_handler
+from routes.query_stats import install_query_stats, current_query_stats
+from routes.metrics import init_metrics, render_prometheus, scrape_allowed
+from routes.profiling import init_profiling
+from routes.sqlite_tuning import init_sqlite_tuning, parse_pragmas, report_sqlite_settings
+from routes.user_cache import load_user_cached
+from routes.file_cleanup import start_cleaner
+from routes.decorators import login_required, role_required
 import sys
+import time
 
-# 初始化应用
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)  # 使用随机生成的密钥，提高安全性
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(app.instance_path, 'database.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'documents')
-app.config['VIDEO_UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'videos')
-
-# 添加测试路由以验证日志功能
-@app.route('/test/404')
-def test_404():
-    # 重定向到不存在的页面以测试404错误处理
-    return redirect(url_for('non_existent_route'))
-
-@app.route('/test/500')
-def test_500():
-    # 触发500错误以测试内部服务器错误处理
-    raise Exception("这是一个测试性的服务器错误")
-
-@app.route('/test/logging')
-def test_logging():
-    # 测试不同级别的日志记录
-    app.logger.debug("这是一条调试日志")
-    app.logger.info("这是一条信息日志")
-    app.logger.warning("这是一条警告日志")
-    app.logger.error("这是一条错误日志")
-    return "日志测试完成，请检查日志文件"
-
-# 创建测试404.html和500.html模板
-if not os.path.exists('templates/404.html'):
-    os.makedirs('templates', exist_ok=True)
-    with open('templates/404.html', 'w', encoding='utf-8') as f:
-        f.write('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>页面未找到</title>
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
-                h1 { font-size: 50px; color: #333; }
-                p { font-size: 18px; color: #666; }
-                a { color: #0066cc; text-decoration: none; }
-            </style>
-        </head>
-        <body>
-            <h1>404</h1>
-            <p>抱歉，您访问的页面不存在。</p>
-            <a href="/">返回首页</a>
-        </body>
-        </html>
-        ''')
-
-if not os.path.exists('templates/500.html'):
-    os.makedirs('templates', exist_ok=True)
-    with open('templates/500.html', 'w', encoding='utf-8') as f:
-        f.write('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>服务器错误</title>
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; padding: 50px; }
-                h1 { font-size: 50px; color: #333; }
-                p { font-size: 18px; color: #666; }
-                a { color: #0066cc; text-decoration: none; }
-            </style>
-        </head>
-        <body>
-            <h1>500</h1>
-            <p>抱歉，服务器内部发生了错误。</p>
-            <p>我们已经记录了这个错误，技术人员将尽快处理。</p>
-            <a href="/">返回首页</a>
-        </body>
-        </html>
-        ''')
-
-# 配置日志格式，添加用户名信息
-import logging
-from flask import request
-from flask_login import current_user
+# 应用通过create_app()创建，导入本模块不会创建应用、写文件或启动日志线程。
+# `from app import app`和gunicorn的`app:app`在第一次访问app属性时才创建默认应用（见文件末尾的__getattr__）。
 
-# 创建日志文件夹
-import os
 LOGS_DIR = 'logs'
-if not os.path.exists(LOGS_DIR):
-    os.makedirs(LOGS_DIR)
-
-# 配置基本日志记录到控制台
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-# 配置错误日志文件处理器
-import datetime
-log_filename = os.path.join(LOGS_DIR, f'error_log_{datetime.datetime.now().strftime("%Y%m%d")}.log')
-file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-file_handler.setLevel(logging.WARNING)  # 降低级别以捕获警告和错误
+# 访问日志格式：text为原来的单行文本，json为带耗时和SQL统计的JSON行（写入access日志记录器）
+ACCESS_LOGGER_NAME = 'access'
+
+csrf = CSRFProtect()
+
+# 初始化登录管理器
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+login_manager.login_message = '请先登录以访问此页面'
+
+# 会话状态保存在签名cookie（session_id、角色等）和数据库User.active_session_id中，
+# 不使用进程内字典，gunicorn的多个工作进程看到的是同一份状态
+
+
+def load_config(app, config=None):
+    """从环境变量读取默认配置，再用传入的config覆盖（字典或配置对象）"""
+    app.config['SECRET_KEY'] = os.urandom(24)  # 使用随机生成的密钥，提高安全性
+    # DATABASE_URL可指向其他数据库（基准测试等使用独立的数据库文件）
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(app.instance_path, 'database.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'documents')
+    app.config['VIDEO_UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'videos')
+    # 访问日志格式，见log_requests
+    app.config['ACCESS_LOG_FORMAT'] = os.environ.get('ACCESS_LOG_FORMAT', 'text')
+    # SQL慢查询阈值（秒）和每个请求的查询次数预算，见routes/query_stats.py
+    app.config['SLOW_QUERY_SECONDS'] = float(os.environ.get('SLOW_QUERY_SECONDS', '0.2'))
+    app.config['QUERY_BUDGET'] = int(os.environ.get('QUERY_BUDGET', '50'))
+    # 非调试模式下也在响应头中返回查询次数（基准测试的HTTP模式使用）
+    app.config['QUERY_STATS_HEADERS'] = os.environ.get('QUERY_STATS_HEADERS') == '1'
+    # 运行指标：各工作进程的快照目录、写入间隔和免登录访问/metrics的令牌与地址，见routes/metrics.py
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_ALLOWED_IPS'] = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+    # 请求采样分析（默认关闭），见routes/profiling.py
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+    app.config['PROFILING_ENDPOINTS'] = {name.strip() for name in os.environ.get('PROFILING_ENDPOINTS', '').split(',') if name.strip()}
+    app.config['PROFILING_USERS'] = {name.strip() for name in os.environ.get('PROFILING_USERS', '').split(',') if name.strip()}
+    app.config['PROFILING_DIR'] = os.environ.get('PROFILING_DIR')
+    app.config['PROFILING_MAX_FILES'] = int(os.environ.get('PROFILING_MAX_FILES', '200'))
+    # 每个SQLite连接建立时执行的PRAGMA（覆盖默认值），见routes/sqlite_tuning.py
+    app.config['SQLITE_PRAGMAS'] = parse_pragmas(os.environ.get('SQLITE_PRAGMAS'))
+
+    app.config['ALLOWED_EXTENSIONS'] = {'xlsx', 'xls', 'csv', 'doc', 'docx', 'pdf', 'mp4', 'avi', 'mov', 'wmv', 'md'}
+
+    # 文件大小限制设置
+    app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 全局最大限制200MB
+    app.config['MAX_VIDEO_SIZE'] = 200 * 1024 * 1024  # 视频文件最大200MB
+    app.config['MAX_ENGINEERING_SIZE'] = 50 * 1024 * 1024  # 工程文件最大50MB
+    app.config['MAX_IMAGE_SIZE'] = 10 * 1024 * 1024  # 图片文件最大10MB
+    # 文件下载卸载到前端代理：'x-accel'（Nginx）、'x-sendfile'（Apache）或留空由应用直接发送
+    app.config['FILE_OFFLOAD'] = os.environ.get('FILE_OFFLOAD', '')
+    # Nginx internal location映射，见routes/file_serving.py
+    app.config['X_ACCEL_MAPPINGS'] = {os.path.join('static', 'uploads'): '/protected_uploads/'}
+    # 视频和项目图片签名URL的密钥，多进程部署或由Nginx校验签名时需要通过环境变量统一配置
+    app.config['MEDIA_URL_SECRET'] = os.environ.get('MEDIA_URL_SECRET')
+    app.config['MEDIA_URL_TTL'] = 6 * 3600  # 签名URL有效期6小时
+    # 视频转码：安装了ffmpeg时上传后自动生成多码率MP4和HLS，可通过FFMPEG_PATH指定路径
+    app.config['VIDEO_TRANSCODE_ENABLED'] = os.environ.get('VIDEO_TRANSCODE_ENABLED', '1') != '0'
+    app.config['FFMPEG_PATH'] = os.environ.get('FFMPEG_PATH')
+    # 登录用户缓存有效期（秒），0表示每次请求都查询用户
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', '30'))
+    # 会话配置
+    app.config['SESSION_COOKIE_HTTPONLY'] = True  # 防止JavaScript访问cookie
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # 防止跨站请求伪造
+    # 使用固定的session cookie名称
+    app.config['SESSION_COOKIE_NAME'] = 'training_system_session'
+    # 添加自定义会话ID支持
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 会话有效期1小时
+
+    if config is not None:
+        if isinstance(config, dict):
+            app.config.from_mapping(config)
+        else:
+            app.config.from_object(config)
+
 
 # 创建一个更加健壮的格式化器，处理可能缺失的字段
 class SafeFormatter(logging.Formatter):
@@ -128,29 +113,31 @@ class SafeFormatter(logging.Formatter):
         record.error_details = getattr(record, 'error_details', 'N/A')
         return super().format(record)
 
-file_formatter = SafeFormatter(
-    '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s\n' +
-    'Request: %(request)s\nUser: %(user)s\nIP: %(ip)s\nSession: %(session)s\nError Details: %(error_details)s\n' +
-    '-'*80
-)
-file_handler.setFormatter(file_formatter)
-
-# 移除可能存在的旧处理器，避免重复
-root_logger = logging.getLogger()
-for handler in list(root_logger.handlers):
-    if isinstance(handler, logging.FileHandler):
-        root_logger.removeHandler(handler)
-
-# 添加新的文件处理器
-root_logger.addHandler(file_handler)
-# 设置根日志记录器的级别
-root_logger.setLevel(logging.INFO)
-
-# 添加服务器启动日志
-app.logger.info("正在初始化日志系统...")
+def exclude_access_log(record):
+    """访问日志只写入访问日志文件，不进入控制台和错误日志"""
+    return record.name != ACCESS_LOGGER_NAME
+
+def create_log_handlers():
+    """实际写入日志的处理器：控制台输出INFO及以上，错误日志文件记录WARNING及以上"""
+    # 错误日志按天切换，文件名带进程号：logs/error_log_<日期>_<进程号>.log
+    file_handler = DailyFileHandler(LOGS_DIR, 'error_log')
+    file_handler.setLevel(logging.WARNING)  # 降低级别以捕获警告和错误
+    file_handler.setFormatter(SafeFormatter(
+        '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s\n' +
+        'Request: %(request)s\nUser: %(user)s\nIP: %(ip)s\nSession: %(session)s\nError Details: %(error_details)s\n' +
+        '-'*80
+    ))
+    file_handler.addFilter(exclude_access_log)
+    console = console_handler()
+    console.addFilter(exclude_access_log)
+    # 结构化访问日志（ACCESS_LOG_FORMAT=json时写入）：logs/access_log_<日期>_<进程号>.log，每行一个JSON
+    access_handler = DailyFileHandler(LOGS_DIR, 'access_log')
+    access_handler.addFilter(logging.Filter(ACCESS_LOGGER_NAME))
+    access_handler.setFormatter(logging.Formatter('%(message)s'))
+    return [console, file_handler, access_handler]
 
 # 创建一个增强的请求日志装饰器，包含异常捕获
-def log_requests():
+def log_requests(app):
     @app.after_request
     def after_request(response):
         # 跳过静态文件
@@ -169,33 +156,47 @@ def log_requests():
         except Exception as e:
             app.logger.error(f"获取用户名时出错: {str(e)}")
         
-        # 记录请求信息
-        log_message = f"{ip} - {username} - {request.method} {request.path} - {response.status_code}"
-        
         # 根据响应状态码决定日志级别
         if response.status_code >= 500:
-            app.logger.error(log_message)
+            level = logging.ERROR
         elif response.status_code >= 400:
-            app.logger.warning(log_message)
+            level = logging.WARNING
         else:
-            app.logger.info(log_message)
+            level = logging.INFO
+        
+        if app.config.get('ACCESS_LOG_FORMAT') == 'json':
+            # 结构化访问日志，用于按接口统计耗时和发现N+1查询
+            started = g.get('_request_started')
+            query_count, query_seconds = current_query_stats()
+            record = {
+                'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+                'ip': ip,
+                'user': username,
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2) if started else None,
+                'sql_ms': round(query_seconds * 1000, 2),
+                'sql_count': query_count,
+                'bytes': response.content_length,
+            }
+            logging.getLogger(ACCESS_LOGGER_NAME).log(level, json.dumps(record, ensure_ascii=False))
+        else:
+            # 记录请求信息
+            app.logger.log(level, f"{ip} - {username} - {request.method} {request.path} - {response.status_code}")
             
         return response
     
-    # 添加请求前处理，捕获全局异常
+    # 添加请求前处理，记录请求开始时间
     @app.before_request
     def before_request():
-        # 可以在这里添加请求前的额外处理
-        pass
+        g._request_started = time.perf_counter()
     
     # 添加teardown_appcontext处理函数，确保即使请求失败也能记录异常
     @app.teardown_request
     def teardown_request(exception):
         if exception:
-            # 获取详细的异常信息
-            import traceback
-            error_trace = traceback.format_exc()
-            
             # 获取请求信息
             try:
                 request_info = f"{request.method} {request.path} {request.query_string.decode('utf-8')}"
@@ -214,164 +215,22 @@ def log_requests():
             # 获取IP地址
             ip = request.remote_addr if request else "Unknown IP"
             
-            # 获取会话信息
-            session_info = str(dict(session)) if 'session' in locals() else "No session"
-            
-            # 记录异常到日志文件
+            # 记录异常到日志文件，异常堆栈由日志写入线程格式化
             logger = logging.getLogger()
             extra_info = {
                 'request': request_info,
                 'user': username,
                 'ip': ip,
-                'session': session_info,
-                'error_details': error_trace
-            }
-            logger.error(f"请求处理异常: {str(exception)}", extra=extra_info)
-
-# 应用装饰器
-log_requests()
-app.logger.info("日志系统初始化完成，已应用请求日志装饰器")
-
-# 自定义错误处理函数 - 404 错误处理
-@app.errorhandler(404)
-def page_not_found(error):
-    # 获取请求信息
-    try:
-        request_info = f"{request.method} {request.path} {request.query_string.decode('utf-8')}"
-    except Exception:
-        request_info = f"{request.method} {request.path}"
-    
-    # 获取用户信息
-    user_info = 'anonymous'
-    try:
-        if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-            if hasattr(current_user, 'username'):
-                user_info = current_user.username
-    except Exception:
-        pass
-    
-    # 获取IP地址
-    ip_address = request.remote_addr
-    
-    # 获取会话信息
-    try:
-        session_info = str(dict(session))
-    except Exception:
-        session_info = "无法获取会话信息"
-    
-    # 记录详细的404错误信息到日志文件
-    logger = logging.getLogger()
-    # 使用更简单的方式记录，确保信息被写入
-    logger.warning(
-        f"页面未找到 (404): {request.path} | IP: {ip_address} | 用户: {user_info} | 请求: {request_info}"
-    )
-    
-    # 同时使用extra参数记录详细信息
-    try:
-        logger.error(
-            f"页面未找到 (404): {request.path}",
-            extra={
-                'request': request_info,
-                'user': user_info,
-                'ip': ip_address,
-                'session': session_info,
-                'error_details': str(error)
+                'session': session.get('session_id', 'No session'),
+                'error_details': repr(exception)
             }
-        )
-    except Exception as log_error:
-        # 如果extra方式失败，至少用普通方式记录
-        logger.error(f"记录404详细日志失败: {str(log_error)}")
-    
-    # 返回404页面
-    return render_template('404.html'), 404
-
-# 自定义错误处理函数 - 500 错误处理
-@app.errorhandler(500)
-def internal_server_error(error):
-    # 获取请求信息
-    try:
-        request_info = f"{request.method} {request.path} {request.query_string.decode('utf-8')}"
-    except Exception:
-        request_info = f"{request.method} {request.path}"
-    
-    # 获取用户信息
-    user_info = 'anonymous'
-    try:
-        if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-            if hasattr(current_user, 'username'):
-                user_info = current_user.username
-    except Exception:
-        pass
-    
-    # 获取IP地址
-    ip_address = request.remote_addr
-    
-    # 获取会话信息
-    try:
-        session_info = str(dict(session))
-    except Exception:
-        session_info = "无法获取会话信息"
-    
-    # 获取错误堆栈
-    import traceback
-    try:
-        error_trace = traceback.format_exc()
-    except Exception:
-        error_trace = str(error)
-    
-    # 记录详细的500错误信息到日志文件
-    logger = logging.getLogger()
-    
-    # 先使用简单方式记录，确保信息被写入
-    logger.error(
-        f"服务器内部错误 (500): {str(error)} | IP: {ip_address} | 用户: {user_info} | 请求: {request_info}"
-    )
-    
-    # 然后尝试使用extra参数记录详细信息
-    try:
-        logger.error(
-            f"服务器内部错误 (500): {str(error)}",
-            extra={
-                'request': request_info,
-                'user': user_info,
-                'ip': ip_address,
-                'session': session_info,
-                'error_details': error_trace
-            }
-        )
-    except Exception as log_error:
-        # 如果extra方式失败，至少记录堆栈信息
-        logger.error(f"记录500详细日志失败: {str(log_error)}")
-        logger.error(f"错误堆栈: {error_trace}")
-    
-    # 返回500页面
-    return render_template('500.html'), 500
-
-app.config['ALLOWED_EXTENSIONS'] = {'xlsx', 'xls', 'csv', 'doc', 'docx', 'pdf', 'mp4', 'avi', 'mov', 'wmv', 'md'}
-
-# 文件大小限制设置
-app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 全局最大限制200MB
-app.config['MAX_VIDEO_SIZE'] = 200 * 1024 * 1024  # 视频文件最大200MB
-app.config['MAX_ENGINEERING_SIZE'] = 50 * 1024 * 1024  # 工程文件最大50MB
-app.config['MAX_IMAGE_SIZE'] = 10 * 1024 * 1024  # 图片文件最大10MB
-# 会话配置
-app.config['SESSION_COOKIE_HTTPONLY'] = True  # 防止JavaScript访问cookie
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # 防止跨站请求伪造
-# 使用固定的session cookie名称
-app.config['SESSION_COOKIE_NAME'] = 'training_system_session'
-# 添加自定义会话ID支持
-app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 会话有效期1小时
-
-csrf = CSRFProtect(app)
-
-# 存储活跃会话的字典
-active_sessions = {}
+            logger.error("请求处理异常: %s", exception, extra=extra_info,
+                         exc_info=(type(exception), exception, exception.__traceback__))
 
 # 请求前处理器 - 实现会话隔离和登录互斥
-@app.before_request
 def manage_session():
     # 跳过静态文件请求、强制登出路由、登录和注册路由
-    skip_routes = ['/static/', '/force_logout', '/login', '/register']
+    skip_routes = ['/static/', '/force_logout', '/login', '/register', '/metrics']
     if any(request.path.startswith(route) for route in skip_routes):
         return
     
@@ -404,46 +263,30 @@ def manage_session():
     
     # 如果URL或表单中有session_id且与当前session不同，才进行会话恢复
     if session_id and session_id != current_session_id:
-        # 检查是否有这个会话ID的活跃会话
-        if session_id in active_sessions:
-            # 检查会话是否有效
-            if active_sessions[session_id].get('is_valid', True):
-                # 恢复会话信息
-                session_info = active_sessions[session_id]
-                # 验证用户是否仍然有效
-                user = User.query.get(session_info.get('user_id'))
-                if user:
-                    # 检查用户的活跃会话ID是否与当前会话匹配（登录互斥检查）
-                    if user.active_session_id != session_id:
-                        # 如果不匹配，说明用户在其他地方登录了
-                        return redirect(url_for('auth.force_logout'))
-                    
-                    # 确保当前会话与这个用户关联
-                    if current_user.is_authenticated and current_user.id != user.id:
-                        # 如果当前用户与会话用户不匹配，重新登录
-                        login_user(user)
-                    session['session_id'] = session_id
-                    session['user_id'] = user.id
-                    session['role_level'] = session_info.get('role_level')
-                    session['role_detail'] = session_info.get('role_detail')
-                    g.current_session_id = session_id
-            else:
-                # 会话已无效，重定向到登录页
-                flash('您的会话已失效，请重新登录')
-                return redirect(url_for('auth.logout'))
+        # 只有仍是某个用户当前活跃会话的ID才能恢复，已被新登录替换的会话ID查不到用户
+        user = User.query.filter_by(active_session_id=session_id).first()
+        if user:
+            # 确保当前会话与这个用户关联
+            if current_user.is_authenticated and current_user.id != user.id:
+                # 如果当前用户与会话用户不匹配，重新登录
+                login_user(user)
+            session['session_id'] = session_id
+            session['user_id'] = user.id
+            session['role_level'] = user.role_level
+            session['role_detail'] = user.role_detail or ''
+            g.current_session_id = session_id
+            current_session_id = session_id
     
-    # 如果用户已认证但会话ID不存在或不匹配，重新创建会话
-    if current_user.is_authenticated and (not current_session_id or current_session_id not in active_sessions):
+    # 如果用户已认证但会话中没有会话ID，创建会话
+    if current_user.is_authenticated and not current_session_id:
         # 生成新的会话ID
         new_session_id = str(uuid.uuid4())[:8]
         # 更新用户的活跃会话ID
         try:
             current_user.active_session_id = new_session_id
-            from routes.models import db
             db.session.commit()
         except Exception as e:
-            if hasattr(app, 'logger'):
-                app.logger.error(f"更新用户active_session_id失败: {str(e)}")
+            current_app.logger.error(f"更新用户active_session_id失败: {str(e)}")
         # 设置会话参数
         session['session_id'] = new_session_id
         session['user_id'] = current_user.id
@@ -458,33 +301,24 @@ def manage_session():
         # 获取用户信息
         user = current_user
         
-        # 优化会话验证逻辑：确保用户的active_session_id与会话ID匹配
-        if user.active_session_id != current_session_id:
-            # 更新用户的active_session_id以匹配当前会话
+        # 登录互斥检查：数据库中记录的是最近一次登录的会话ID，不一致说明用户在其他地方登录了
+        if user.active_session_id and user.active_session_id != current_session_id:
+            return redirect(url_for('auth.force_logout'))
+        if not user.active_session_id:
+            # 活跃会话ID已被清除（如管理员重置账号），由当前会话重新占用
             try:
                 user.active_session_id = current_session_id
-                from routes.models import db
                 db.session.commit()
             except Exception as e:
                 # 如果更新失败，记录错误但不强制登出
-                if hasattr(app, 'logger'):
-                    app.logger.error(f"更新用户active_session_id失败: {str(e)}")
+                current_app.logger.error(f"更新用户active_session_id失败: {str(e)}")
         
-        # 更新活跃会话信息
-        active_sessions[current_session_id] = {
-            'user_id': current_user.id,
-            'role_level': session.get('role_level'),
-            'role_detail': session.get('role_detail'),
-            'last_activity': request.url,
-            'is_valid': True  # 标记会话为有效
-        }
         g.current_session_id = current_session_id
     # 设置默认值，避免模板中出现None
     if not hasattr(g, 'current_session_id'):
         g.current_session_id = None
 
 # 响应后处理器 - 跟踪重定向次数和历史
-@app.after_request
 def track_redirects(response):
     # 检查是否是重定向响应
     if response.status_code in (301, 302, 303, 307, 308):
@@ -500,43 +334,18 @@ def track_redirects(response):
     return response
 
 # 添加Jinja2上下文处理器，确保在所有模板中都能访问session_id
-@app.context_processor
 def inject_session_id():
     # 只在有有效会话时提供session_id，避免在未登录状态下注入
     if current_user.is_authenticated and hasattr(g, 'current_session_id'):
         return dict(current_session_id=g.current_session_id)
     return dict(current_session_id=None)
 
-# 确保实例文件夹存在
-os.makedirs(app.instance_path, exist_ok=True)
-# 确保上传文件夹存在
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# 初始化数据库
-from routes.models import db
-from sqlalchemy import text
-db.init_app(app)
-
-# 初始化登录管理器
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = '请先登录以访问此页面'
-
-# 优化SQLite数据库配置
-def configure_sqlite_optimizations():
-    with app.app_context():
-        # 启用外键约束
-        db.session.execute(text('PRAGMA foreign_keys = ON'))
-        # 启用WAL日志模式
-        db.session.execute(text('PRAGMA journal_mode = WAL'))
-        # 设置同步级别为NORMAL
-        db.session.execute(text('PRAGMA synchronous = NORMAL'))
-        # 使用内存临时存储
-        db.session.execute(text('PRAGMA temp_store = MEMORY'))
-        # 设置缓存大小（约64MB）
-        db.session.execute(text('PRAGMA cache_size = -8000'))
-        db.session.commit()
+# 用户加载回调
+@login_manager.user_loader
+def load_user(user_id):
+    # 同时加载角色资料，本次请求中的归属判断直接使用缓存（见routes/profiles.py）；
+    # 用户和角色资料的快照在进程内短期缓存（见routes/user_cache.py）
+    return load_user_cached(int(user_id))
 
 # 记录操作日志
 def log_operation(username, operation, module, success=True, params=None, result=None):
@@ -563,81 +372,182 @@ from routes.decorators import permission_required as decorators_permission_requi
 # 重命名为本地使用
 permission_required = decorators_permission_required
 
-# 用户加载回调
-from routes.models import User
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-from routes.auth import auth_bp
-from routes.user import user_bp
-
-# from routes.project import project_bp  # 注释掉project_bp以避免与project_management_bp冲突
-from routes.video import video_bp
-from admin_blueprint import admin_bp
-from routes.training import training_bp
-from routes.project_management import project_management_bp
-from routes.document_viewer import document_viewer_bp
-from routes.models import TrainingMaterial
-from routes.decorators import login_required, role_required
-
-# 注册蓝图，确保不会有冲突
-app.register_blueprint(auth_bp)
-app.register_blueprint(user_bp)
-# app.register_blueprint(project_bp)  # 注释掉project_bp以避免与project_management_bp冲突
-app.register_blueprint(video_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(training_bp, url_prefix='/training')
-app.register_blueprint(project_management_bp, url_prefix='/project_management')
-app.register_blueprint(document_viewer_bp)
-# app.register_blueprint(project_management_bp, url_prefix='/projects')  # 暂时注释，避免路由冲突
-
-# 根路由重定向 - 修复侧边栏/profile链接问题
-@app.route('/profile')
-def root_profile_redirect():
-    return redirect(url_for('user.update_profile'))
-
-# 修复管理员页面项目管理相关路由404错误
-@app.route('/projects/management')
-@login_required
-def projects_management_redirect():
-    return redirect(url_for('project_management.projects_list'))
-
-# 修复添加项目页面路由404错误
-@app.route('/projects/add')
-@login_required
-def projects_add_redirect():
-    return redirect(url_for('project_management.add_project'))
-
-# 修复编辑项目页面路由404错误
-@app.route('/projects/edit/<int:project_id>')
-@login_required
-def projects_edit_redirect(project_id):
-    return redirect(url_for('project_management.edit_project', project_id=project_id))
-
-# 错误处理
-@app.errorhandler(404)
-def page_not_found(e):
-    return render_template('404.html'), 404
-
-@app.errorhandler(500)
-def internal_server_error(e):
-    return render_template('500.html'), 500
-
-# 添加处理/@vite/client的路由
-@app.route('/@vite/client')
-def vite_client():
-    return '', 204  # 返回空响应
-
-# 主页路由
-@app.route('/')
-def index():
-    return redirect(url_for('auth.login'))
-
-# 布尔值修复测试路由
-@app.route('/test_boolean_fix')
-def test_boolean_fix():
-    return render_template('test_boolean_fix.html')
+def register_routes(app):
+    """应用级路由：兼容旧链接的重定向、/metrics、错误页和测试路由"""
+    # 添加测试路由以验证日志功能
+    @app.route('/test/404')
+    def test_404():
+        # 重定向到不存在的页面以测试404错误处理
+        return redirect(url_for('non_existent_route'))
+
+    @app.route('/test/500')
+    def test_500():
+        # 触发500错误以测试内部服务器错误处理
+        raise Exception("这是一个测试性的服务器错误")
+
+    @app.route('/test/logging')
+    def test_logging():
+        # 测试不同级别的日志记录
+        app.logger.debug("这是一条调试日志")
+        app.logger.info("这是一条信息日志")
+        app.logger.warning("这是一条警告日志")
+        app.logger.error("这是一条错误日志")
+        return "日志测试完成，请检查日志文件"
+
+    # 根路由重定向 - 修复侧边栏/profile链接问题
+    @app.route('/profile')
+    def root_profile_redirect():
+        return redirect(url_for('user.update_profile'))
+
+    # 修复管理员页面项目管理相关路由404错误
+    @app.route('/projects/management')
+    @login_required
+    def projects_management_redirect():
+        return redirect(url_for('project_management.projects_list'))
+
+    # 修复添加项目页面路由404错误
+    @app.route('/projects/add')
+    @login_required
+    def projects_add_redirect():
+        return redirect(url_for('project_management.add_project'))
+
+    # 修复编辑项目页面路由404错误
+    @app.route('/projects/edit/<int:project_id>')
+    @login_required
+    def projects_edit_redirect(project_id):
+        return redirect(url_for('project_management.edit_project', project_id=project_id))
+
+    # Prometheus抓取接口：带令牌或直接来自允许的地址时访问，其他请求需要管理员登录
+    @app.route('/metrics')
+    def metrics():
+        is_admin = current_user.is_authenticated and current_user.role in ['admin', 'super_admin']
+        if not scrape_allowed(app.config) and not is_admin:
+            return '', 403
+        return app.response_class(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8',
+                                  headers={'Cache-Control': 'no-store'})
+
+    # 错误处理
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return render_template('404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_server_error(e):
+        return render_template('500.html'), 500
+
+    # 添加处理/@vite/client的路由
+    @app.route('/@vite/client')
+    def vite_client():
+        return '', 204  # 返回空响应
+
+    # 主页路由
+    @app.route('/')
+    def index():
+        return redirect(url_for('auth.login'))
+
+    # 布尔值修复测试路由
+    @app.route('/test_boolean_fix')
+    def test_boolean_fix():
+        return render_template('test_boolean_fix.html')
+
+def create_app(config=None):
+    """
+    创建应用
+
+    Args:
+        config: 覆盖默认配置的字典或配置对象，如 {'SQLALCHEMY_DATABASE_URI': ...}
+
+    Returns:
+        Flask: 配置好数据库、蓝图和请求钩子的应用
+    """
+    app = Flask(__name__)
+    load_config(app, config)
+
+    # 根日志记录器只挂队列处理器，控制台和文件由后台线程写入（见routes/logging_setup.py），
+    # 日志目录由DailyFileHandler在第一次写入时创建
+    start_queue_logging(create_log_handlers, level=logging.INFO)
+
+    # 添加服务器启动日志
+    app.logger.info("正在初始化日志系统...")
+
+    # 应用装饰器
+    init_profiling(app)
+    install_query_stats(app)
+    init_metrics(app)
+    log_requests(app)
+    app.logger.info("日志系统初始化完成，已应用请求日志装饰器")
+
+    csrf.init_app(app)
+
+    # 请求前处理器 - 实现会话隔离和登录互斥
+    app.before_request(manage_session)
+    # 响应后处理器 - 跟踪重定向次数和历史
+    app.after_request(track_redirects)
+    # 添加Jinja2上下文处理器，确保在所有模板中都能访问session_id
+    app.context_processor(inject_session_id)
+
+    # 初始化数据库
+    db.init_app(app)
+    init_sqlite_tuning(app)
+
+    # 注册项目变更历史的flush事件监听
+    from routes.history import register_history_listeners
+    register_history_listeners()
+
+    login_manager.init_app(app)
+
+    from routes.auth import auth_bp
+    from routes.user import user_bp
+    # from routes.project import project_bp  # 注释掉project_bp以避免与project_management_bp冲突
+    from routes.video import video_bp
+    from admin_blueprint import admin_bp
+    from routes.training import training_bp
+    from routes.project_management import project_management_bp
+    from routes.document_viewer import document_viewer_bp
+
+    # 注册蓝图，确保不会有冲突
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(user_bp)
+    # app.register_blueprint(project_bp)  # 注释掉project_bp以避免与project_management_bp冲突
+    app.register_blueprint(video_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(training_bp, url_prefix='/training')
+    app.register_blueprint(project_management_bp, url_prefix='/project_management')
+    app.register_blueprint(document_viewer_bp)
+    # app.register_blueprint(project_management_bp, url_prefix='/projects')  # 暂时注释，避免路由冲突
+
+    # 确保实例文件夹和上传文件夹存在（各蓝图模块导入时不再创建目录）
+    from routes.project_management import PROJECTS_DIR
+    os.makedirs(app.instance_path, exist_ok=True)
+    for folder in (app.config['UPLOAD_FOLDER'], app.config['VIDEO_UPLOAD_FOLDER'], PROJECTS_DIR):
+        os.makedirs(folder, exist_ok=True)
+    if not os.access(app.config['VIDEO_UPLOAD_FOLDER'], os.W_OK):
+        app.logger.warning(f"视频上传目录没有写入权限: {app.config['VIDEO_UPLOAD_FOLDER']}")
+
+    # 签名媒体URL在WSGI层直接处理，不经过会话管理和请求日志
+    from routes.signed_media import SignedMediaMiddleware, signed_media_url, media_url_for_path, check_media_secret
+    check_media_secret(app)
+    app.wsgi_app = SignedMediaMiddleware(app.wsgi_app, app)
+    from routes.transcode import video_sources
+    from routes.thumbnails import thumbnail_url
+    app.jinja_env.globals.update(media_url=signed_media_url, media_path_url=media_url_for_path, video_sources=video_sources,
+                                 thumbnail_url=thumbnail_url)
+
+    register_routes(app)
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    """模块属性app：第一次访问时用默认配置创建，供`from app import app`和gunicorn的app:app使用"""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 注意：/training_materials路由已移至routes/user.py中实现
 # 此处删除直接路由定义，避免与user_bp中的路由冲突
@@ -645,80 +555,22 @@ def test_boolean_fix():
 # 推荐设置为局域网中计算机的固定IP地址
 FIXED_HOST = '0.0.0.0'  # 监听所有网络接口
 
-def kill_process_using_port(port):
-    try:
-        # 在Windows上使用netstat命令查找占用端口的进程
-        import os
-        
-        # 检查操作系统类型
-        if os.name == 'nt':  # Windows系统
-            # 使用netstat命令查找占用端口的进程
-            result = subprocess.run(
-                ['netstat', '-ano', f'|findstr :{port}'],
-                shell=True,
-                capture_output=True,
-                text=True
-            )
-            
-            # 解析输出，找到PID
-            if result.stdout:
-                # 提取最后一列作为PID
-                lines = result.stdout.strip().split('\n')
-                for line in lines:
-                    if line.strip():
-                        parts = line.strip().split()
-                        if len(parts) >= 5:
-                            pid = parts[-1]
-                            print(f"检测到占用端口 {port} 的进程，PID: {pid}")
-                            
-                            # 在Windows上终止进程
-                            kill_result = subprocess.run(
-                                ['taskkill', '/F', '/PID', pid],
-                                capture_output=True,
-                                text=True
-                            )
-                            if kill_result.returncode == 0:
-                                print(f"成功: 已终止 PID 为 {pid} 的进程")
-                                print(f"已终止进程PID: {pid}")
-                                return True
-                            else:
-                                print(f"无法终止进程 PID {pid}: {kill_result.stderr}")
-        else:  # Unix/Linux系统
-            # 原始的lsof实现
-            try:
-                result = subprocess.run(
-                    ['lsof', '-i', f':{port}'],
-                    capture_output=True,
-                    text=True
-                )
-                
-                for line in result.stdout.splitlines()[1:]:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        pid = parts[1]
-                        print(f"检测到占用端口 {port} 的进程，PID: {pid}")
-                        subprocess.run(['kill', '-9', pid], capture_output=True, text=True)
-                        print(f"已终止进程 PID: {pid}")
-                        return True
-            except FileNotFoundError:
-                print("警告: 未找到lsof命令，无法检查端口占用")
-                
-    except Exception as e:
-        print(f"检查或关闭占用端口的进程时出错: {str(e)}")
-    
-    return False
-
 if __name__ == '__main__':
-    # 检查并关闭占用5001端口的进程
-    print("检查是否有其他实例占用端口 5001...")
-    kill_process_using_port(5001)
-    
+    # 开发服务器，仅供本机调试；生产环境使用gunicorn（gunicorn -c gunicorn.conf.py wsgi:app，或 python tools/start_server.py）
+    # 以模块名app导入，与其他模块使用同一份模块级对象（csrf、login_manager），而不是__main__中的另一份
+    import app as app_module
+    app = app_module.create_app()
+
     # 在应用启动时创建数据库表
     with app.app_context():
         db.create_all()
-        # 配置SQLite优化参数
-        configure_sqlite_optimizations()
     
+    # 记录实际生效的SQLite连接参数
+    report_sqlite_settings(app)
+
+    # 处理上次运行遗留的文件清理记录（gunicorn下由post_fork在每个工作进程中启动）
+    start_cleaner(app)
+
     # 使用固定IP地址启动服务器
     print(f"服务器启动在固定IP地址: http://{FIXED_HOST}:5001")
-    app.run(debug=False, host=FIXED_HOST, port=5001)
\ No newline at end of file
+    app.run(debug=False, host=FIXED_HOST, port=5001)
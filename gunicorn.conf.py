@@ -0,0 +1,98 @@
+"""
+gunicorn配置
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+常用参数可通过环境变量调整:
+  GUNICORN_BIND: 监听地址，默认0.0.0.0:5001
+  WEB_CONCURRENCY: 工作进程数，默认CPU核数但不超过4。WAL模式下读取可以并行，写入仍然排队，
+    进程再多只会增加锁等待；登录状态保存在cookie和数据库中，请求落到哪个进程都一样
+  GUNICORN_THREADS: 每个工作进程的线程数，默认4
+  GUNICORN_MAX_REQUESTS: 工作进程处理多少个请求后重启，0表示不重启，默认1000。
+    视频转码队列在工作进程内存中，重启时未完成的任务会中断（ffmpeg随进程结束），退出时记录在日志中，
+    运行 python scripts/transcode_videos.py 补做；经常上传视频时可以设为0
+  GUNICORN_TIMEOUT: 工作进程心跳超时（秒），默认30。gthread工作进程的主循环在请求线程之外定期发送心跳，
+    单个请求（包括大文件上传）耗时再长也不会触发；只有整个进程卡住超过该时间才会被主进程结束并重启。
+    上传耗时由nginx的client_body_timeout等设置限制
+
+重新加载:
+  kill -HUP <主进程>   逐个替换工作进程。开启了preload_app，新工作进程仍使用主进程已加载的代码，只适用于刷新连接和内存
+  kill -USR2 <主进程>  启动加载新代码的主进程，确认新进程正常后对旧主进程发送 kill -QUIT 完成无中断更新
+  kill -TERM <主进程>  等待正在处理的请求完成（最多graceful_timeout秒）后退出
+"""
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+# 请求大多在等待SQLite和文件IO，多线程工作进程可以用较少的进程处理并发请求
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# 主进程先加载应用再fork，工作进程启动快并共享只读内存
+preload_app = True
+
+# 定期重启工作进程，限制内存增长；加随机抖动避免所有进程同时重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# 心跳文件放在内存文件系统中，避免磁盘繁忙时工作进程被误判为超时
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# 访问日志由应用自己记录（见app.py的log_requests），gunicorn只输出自身的错误日志
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def _app():
+    import wsgi
+    return wsgi.app
+
+
+def when_ready(server):
+    server.log.info(f"服务已启动: {bind}，{workers} 个工作进程 x {threads} 个线程")
+
+
+def post_fork(server, worker):
+    """
+    工作进程不能使用fork前创建的数据库连接，丢弃连接池（不关闭父进程的连接）；
+    启动后台文件清理线程，继续处理之前的进程未完成的清理记录
+    """
+    from routes.models import db
+    from routes.file_cleanup import start_cleaner
+    app = _app()
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_cleaner(app)
+
+
+def on_reload(server):
+    server.log.info("收到HUP信号，正在逐个替换工作进程")
+
+
+def worker_exit(server, worker):
+    """工作进程退出前写出运行指标的最终快照，记录未完成的转码任务，并写完队列中剩余的日志"""
+    from routes.metrics import flush
+    from routes.logging_setup import stop_queue_logging
+    from routes.transcode import unfinished_jobs
+    jobs = unfinished_jobs()
+    if jobs:
+        server.log.warning(f"工作进程 {worker.pid} 退出时有 {len(jobs)} 个视频未处理完: {', '.join(jobs)}，"
+                           f"请运行 python scripts/transcode_videos.py 补做")
+    try:
+        with _app().app_context():
+            flush(force=True)
+    except Exception as e:
+        server.log.warning(f"写入运行指标失败: {str(e)}")
+    stop_queue_logging()
+
+
+def on_exit(server):
+    from routes.logging_setup import stop_queue_logging
+    stop_queue_logging()
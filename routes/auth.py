@@ -53,17 +53,7 @@ def login():
             # 生成唯一会话ID
             session_id = str(uuid.uuid4())[:8]
             
-            # 检查用户是否已有活跃会话（登录互斥逻辑）
-            old_session_id = user.active_session_id
-            if old_session_id:
-                # 从app模块导入active_sessions字典
-                from app import active_sessions
-                # 标记旧会话为无效（可以选择删除或标记为无效）
-                if old_session_id in active_sessions:
-                    active_sessions[old_session_id]['is_valid'] = False
-                # 移除多设备登录提示，保持静默处理
-            
-            # 更新用户的活跃会话ID
+            # 更新用户的活跃会话ID（登录互斥逻辑）：旧会话的下一个请求发现ID不一致后被强制登出，保持静默处理
             user.active_session_id = session_id
             db.session.commit()
             
@@ -181,21 +171,17 @@ def force_logout():
     # 记录强制登出前的用户名
     username = current_user.username if current_user.is_authenticated else 'unknown'
     
-    # 清理会话信息
     session_id = session.get('session_id')
-    if session_id:
-        from app import active_sessions
-        if session_id in active_sessions:
-            del active_sessions[session_id]
     
     # 清除session
     session.clear()
     
     # 登出用户（即使在未登录状态下也安全）
     if current_user.is_authenticated:
-        # 清除用户数据库中的活跃会话ID
-        current_user.active_session_id = None
-        db.session.commit()
+        # 只清除属于本会话的活跃会话ID；被新登录挤下线时不能清除新会话的ID
+        if current_user.active_session_id == session_id:
+            current_user.active_session_id = None
+            db.session.commit()
         logout_user()
     
     # 记录强制登出日志
@@ -211,18 +197,12 @@ def logout():
     # 记录登出前的用户名
     username = current_user.username if current_user.is_authenticated else 'unknown'
     
-    # 清除用户数据库中的活跃会话ID（登录互斥逻辑）
-    if current_user.is_authenticated:
+    # 清除用户数据库中的活跃会话ID（登录互斥逻辑），只清除属于本会话的ID
+    session_id = session.get('session_id')
+    if current_user.is_authenticated and current_user.active_session_id == session_id:
         current_user.active_session_id = None
         db.session.commit()
     
-    # 从活跃会话字典中删除当前会话
-    session_id = session.get('session_id')
-    if session_id:
-        from app import active_sessions
-        if session_id in active_sessions:
-            del active_sessions[session_id]
-    
     # 清理session
     session.clear()
     # 登出用户
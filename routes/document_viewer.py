@@ -7,15 +7,13 @@ import tempfile
 import json
 import urllib.parse
 import logging
-from docx import Document
 
 from routes.models import Document, User, Project, db
 from routes.decorators import admin_required, engineer_required
+from routes.file_serving import serve_file
 
 document_viewer_bp = Blueprint('document_viewer', __name__)
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # 获取压缩包文件结构
@@ -276,8 +274,11 @@ def _handle_archive_document(document, file_extension):
 
 def _handle_word_document(document):
     """处理Word文档"""
+    # python-docx（含lxml）导入较慢，第一次预览Word文档时才导入；
+    # 另外模块顶部的Document是数据库模型，这里需要用别名区分
+    from docx import Document as DocxDocument
     try:
-        doc = Document(document.filepath)
+        doc = DocxDocument(document.filepath)
         content = []
         for para in doc.paragraphs:
             content.append(para.text)
@@ -318,7 +319,7 @@ def _handle_text_document(document, file_extension):
 def _handle_download_document(document):
     """提供文档下载"""
     try:
-        return send_file(document.filepath, as_attachment=True, download_name=document.title)
+        return serve_file(document.filepath, as_attachment=True, download_name=document.title)
     except Exception as e:
         logger.error(f"发送文件失败: {str(e)}")
         flash(f'下载文件时出错: {str(e)}', 'danger')
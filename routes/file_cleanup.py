@@ -0,0 +1,152 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import FileTombstone, db
+
+# 后台文件清理器
+# 删除项目时先在同一事务中写入墓碑记录并提交数据库删除，
+# 磁盘目录由后台线程异步删除，失败后按指数退避重试。
+# 每个工作进程启动时就启动清理线程（见gunicorn.conf.py的post_fork），进程重启前未完成的记录由新进程继续处理；
+# 多个进程同时处理时，先用条件UPDATE占用记录，占用成功的进程才删除磁盘文件
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+# 没有新任务时的轮询间隔，用于处理到期的重试任务
+IDLE_POLL_SECONDS = 60
+# 占用记录后推迟下次尝试的时间；处理中的进程退出时，记录在这之后重新到期
+CLAIM_SECONDS = 300
+
+# 只允许清理上传目录下的路径，防止误删其他目录
+ALLOWED_ROOTS = [
+    os.path.join('static', 'uploads'),
+]
+
+_wake_event = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _is_allowed(path):
+    target = os.path.abspath(path)
+    for root in ALLOWED_ROOTS:
+        root = os.path.abspath(root)
+        if target != root and target.startswith(root + os.sep):
+            return True
+    return False
+
+
+def add_tombstones(paths, created_by=None):
+    """
+    把待删除的路径加入当前数据库会话，由调用方随业务删除一起提交
+
+    Args:
+        paths: (project_id, path) 元组的列表
+        created_by: 操作者用户名
+    """
+    rows = [
+        {'path': path, 'project_id': project_id, 'created_by': created_by,
+         'status': 'pending', 'attempts': 0, 'created_at': datetime.utcnow(),
+         'next_attempt_at': datetime.utcnow()}
+        for project_id, path in paths if path
+    ]
+    if rows:
+        db.session.execute(FileTombstone.__table__.insert(), rows)
+    return len(rows)
+
+
+def _remove_path(path):
+    """删除文件或目录，路径已不存在视为成功"""
+    if not _is_allowed(path):
+        raise ValueError(f'路径不在允许清理的目录中: {path}')
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def process_pending(limit=100):
+    """
+    处理到期的清理任务（需要在应用上下文中调用）
+
+    Returns:
+        int: 本次处理的任务数
+    """
+    now = datetime.utcnow()
+    task_ids = [task_id for (task_id,) in db.session.query(FileTombstone.id).filter(
+        FileTombstone.status == 'pending',
+        FileTombstone.next_attempt_at <= now
+    ).order_by(FileTombstone.id).limit(limit)]
+
+    processed = 0
+    for task_id in task_ids:
+        if not _claim(task_id):
+            continue
+        processed += 1
+        task = db.session.get(FileTombstone, task_id)
+        try:
+            _remove_path(task.path)
+            task.status = 'done'
+            task.finished_at = datetime.utcnow()
+            task.last_error = None
+        except Exception as e:
+            task.last_error = str(e)
+            if task.attempts >= MAX_ATTEMPTS or isinstance(e, ValueError):
+                task.status = 'failed'
+                task.finished_at = datetime.utcnow()
+                current_app.logger.error(f"清理文件失败，已放弃: {task.path}, 错误: {str(e)}")
+            else:
+                delay = RETRY_BASE_SECONDS * (2 ** (task.attempts - 1))
+                task.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                current_app.logger.warning(f"清理文件失败，{delay}秒后重试: {task.path}, 错误: {str(e)}")
+        db.session.commit()
+    return processed
+
+
+def _claim(task_id):
+    """
+    占用一条到期的记录并计入尝试次数，其他进程已占用时返回False
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(
+        FileTombstone.__table__.update()
+        .where(FileTombstone.id == task_id,
+               FileTombstone.status == 'pending',
+               FileTombstone.next_attempt_at <= now)
+        .values(attempts=db.func.coalesce(FileTombstone.attempts, 0) + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _run(app):
+    while True:
+        _wake_event.wait(IDLE_POLL_SECONDS)
+        _wake_event.clear()
+        with app.app_context():
+            try:
+                # 一直处理到没有到期任务为止
+                while process_pending():
+                    pass
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"后台文件清理出错: {str(e)}")
+            finally:
+                db.session.remove()
+
+
+def start_cleaner(app):
+    """启动本进程的后台清理线程（已启动时不重复启动），启动后立即处理之前遗留的到期记录"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, args=(app,), name='file-cleaner', daemon=True)
+            _worker.start()
+    _wake_event.set()
+
+
+def wake_cleaner(app=None):
+    """通知后台清理线程处理任务，线程不存在时按需启动（每个进程一个）"""
+    start_cleaner(app or current_app._get_current_object())
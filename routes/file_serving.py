@@ -0,0 +1,114 @@
+import os
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, request, send_file, make_response
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file as werkzeug_send_file
+
+# 统一的文件发送层
+# 所有下载/预览接口都通过serve_file发送文件：默认由Flask处理Range、If-None-Match和If-Modified-Since；
+# 配置FILE_OFFLOAD后把文件交给前端代理发送，Python工作进程只返回响应头
+#
+# 相关配置:
+#   FILE_OFFLOAD: ''（默认，应用直接发送）、'x-accel'（Nginx）或'x-sendfile'（Apache/Lighttpd）
+#   X_ACCEL_MAPPINGS: 本地目录到Nginx internal location的映射，
+#                     例如 {'static/uploads': '/protected_uploads/'}
+
+# 默认的本地目录映射
+DEFAULT_X_ACCEL_MAPPINGS = {
+    os.path.join('static', 'uploads'): '/protected_uploads/',
+}
+
+
+def _content_disposition(download_name, as_attachment):
+    """生成Content-Disposition，中文文件名使用RFC 5987编码"""
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        download_name.encode('ascii')
+        return f'{disposition}; filename="{download_name}"'
+    except UnicodeEncodeError:
+        ascii_name = download_name.encode('ascii', 'ignore').decode('ascii') or 'download'
+        return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_name)}"
+
+
+def x_accel_uri(path, mappings=None):
+    """把本地文件路径转换为Nginx internal location中的URI，不在映射目录中时返回None"""
+    mappings = mappings or DEFAULT_X_ACCEL_MAPPINGS
+    for local_root, prefix in mappings.items():
+        root = os.path.abspath(local_root)
+        if path.startswith(root + os.sep):
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            return prefix.rstrip('/') + '/' + quote(relative)
+    return None
+
+
+def serve_file(path, as_attachment=False, download_name=None, mimetype=None, max_age=None):
+    """
+    发送文件
+
+    Args:
+        path: 文件路径（绝对路径或相对工作目录的路径）
+        as_attachment: 是否作为附件下载
+        download_name: 下载时显示的文件名，默认使用文件名
+        mimetype: 内容类型，默认按扩展名推断
+        max_age: 缓存时间（秒），None表示每次都需要验证
+
+    Raises:
+        NotFound: 文件不存在
+    """
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        raise NotFound()
+
+    download_name = download_name or os.path.basename(path)
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(download_name)[0] or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    offload = (current_app.config.get('FILE_OFFLOAD') or '').lower()
+
+    if offload == 'x-accel':
+        uri = x_accel_uri(path, current_app.config.get('X_ACCEL_MAPPINGS'))
+        if uri:
+            # 由Nginx负责Range、条件请求和实际的数据传输
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = uri
+            response.headers['Content-Type'] = mimetype
+            response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+            if max_age is not None:
+                response.headers['Cache-Control'] = f'private, max-age={max_age}'
+            return response
+        current_app.logger.warning(f"文件不在X-Accel映射目录中，由应用直接发送: {path}")
+
+    if offload == 'x-sendfile':
+        # 由Web服务器根据X-Sendfile头发送文件，条件请求仍由werkzeug处理
+        return werkzeug_send_file(
+            path,
+            request.environ,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=True,
+            max_age=max_age,
+            use_x_sendfile=True,
+            response_class=current_app.response_class,
+        )
+
+    return send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        max_age=max_age,
+    )
+
+
+def serve_from_directory(directory, filename, **kwargs):
+    """在指定目录中发送文件，拒绝跳出目录的文件名，其他参数同serve_file"""
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None:
+        raise NotFound()
+    return serve_file(path, **kwargs)
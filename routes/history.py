@@ -0,0 +1,114 @@
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event, inspect
+from .models import Project, ProjectHistory, db
+
+# 项目变更历史自动记录
+# 通过Session的flush事件比较Project的脏属性，在同一次flush中批量写入ProjectHistory，
+# 各个写入路径（编辑项目、更新进度、审批进度申请等）无需单独记录历史
+
+# 需要记录历史的字段
+TRACKED_FIELDS = (
+    'name', 'description', 'project_type', 'price', 'cost', 'unit_price', 'group_name',
+    'assigned_engineer_id', 'status', 'progress', 'completed_time', 'reviewed_time',
+)
+
+_PENDING_KEY = 'pending_project_history'
+_registered = False
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def _changed_by():
+    """获取当前操作者用户名，不触发额外的用户加载查询"""
+    if has_request_context():
+        user = getattr(g, '_login_user', None)
+        if user is not None and getattr(user, 'is_authenticated', False):
+            return user.username
+    return 'system'
+
+
+def _collect_changes(session, flush_context, instances):
+    rows = session.info.setdefault(_PENDING_KEY, [])
+    changed_by = None
+    notes = request.endpoint if has_request_context() else None
+    now = datetime.utcnow()
+
+    for obj in session.dirty:
+        if not isinstance(obj, Project) or not session.is_modified(obj, include_collections=False):
+            continue
+        state = inspect(obj)
+        for field in TRACKED_FIELDS:
+            history = state.attrs[field].history
+            if not history.has_changes():
+                continue
+            old_value = _format_value(history.deleted[0]) if history.deleted else None
+            new_value = _format_value(history.added[0]) if history.added else None
+            # None和空字符串视为相同，避免表单提交空值时产生无意义的记录
+            if (old_value or '') == (new_value or ''):
+                continue
+            if changed_by is None:
+                changed_by = _changed_by()
+            rows.append({
+                'project_id': obj.id,
+                'changed_by': changed_by,
+                'changed_at': now,
+                'field_name': field,
+                'old_value': old_value,
+                'new_value': new_value,
+                'notes': notes
+            })
+
+
+def _write_changes(session, flush_context):
+    rows = session.info.pop(_PENDING_KEY, None)
+    if rows:
+        # 与业务修改处于同一事务中，一条批量INSERT写入
+        session.connection().execute(ProjectHistory.__table__.insert(), rows)
+
+
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def register_history_listeners():
+    """注册flush事件监听器，重复调用无副作用"""
+    global _registered
+    if _registered:
+        return
+    event.listen(db.session, 'before_flush', _collect_changes)
+    event.listen(db.session, 'after_flush', _write_changes)
+    event.listen(db.session, 'after_rollback', _discard_changes)
+    # 属性已过期（如commit之后）或未加载时直接赋值，默认不会读取旧值，history.deleted为空；
+    # active_history让赋值前先加载数据库中的旧值，记录的旧值才准确
+    for field in TRACKED_FIELDS:
+        event.listen(getattr(Project, field), 'set', _load_old_value, active_history=True, retval=True)
+    _registered = True
+
+
+def project_timeline(project_id, limit=50, before_id=None):
+    """
+    查询项目的变更时间线，按时间倒序
+
+    Args:
+        project_id: 项目ID
+        limit: 返回的最大条数
+        before_id: 分页游标，只返回ID小于该值的记录
+
+    ID随写入递增，按ID排序与游标一致，翻页不会遗漏或重复
+    （changed_at可能相同，批量写入的记录也可能不按ID顺序）
+    """
+    query = ProjectHistory.query.filter(ProjectHistory.project_id == project_id)
+    if before_id:
+        query = query.filter(ProjectHistory.id < before_id)
+    return query.order_by(ProjectHistory.id.desc()).limit(limit).all()
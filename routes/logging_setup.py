@@ -0,0 +1,128 @@
+import os
+import sys
+import copy
+import queue
+import atexit
+import logging
+import threading
+from datetime import date
+from logging.handlers import QueueHandler, QueueListener
+
+# 异步日志
+# 根日志记录器上只挂一个QueueHandler，请求线程只把日志记录放入内存队列；
+# 控制台和文件的实际写入由QueueListener的后台线程完成，不会因为磁盘I/O阻塞请求。
+# 日志文件按天切换（跨过午夜的长时间运行进程也会切换），文件名中带有进程号，
+# 多个gunicorn工作进程各自写自己的文件。
+
+_state = {'handler': None, 'listener': None, 'factory': None}
+_lock = threading.Lock()
+
+
+class DailyFileHandler(logging.FileHandler):
+    """写入 <目录>/<前缀>_<YYYYMMDD>_<进程号>.log，日期变化后自动切换到新文件"""
+
+    def __init__(self, directory, prefix, encoding='utf-8'):
+        self.directory = directory
+        self.prefix = prefix
+        self.day = date.today()
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(self._filename(self.day), encoding=encoding, delay=True)
+
+    def _filename(self, day):
+        return os.path.join(self.directory, f'{self.prefix}_{day:%Y%m%d}_{os.getpid()}.log')
+
+    def emit(self, record):
+        day = date.fromtimestamp(record.created)
+        if day != self.day:
+            self.day = day
+            self.close()
+            self.baseFilename = os.path.abspath(self._filename(day))
+        super().emit(record)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    进程内队列使用的QueueHandler
+
+    默认的prepare会在请求线程中格式化整条日志和异常堆栈；同一进程内的队列不需要序列化，
+    这里只合并消息参数，异常堆栈留给写入线程格式化
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _start_listener(log_queue):
+    listener = QueueListener(log_queue, *_state['factory'](), respect_handler_level=True)
+    listener.start()
+    _state['listener'] = listener
+
+
+def start_queue_logging(handler_factory, level=logging.INFO):
+    """
+    把根日志记录器的处理器替换为队列，并启动后台写入线程
+
+    Args:
+        handler_factory: 无参函数，返回实际写入日志的处理器列表；fork出的子进程会重新调用以使用新的进程号
+        level: 根日志记录器的级别
+    """
+    root = logging.getLogger()
+    with _lock:
+        if _state['handler'] is not None:
+            return _state['listener']
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        log_queue = queue.SimpleQueue()
+        _state['factory'] = handler_factory
+        _state['handler'] = DeferredQueueHandler(log_queue)
+        root.addHandler(_state['handler'])
+        root.setLevel(level)
+        _start_listener(log_queue)
+
+    atexit.register(stop_queue_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_in_child)
+    return _state['listener']
+
+
+def _restart_in_child():
+    """gunicorn等预加载应用后fork工作进程时，父进程的写入线程不会复制到子进程，需要重新启动"""
+    if _state['handler'] is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _state['handler'].queue = log_queue
+    _start_listener(log_queue)
+
+
+def stop_queue_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    listener = _state['listener']
+    if listener is None:
+        return
+    _state['listener'] = None
+    try:
+        listener.stop()
+    except Exception:
+        pass
+    for handler in listener.handlers:
+        try:
+            handler.close()
+        except Exception:
+            pass
+
+
+def console_handler(fmt='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S', level=logging.INFO):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
+    return handler
+
+
+def queue_depth():
+    """队列中等待写入的日志记录数"""
+    handler = _state['handler']
+    return handler.queue.qsize() if handler is not None else 0
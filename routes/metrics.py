@@ -0,0 +1,323 @@
+import os
+import hmac
+import json
+import time
+import threading
+from bisect import bisect_left
+from flask import g, request, current_app
+
+try:
+    import fcntl
+except ImportError:  # Windows开发环境没有fcntl，不合并已退出进程的数据
+    fcntl = None
+
+# 运行指标
+# 每个进程在内存中累计计数器和直方图，最多每METRICS_FLUSH_SECONDS秒把快照写入
+# METRICS_DIR/metrics_<进程号>.json；/metrics 接口读取目录中所有进程的快照并合并，
+# 输出Prometheus文本格式，多个gunicorn工作进程的数据因此可以汇总。
+# 已退出进程的计数器合并到metrics_archive.json中保留，保证计数只增不减；瞬时值（队列长度等）只统计存活进程。
+#
+# 相关配置:
+#   METRICS_DIR: 快照目录，默认 instance/metrics
+#   METRICS_FLUSH_SECONDS: 快照写入间隔
+#   METRICS_TOKEN: 抓取令牌，请求带有 Authorization: Bearer <令牌> 时不需要登录
+#   METRICS_ALLOWED_IPS: 不登录即可访问/metrics的来源地址（默认只有本机）。经过反向代理的请求来源都是本机，
+#     所以带有X-Forwarded-For等代理头的请求不按来源地址放行，只能使用令牌或以管理员身份登录
+
+PROXY_HEADERS = ('X-Forwarded-For', 'X-Real-IP', 'Forwarded')
+
+PREFIX = 'app_'
+DEFAULT_FLUSH_SECONDS = 5
+ARCHIVE_FILENAME = 'metrics_archive.json'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', '请求数'),
+    'http_request_duration_seconds': ('histogram', '请求耗时'),
+    'sql_queries_total': ('counter', 'SQL语句数'),
+    'sql_seconds_total': ('counter', 'SQL耗时'),
+    'upload_bytes_total': ('counter', '上传请求体字节数'),
+    'cache_requests_total': ('counter', '缓存访问次数'),
+    'log_queue_depth': ('gauge', '日志队列中等待写入的记录数'),
+    'transcode_queue_depth': ('gauge', '等待转码的视频数'),
+    'file_cleanup_pending': ('gauge', '等待清理的文件墓碑数'),
+    'active_sessions': ('gauge', '当前有活跃会话的用户数'),
+}
+
+_counters = {}
+_histograms = {}
+_gauges = {}
+_lock = threading.Lock()
+_state = {'last_flush': 0.0}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, labels=None, value=1):
+    """累加计数器"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, labels=None, buckets=LATENCY_BUCKETS):
+    """记录一次直方图观测值"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        index = bisect_left(histogram['buckets'], value)
+        if index < len(histogram['counts']):
+            histogram['counts'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def set_gauge(name, value, labels=None):
+    """设置本进程的瞬时值"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def record_cache(cache, hit):
+    """记录一次缓存命中或未命中"""
+    inc('cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+# ---- 进程快照 ----
+
+def _metrics_dir(config):
+    return config.get('METRICS_DIR') or os.path.join(current_app.instance_path, 'metrics')
+
+
+def _snapshot():
+    _collect_process_gauges()
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), h['buckets'], h['counts'], h['sum'], h['count']]
+                           for (name, labels), h in _histograms.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in _gauges.items()],
+        }
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def flush(force=False):
+    """把本进程的快照写入共享目录（未到间隔时跳过）"""
+    config = current_app.config
+    now = time.monotonic()
+    if not force and now - _state['last_flush'] < config.get('METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+        return
+    _state['last_flush'] = now
+    directory = _metrics_dir(config)
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f'metrics_{os.getpid()}.json'), _snapshot())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_into(totals, snapshot, include_gauges):
+    counters, histograms, gauges = totals
+    for name, labels, value in snapshot.get('counters', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, counts, total, count in snapshot.get('histograms', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        merged = histograms.get(key)
+        if merged is None or merged['buckets'] != buckets:
+            merged = histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        merged['counts'] = [a + b for a, b in zip(merged['counts'], counts)]
+        merged['sum'] += total
+        merged['count'] += count
+    if include_gauges:
+        for name, labels, value in snapshot.get('gauges', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            gauges[key] = gauges.get(key, 0) + value
+
+
+def _fold_dead_processes(directory):
+    """把已退出进程的快照合并到归档文件并删除"""
+    if fcntl is None:
+        return
+    with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        dead = []
+        for filename in os.listdir(directory):
+            if filename.startswith('metrics_') and filename.endswith('.json') and filename != ARCHIVE_FILENAME:
+                try:
+                    pid = int(filename[len('metrics_'):-len('.json')])
+                except ValueError:
+                    continue
+                if pid != os.getpid() and not _pid_alive(pid):
+                    dead.append(os.path.join(directory, filename))
+        if not dead:
+            return
+        archive_path = os.path.join(directory, ARCHIVE_FILENAME)
+        totals = ({}, {}, {})
+        archive = _read_json(archive_path)
+        if archive:
+            _merge_into(totals, archive, include_gauges=False)
+        for path in dead:
+            snapshot = _read_json(path)
+            if snapshot:
+                _merge_into(totals, snapshot, include_gauges=False)
+        counters, histograms, _ = totals
+        _write_json(archive_path, {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), h['buckets'], h['counts'], h['sum'], h['count']]
+                           for (name, labels), h in histograms.items()],
+        })
+        for path in dead:
+            os.remove(path)
+
+
+def aggregate():
+    """合并所有进程的快照，返回 (counters, histograms, gauges)"""
+    flush(force=True)
+    directory = _metrics_dir(current_app.config)
+    _fold_dead_processes(directory)
+    totals = ({}, {}, {})
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('metrics_') and filename.endswith('.json')):
+            continue
+        snapshot = _read_json(os.path.join(directory, filename))
+        if snapshot:
+            _merge_into(totals, snapshot, include_gauges=filename != ARCHIVE_FILENAME)
+    return totals
+
+
+# ---- 瞬时值 ----
+
+def _collect_process_gauges():
+    """本进程内的队列长度"""
+    from .logging_setup import queue_depth
+    from .transcode import _queue as transcode_queue
+    set_gauge('log_queue_depth', queue_depth())
+    set_gauge('transcode_queue_depth', transcode_queue.qsize())
+
+
+def _collect_global_gauges():
+    """从数据库读取的全局瞬时值，抓取时查询"""
+    from .models import User, FileTombstone
+    gauges = {}
+    gauges[('active_sessions', ())] = User.query.filter(User.active_session_id.isnot(None)).count()
+    gauges[('file_cleanup_pending', ())] = FileTombstone.query.filter_by(status='pending').count()
+    return gauges
+
+
+# ---- 输出 ----
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + (list(extra) if extra else [])
+    if not pairs:
+        return ''
+    escaped = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                       for k, v in pairs)
+    return '{' + escaped + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus():
+    """Prometheus文本格式（0.0.4）"""
+    counters, histograms, gauges = aggregate()
+    gauges.update(_collect_global_gauges())
+
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault(name, []).append(f'{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), value in gauges.items():
+        families.setdefault(name, []).append(f'{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), h in histograms.items():
+        lines = families.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(h['buckets'], h['counts']):
+            cumulative += count
+            lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {h["count"]}')
+        lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(h["sum"])}')
+        lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {h["count"]}')
+
+    output = []
+    for name in sorted(families):
+        metric_type, help_text = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {PREFIX}{name} {help_text}')
+        output.append(f'# TYPE {PREFIX}{name} {metric_type}')
+        output.extend(sorted(families[name]) if metric_type != 'histogram' else families[name])
+    return '\n'.join(output) + '\n'
+
+
+# ---- 请求统计 ----
+
+def _before_request():
+    g._metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.get('_metrics_started')
+    if started is None:
+        return response
+    from .query_stats import current_query_stats
+    endpoint = request.endpoint or 'unmatched'
+    elapsed = time.perf_counter() - started
+    inc('http_requests_total', {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+    observe('http_request_duration_seconds', elapsed, {'endpoint': endpoint})
+    query_count, query_seconds = current_query_stats()
+    if query_count:
+        inc('sql_queries_total', {'endpoint': endpoint}, query_count)
+        inc('sql_seconds_total', {'endpoint': endpoint}, query_seconds)
+    if request.method in ('POST', 'PUT') and request.content_length and request.mimetype == 'multipart/form-data':
+        inc('upload_bytes_total', {'endpoint': endpoint}, request.content_length)
+    try:
+        flush()
+    except OSError as e:
+        current_app.logger.warning(f"写入运行指标失败: {str(e)}")
+    return response
+
+
+def scrape_allowed(config):
+    """当前请求是否可以不登录读取/metrics：令牌匹配，或者直接来自允许的地址（未经过反向代理）"""
+    token = config.get('METRICS_TOKEN')
+    if token:
+        auth = request.headers.get('Authorization', '')
+        if auth.startswith('Bearer ') and hmac.compare_digest(auth[7:].strip().encode(), token.encode()):
+            return True
+    if any(header in request.headers for header in PROXY_HEADERS):
+        return False
+    return request.remote_addr in (config.get('METRICS_ALLOWED_IPS') or [])
+
+
+def init_metrics(app):
+    """注册请求统计"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -74,6 +74,7 @@ class Project(db.Model):
     # 添加复合索引
     __table_args__ = (
         db.Index('idx_project_type_status', 'project_type', 'status'),
+        db.Index('idx_project_progress_name', 'progress', 'name'),
     )
 
 # 优化后的Engineer模型 - 添加索引和外键约束
@@ -208,6 +209,10 @@ class ProjectHistory(db.Model):
     old_value = db.Column(db.Text)
     new_value = db.Column(db.Text)
     notes = db.Column(db.Text)
+    # 项目时间线查询使用的复合索引，与查询的排序和分页游标一致（按ID倒序，见routes/history.py）
+    __table_args__ = (
+        db.Index('idx_project_history_project_id', 'project_id', 'id'),
+    )
 
 # 新增操作日志表
 class OperationLog(db.Model):
@@ -237,4 +242,33 @@ class ProgressChangeRequest(db.Model):
     # 关系定义
     project = db.relationship('Project', backref='progress_requests')
     engineer = db.relationship('Engineer', backref='progress_requests')
-    processor = db.relationship('User', foreign_keys=[processed_by], backref='processed_progress_requests')
\ No newline at end of file
+    processor = db.relationship('User', foreign_keys=[processed_by], backref='processed_progress_requests')
+
+# 文件清理墓碑表 - 数据库记录删除后，待后台清理的磁盘路径
+class FileTombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(255), nullable=False)
+    project_id = db.Column(db.Integer, index=True)  # 不加外键，项目记录此时已被删除
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    created_by = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+
+# 视频目录表 - 上传目录中的每个视频一条记录，视频管理页面从此表分页查询
+class Video(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False, index=True)  # VIDEO_UPLOAD_FOLDER中的文件名
+    title = db.Column(db.String(255))
+    size = db.Column(db.BigInteger, default=0)
+    file_mtime = db.Column(db.Float)  # 文件修改时间，对账时判断文件是否变化
+    duration = db.Column(db.Float)  # 时长（秒），安装了ffprobe时填写
+    checksum = db.Column(db.String(64), index=True)  # SHA-256
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    rendition_status = db.Column(db.String(20), default='none', index=True)  # none, pending, processing, ready, failed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    uploader = db.relationship('User', backref='uploaded_videos')
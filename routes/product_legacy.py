@@ -6,19 +6,15 @@ import os
 import pandas as pd
 from .models import Project, Engineer, User, Document, ProjectImage, db
 from .decorators import admin_required, role_required, engineer_required
+from .file_serving import serve_from_directory
+from .utils import VALID_PROGRESS_OPTIONS
 import re
-from flask import send_from_directory, abort
+from flask import abort
 from werkzeug.utils import secure_filename
 
 # 统一使用project_bp作为蓝图名称
 project_bp = Blueprint('project', __name__)
 
-VALID_PROGRESS_OPTIONS = [
-    '无方案', '需要方案', '方案未确认', '确认方案不制作',
-    '待制作', '制作中', '完成待确认', '确认不发货',
-    '确认待发货', '已完成', '结单', '售后修改'
-]
-
 @project_bp.route('/projects')
 @login_required
 def projects_redirect():
@@ -51,14 +47,15 @@ def fix_project_data():
         for project in price_none_projects:
             project.price = 0
         
-        # 修复文档路径问题
-        documents = Document.query.all()
-        for doc in documents:
-            # 检查文件路径是否存在
-            if not os.path.exists(doc.filepath):
-                # 更新为正确的路径格式
-                basedir = os.path.abspath(os.path.dirname(__file__))
-                project = Project.query.get(doc.project_id)
+        # 修复文档路径问题：只处理对账扫描报告中文件缺失的文档，避免逐个stat所有文档
+        from .reconcile import run_reconcile
+        missing = run_reconcile()['missing_documents']
+        if missing:
+            basedir = os.path.abspath(os.path.dirname(__file__))
+            documents = Document.query.filter(Document.id.in_([m['id'] for m in missing])).all()
+            projects = {p.id: p for p in Project.query.filter(Project.id.in_({d.project_id for d in documents}))}
+            for doc in documents:
+                project = projects.get(doc.project_id)
                 if project:
                     new_filepath = os.path.join(basedir, os.pardir, 'static', 'uploads', 'documents', f"{project.name}{os.path.splitext(doc.filename)[1]}")
                     if os.path.exists(new_filepath):
@@ -139,34 +136,6 @@ def projects_management():
                           total_pages=total_pages,
                           total_projects=total_projects,
                           timedelta=timedelta)
-    
-    for project in projects:
-        # 检查项目是否有文档并且文档文件是否存在
-        if project.documents:
-            # 获取第一个文档（假设每个项目只有一个文档）
-            doc = project.documents[0]
-            if not os.path.exists(doc.filepath):
-                # 如果文档文件不存在，删除文档记录
-                db.session.delete(doc)
-                db.session.commit()
-    
-    from datetime import timedelta
-    # 确保查询所有工程师
-    all_engineers = Engineer.query.all()
-    print(f"Engineers count: {len(all_engineers)}")  # 用于调试
-    
-    return render_template('projects_management.html', 
-                          projects=projects, 
-                          engineers=all_engineers,
-                          search_query=search_query,
-                          engineer_id=engineer_id,
-                          project_type=project_type,
-                          progress=progress,
-                          current_page=page,
-                          per_page=per_page,
-                          total_pages=total_pages,
-                          total_projects=total,
-                          timedelta=timedelta)
 
 @project_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -982,12 +951,16 @@ def delete_project(project_id):
 @login_required
 @admin_required
 def batch_assign_engineer():
+    import json
+    # 客户端传入的ID列表格式错误时返回400，而不是进入下面的异常处理
+    try:
+        project_ids = [int(pid) for pid in json.loads(request.form.get('product_ids', '[]') or '[]')]
+    except (TypeError, ValueError):
+        abort(400)
     try:
-        import json
-        product_ids = json.loads(request.form.get('product_ids', '[]'))
         engineer_id = request.form.get('engineer_id')
 
-        if not product_ids or not engineer_id:
+        if not project_ids or not engineer_id:
             flash('请选择产品和工程师')
             return redirect(url_for('project_management.projects_list'))
 
@@ -997,19 +970,19 @@ def batch_assign_engineer():
             flash('工程师不存在')
             return redirect(url_for('project_management.projects_list'))
 
-        # 批量更新产品的工程师分配
-        for project_id in product_ids:
-            product = Product.query.get(project_id)
-            if product:
-                product.assigned_engineer_id = engineer_id
-                product.assigned_time = datetime.utcnow()
-                product.status = 'in_progress'
-                product.completed_time = None
-                product.reviewed_time = None
-
+        # 批量更新产品的工程师分配，单条UPDATE完成
+        from .project_management import bulk_assign_engineer
+        outcomes = bulk_assign_engineer(project_ids, engineer, current_user.username)
+        # 重新分配后的产品回到进行中状态，清除完成和审核时间
+        Project.query.filter(Project.id.in_(project_ids)).update({
+            Project.status: 'in_progress',
+            Project.completed_time: None,
+            Project.reviewed_time: None
+        }, synchronize_session=False)
         db.session.commit()
 
-        flash(f'成功分配 {len(product_ids)} 个产品给工程师')
+        assigned_count = sum(1 for result in outcomes.values() if result == 'assigned')
+        flash(f'成功分配 {assigned_count} 个产品给工程师')
         return redirect(url_for('product.products_management'))
     except Exception as e:
         db.session.rollback()
@@ -1121,7 +1094,7 @@ def view_document(project_id):
         flash('文档文件不存在', 'danger')
         return redirect(url_for('project.projects_management'))
 
-    return send_from_directory(os.path.dirname(doc.filepath), doc.filename, as_attachment=False)
+    return serve_from_directory(os.path.dirname(doc.filepath), doc.filename, as_attachment=False)
 
 # 将第二个view_document函数重命名为view_document_by_id
 @project_bp.route('/unmark_completed', methods=['POST'])
@@ -1190,7 +1163,7 @@ def view_document_by_id(document_id):
 
     # 使用正确的文件名返回文件
     try:
-        return send_from_directory(file_dir, filename, as_attachment=False)
+        return serve_from_directory(file_dir, filename, as_attachment=False)
     except Exception as e:
         flash(f'查看文档失败: {str(e)}', 'danger')
         return redirect(url_for('project.projects_management'))
@@ -1220,12 +1193,9 @@ def download_document(document_id):
     file_dir = os.path.dirname(document.filepath)
     filename = document.filename  # 使用文档记录中的原始文件名
 
-    # 直接使用send_from_directory，确保as_attachment=True用于下载
+    # 通过统一的文件发送层下载，中文文件名由其负责编码
     try:
-        response = send_from_directory(file_dir, filename, as_attachment=True)
-        # 确保中文文件名正确编码
-        response.headers['Content-Disposition'] = f'attachment; filename*=UTF-8''{filename}'
-        return response
+        return serve_from_directory(file_dir, filename, as_attachment=True)
     except Exception as e:
         flash(f'下载文档失败: {str(e)}', 'danger')
         return redirect(url_for('product.products_management'))
\ No newline at end of file
@@ -0,0 +1,60 @@
+from flask_login import current_user
+from .models import User, Engineer, Admin, CustomerService, Trainee, db
+
+# 当前用户的角色资料
+# load_user在加载用户时用一次外连接查询同时取出工程师/管理员/客服/试岗员工资料，
+# 缓存在用户对象上。Flask-Login每个请求只加载一次用户，因此缓存的生命周期就是当前请求，
+# 视图中的归属判断不再需要额外查询。
+
+PROFILE_MODELS = {
+    'engineer': Engineer,
+    'admin': Admin,
+    'customer_service': CustomerService,
+    'trainee': Trainee,
+}
+
+
+def load_user_with_profiles(user_id):
+    """加载用户及其全部角色资料，用户不存在时返回None"""
+    query = db.session.query(User, *PROFILE_MODELS.values()).filter(User.id == user_id)
+    for model in PROFILE_MODELS.values():
+        query = query.outerjoin(model, model.user_id == User.id)
+    row = query.first()
+    if row is None:
+        return None
+    user = row[0]
+    user._role_profiles = dict(zip(PROFILE_MODELS, row[1:]))
+    return user
+
+
+def get_profile(kind, user=None):
+    """
+    获取用户的角色资料
+
+    Args:
+        kind: PROFILE_MODELS中的键
+        user: 用户，默认为当前用户；没有预加载资料的用户按需查询一次
+    """
+    user = current_user if user is None else user
+    if not getattr(user, 'is_authenticated', False):
+        return None
+    profiles = getattr(user, '_role_profiles', None)
+    if profiles is not None and kind in profiles:
+        return profiles[kind]
+    profile = PROFILE_MODELS[kind].query.filter_by(user_id=user.id).first()
+    if profiles is not None:
+        profiles[kind] = profile
+    return profile
+
+
+def set_profile(kind, profile, user=None):
+    """请求中新建角色资料后更新缓存"""
+    user = current_user if user is None else user
+    profiles = getattr(user, '_role_profiles', None)
+    if profiles is not None:
+        profiles[kind] = profile
+
+
+def current_engineer():
+    """当前用户的工程师资料，不是工程师时返回None"""
+    return get_profile('engineer')
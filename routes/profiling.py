@@ -0,0 +1,155 @@
+import os
+import io
+import json
+import time
+import random
+import pstats
+import cProfile
+from datetime import datetime
+from flask import g, request, current_app
+from flask_login import current_user
+
+# 请求采样分析
+# 默认关闭。开启后按比例（或按接口、用户名）挑选请求，用cProfile记录整个请求的调用耗时，
+# 结果以pstats格式保存到PROFILING_DIR，旁边的同名.json文件保存请求信息，管理员在/admin/profiles查看和下载。
+#
+# 相关配置:
+#   PROFILING_SAMPLE_RATE: 随机采样比例（0~1），0表示不随机采样
+#   PROFILING_ENDPOINTS: 总是采样的接口名集合，如 {'admin.admin_panel'}
+#   PROFILING_USERS: 总是采样的用户名集合
+#   PROFILING_DIR: 保存目录，默认 instance/profiles
+#   PROFILING_MAX_FILES: 最多保留的分析结果数，超出后删除最旧的
+
+DEFAULT_MAX_FILES = 200
+PROFILE_SUFFIX = '.prof'
+META_SUFFIX = '.json'
+
+
+def profiles_dir(config=None):
+    config = config or current_app.config
+    return os.path.abspath(config.get('PROFILING_DIR') or os.path.join(current_app.instance_path, 'profiles'))
+
+
+def profiling_enabled(config):
+    return bool(config.get('PROFILING_SAMPLE_RATE') or config.get('PROFILING_ENDPOINTS') or config.get('PROFILING_USERS'))
+
+
+def _should_profile(config):
+    if request.endpoint in (config.get('PROFILING_ENDPOINTS') or ()):
+        return True
+    users = config.get('PROFILING_USERS')
+    if users and current_user.is_authenticated and current_user.username in users:
+        return True
+    rate = config.get('PROFILING_SAMPLE_RATE') or 0
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if request.path.startswith('/static/') or not _should_profile(current_app.config):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一线程已有其他分析器在运行（如调试器），跳过本次采样
+        return
+    g._profiler = profiler
+    g._profile_started = time.perf_counter()
+
+
+def _stop_profile(response):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    try:
+        _save_profile(profiler, response.status_code)
+    except Exception as e:
+        current_app.logger.warning(f"保存性能分析结果失败: {str(e)}")
+    return response
+
+
+def _discard_profile(exception):
+    """请求异常中断时after_request不会执行，这里关闭分析器"""
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def _save_profile(profiler, status_code):
+    from .query_stats import current_query_stats
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    now = datetime.now()
+    endpoint = request.endpoint or 'unmatched'
+    name = f"{now:%Y%m%d_%H%M%S_%f}_{os.getpid()}_{endpoint.replace('.', '-')}"
+    query_count, query_seconds = current_query_stats()
+    meta = {
+        'name': name,
+        'created_at': now.isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': endpoint,
+        'status': status_code,
+        'user': current_user.username if current_user.is_authenticated else None,
+        'duration_ms': round((time.perf_counter() - g.pop('_profile_started')) * 1000, 2),
+        'sql_count': query_count,
+        'sql_ms': round(query_seconds * 1000, 2),
+        'pid': os.getpid(),
+    }
+    profiler.dump_stats(os.path.join(directory, name + PROFILE_SUFFIX))
+    with open(os.path.join(directory, name + META_SUFFIX), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    _prune(directory, current_app.config.get('PROFILING_MAX_FILES', DEFAULT_MAX_FILES))
+
+
+def _prune(directory, max_files):
+    names = sorted(f[:-len(META_SUFFIX)] for f in os.listdir(directory) if f.endswith(META_SUFFIX))
+    for name in names[:max(0, len(names) - max_files)]:
+        for suffix in (PROFILE_SUFFIX, META_SUFFIX):
+            try:
+                os.remove(os.path.join(directory, name + suffix))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """已保存的分析结果，按时间倒序"""
+    directory = profiles_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if not filename.endswith(META_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_summary(name, sort='cumulative', limit=40):
+    """
+    分析结果的文本摘要
+
+    Returns:
+        str: pstats输出；文件不存在时返回None
+    """
+    path = os.path.join(profiles_dir(), os.path.basename(name) + PROFILE_SUFFIX)
+    if not os.path.isfile(path):
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def init_profiling(app):
+    """配置开启时注册请求采样"""
+    if not profiling_enabled(app.config):
+        return
+    app.before_request(_start_profile)
+    app.after_request(_stop_profile)
+    app.teardown_request(_discard_profile)
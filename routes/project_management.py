@@ -1,19 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_from_directory, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import os
+import re
+import json
 import zipfile
 import shutil
 from datetime import datetime
-from .models import Project, Tag, TagRequest, Engineer, Document, db, Role, Permission, OperationLog
+from .models import (Project, Tag, TagRequest, Engineer, Document, db, Role, Permission, OperationLog,
+                     DocumentVersion, ProjectImage, ProjectHistory, ProgressChangeRequest, project_tags)
 from .decorators import role_required, log_operation, admin_required
+from .file_serving import serve_file, serve_from_directory
+from .signed_media import media_url_for_path
+from .profiles import current_engineer
+from .reference_data import get_engineers, get_tags
+from .thumbnails import (SIZES as THUMBNAIL_SIZES, generate_variants, is_image, thumbnail_path, thumbnail_url,
+                         project_thumbnail_dir)
 
 project_management_bp = Blueprint('project_management', __name__)
 
-# 确保项目资料文件夹存在
+# 项目资料文件夹，由create_app创建
 PROJECTS_DIR = os.path.join('static', 'uploads', 'projects')
-if not os.path.exists(PROJECTS_DIR):
-    os.makedirs(PROJECTS_DIR)
 
 @project_management_bp.route('/projects_list')
 @login_required
@@ -29,7 +37,7 @@ def projects_list():
     view_type = 'card'
     
     # 获取当前用户信息
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first() if current_user.role != 'admin' else None
+    engineer = current_engineer() if current_user.role != 'admin' else None
     
     # 基础查询：根据用户角色设置可见项目
     if current_user.role_level == 0:
@@ -77,10 +85,10 @@ def projects_list():
     # 获取工程师列表（仅超级管理员可见）
     engineers = []
     if current_user.role_level == 0:
-        engineers = Engineer.query.all()
+        engineers = get_engineers()
     
     # 获取所有标签
-    all_tags = Tag.query.all()
+    all_tags = get_tags()
     
     # 始终使用卡片视图模板
     template_name = 'projects_list_card.html'
@@ -102,14 +110,14 @@ def projects_list():
 @log_operation('添加项目')
 def add_project():
     # 超级管理员和工程师可以添加项目
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     # 允许超级管理员(role_level=0或role='super_admin')或工程师添加项目
     if not (current_user.role_level == 0 or current_user.role == 'super_admin' or engineer):
         flash('没有权限添加项目', 'danger')
         # 上传完成后返回到项目列表页面
         return redirect(url_for('project_management.projects_list'))
     
-    tags = Tag.query.all()
+    tags = get_tags()
     
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -156,16 +164,13 @@ def add_project():
             updated_by=current_user.id
         )
         
-        # 添加标签
-        for tag_id in tag_ids:
-            tag = Tag.query.get(int(tag_id))
-            if tag:
-                project.tags.append(tag)
-        
         try:
             db.session.add(project)
             db.session.flush()  # 获取项目ID但不提交
             
+            # 添加标签
+            set_project_tags(project, tag_ids)
+            
             # 创建项目文件夹
             project_folder = os.path.join(PROJECTS_DIR, f'project_{project.id}_{name.replace(" ", "_")}')
             project.materials_path = project_folder
@@ -188,7 +193,7 @@ def add_project():
     # 超级管理员可以选择工程师
     engineers = []
     if current_user.role_level == 0:
-        engineers = Engineer.query.all()
+        engineers = get_engineers()
     
     return render_template('add_project.html', tags=tags, engineers=engineers)
 
@@ -199,7 +204,7 @@ def edit_project(project_id):
     project = Project.query.get_or_404(project_id)
     
     # 检查权限
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     # 允许超级管理员(role_level=0或role='super_admin')或项目分配的工程师编辑项目
     if not (current_user.role_level == 0 or current_user.role == 'super_admin' or 
            (engineer and project.assigned_engineer_id == engineer.id)):
@@ -207,7 +212,7 @@ def edit_project(project_id):
         # 上传完成后返回到项目列表页面
         return redirect(url_for('project_management.projects_list'))
     
-    tags = Tag.query.all()
+    tags = get_tags()
     selected_tags = [str(tag.id) for tag in project.tags]
     
     if request.method == 'POST':
@@ -243,14 +248,9 @@ def edit_project(project_id):
         project.updated_at = datetime.utcnow()
         project.updated_by = current_user.id
         
-        # 更新标签
-        project.tags.clear()
-        for tag_id in tag_ids:
-            tag = Tag.query.get(int(tag_id))
-            if tag:
-                project.tags.append(tag)
-        
         try:
+            # 更新标签，只写入有变化的关联
+            set_project_tags(project, tag_ids)
             db.session.commit()
             flash('项目更新成功', 'success')
             # 上传完成后返回到项目列表页面，并带上项目ID以便可以重新打开该项目的详情模态框
@@ -269,7 +269,7 @@ def upload_materials(project_id):
     project = Project.query.get_or_404(project_id)
     
     # 检查权限
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     # 允许超级管理员(role_level=0或role='super_admin')或项目分配的工程师上传资料
     if not (current_user.role_level == 0 or current_user.role == 'super_admin' or engineer):
         flash('没有权限上传项目资料', 'danger')
@@ -344,6 +344,13 @@ def upload_materials(project_id):
                 file.save(file_path)
                 success_count += 1
                 
+                # 预先生成图片缩略图，失败时在第一次访问时再生成
+                if file_type == 'image':
+                    try:
+                        generate_variants(file_path)
+                    except Exception as e:
+                        current_app.logger.warning(f"生成缩略图失败: {file_path}, 错误: {str(e)}")
+                
                 # 创建数据库记录
                 document = Document(
                     project_id=project_id,
@@ -379,7 +386,7 @@ def download_materials(project_id, file_type, filename):
     project = Project.query.get_or_404(project_id)
     
     # 检查权限
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     if not engineer and current_user.role != 'admin':
         flash('没有权限下载项目资料', 'danger')
         return redirect(url_for('project_management.projects_list'))
@@ -407,7 +414,7 @@ def download_materials(project_id, file_type, filename):
     
     # 发送文件
     try:
-        return send_from_directory(upload_dir, filename, as_attachment=True)
+        return serve_from_directory(upload_dir, filename, as_attachment=True)
     except Exception as e:
         flash(f'下载文件失败: {str(e)}', 'danger')
         return redirect(url_for('project_management.projects_list'))
@@ -420,7 +427,7 @@ def preview_materials(project_id, file_type, filename):
     project = Project.query.get_or_404(project_id)
     
     # 检查权限
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     if not engineer and current_user.role != 'admin':
         flash('没有权限预览项目资料', 'danger')
         return redirect(url_for('project_management.projects_list'))
@@ -454,7 +461,7 @@ def preview_materials(project_id, file_type, filename):
     if ext in image_exts or ext in text_exts:
         # 对于图片和文本文件，可以直接预览
         try:
-            return send_from_directory(upload_dir, filename, as_attachment=False)
+            return serve_from_directory(upload_dir, filename, as_attachment=False)
         except Exception as e:
             flash(f'预览文件失败: {str(e)}', 'danger')
             return redirect(url_for('project_management.projects_list'))
@@ -464,12 +471,52 @@ def preview_materials(project_id, file_type, filename):
         return redirect(url_for('project_management.download_materials', 
                                project_id=project_id, file_type=file_type, filename=filename))
 
+def _project_for_folder(folder):
+    """按PROJECTS_DIR下的文件夹名查找项目（文件夹名为 project_<ID>_<名称>）"""
+    match = re.match(r'project_(\d+)_', folder)
+    if not match:
+        return None
+    project = db.session.get(Project, int(match.group(1)))
+    if project is None or not project.materials_path:
+        return None
+    if os.path.basename(os.path.normpath(project.materials_path)) != folder:
+        return None
+    return project
+
+@project_management_bp.route('/thumbnail/<size>/<path:path>')
+@login_required
+def project_thumbnail(size, path):
+    """项目图片缩略图，URL中带有原图版本号，可以长期缓存；无法生成缩略图时返回原图（短时间缓存，之后可以重新尝试生成）"""
+    if size not in THUMBNAIL_SIZES:
+        abort(404)
+    source = safe_join(os.path.abspath(PROJECTS_DIR), path)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+    relative_path = os.path.relpath(source, os.path.abspath(PROJECTS_DIR))
+    # 只提供图片，其他项目资料走有权限检查的预览和下载接口
+    if not is_image(relative_path):
+        abort(404)
+    project = _project_for_folder(relative_path.split(os.sep, 1)[0])
+    if project is None:
+        abort(404)
+    # 与preview_materials相同：管理员或负责该项目的工程师
+    engineer = current_engineer()
+    if current_user.role != 'admin' and not (engineer and project.assigned_engineer_id == engineer.id):
+        abort(403)
+    thumbnail = thumbnail_path(relative_path, size)
+    response = serve_file(thumbnail or source, max_age=365 * 24 * 3600 if thumbnail else 300)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if thumbnail:
+        response.cache_control.immutable = True
+    return response
+
 @project_management_bp.route('/request_tag', methods=['GET', 'POST'])
 @login_required
 @log_operation('申请标签')
 def request_tag():
     # 仅工程师可以申请标签
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     if not engineer:
         flash('只有工程师可以申请标签', 'danger')
         return redirect(url_for('project_management.projects_list'))
@@ -520,7 +567,7 @@ def manage_tag_requests():
     # 管理员查看标签申请
     requests = TagRequest.query.filter_by(status='pending').order_by(TagRequest.created_at.desc()).all()
     # 获取所有已存在的标签，用于显示
-    tags = Tag.query.order_by(Tag.name).all()
+    tags = get_tags(order_by_name=True)
     return render_template('manage_tag_requests.html', requests=requests, tags=tags)
 
 @project_management_bp.route('/add_tag', methods=['GET', 'POST'])
@@ -597,9 +644,10 @@ def approve_tag(request_id):
 def delete_project(project_id):
     # 导入权限检查函数
     from routes.decorators import has_permission
+    from .file_cleanup import wake_cleaner
     
     # 权限验证：管理员、工程师或具有删除项目权限的用户可以删除项目
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     
     try:
         project = Project.query.get_or_404(project_id)
@@ -612,19 +660,10 @@ def delete_project(project_id):
             flash('没有权限删除该项目', 'danger')
             return redirect(url_for('project_management.projects_list'))
         
-        # 获取项目文件夹路径
-        folder_path = project.materials_path
-        
-        # 删除项目文件夹
-        if folder_path and os.path.exists(folder_path):
-            try:
-                shutil.rmtree(folder_path)
-            except Exception as e:
-                print(f"无法删除项目文件夹: {folder_path}, 错误: {str(e)}")
-        
-        # 从数据库中删除项目
-        db.session.delete(project)
+        # 从数据库中删除项目，项目文件夹提交后由后台清理线程删除
+        _delete_projects_bulk([project.id])
         db.session.commit()
+        wake_cleaner()
         
         flash(f'项目 "{project_name}" 已成功删除', 'success')
         return redirect(url_for('project_management.projects_list'))
@@ -634,54 +673,206 @@ def delete_project(project_id):
         flash(f'删除项目时出错: {str(e)}', 'danger')
         return redirect(url_for('project_management.projects_list'))
 
+def _delete_projects_bulk(project_ids):
+    """
+    批量删除项目及其关联记录，并为项目文件夹写入墓碑记录
+
+    只加入当前会话，由调用方统一提交；磁盘目录在提交后由后台清理线程删除
+    """
+    from .file_cleanup import add_tombstones
+    
+    if not project_ids:
+        return 0
+    
+    # 一次查询取出所有项目文件夹路径
+    folders = db.session.query(Project.id, Project.materials_path).filter(Project.id.in_(project_ids)).all()
+    add_tombstones([(pid, path) for pid, path in folders], created_by=current_user.username)
+    # 缩略图目录一起清理
+    add_tombstones([(pid, project_thumbnail_dir(path)) for pid, path in folders], created_by=current_user.username)
+    
+    # 按关联表批量删除，不依赖SQLite连接上是否开启了外键级联
+    for model in (DocumentVersion, Document, ProjectImage, ProjectHistory, ProgressChangeRequest):
+        model.query.filter(model.project_id.in_(project_ids)).delete(synchronize_session=False)
+    db.session.execute(project_tags.delete().where(project_tags.c.project_id.in_(project_ids)))
+    deleted = Project.query.filter(Project.id.in_(project_ids)).delete(synchronize_session=False)
+    return deleted
+
 @project_management_bp.route('/batch_delete_projects', methods=['POST'])
 @login_required
 @log_operation('批量删除项目')
 def batch_delete_projects():
+    from .file_cleanup import wake_cleaner
+    from routes.decorators import has_permission
+    
     try:
-        data = request.get_json()
-        project_ids = data.get('project_ids', [])
-        
-        if not project_ids:
-            return jsonify({'error': '没有选择要删除的项目'}), 400
-        
-        # 导入权限检查函数
-        from routes.decorators import has_permission
-        
-        # 权限检查
-        engineer = Engineer.query.filter_by(user_id=current_user.id).first()
-        deleted_count = 0
+        # 兼容JSON请求和project_utils.js提交的表单
+        data = request.get_json(silent=True)
+        if data is not None:
+            raw_ids = data.get('project_ids', [])
+        else:
+            raw_ids = json.loads(request.form.get('project_ids', '[]') or '[]')
         
-        for project_id in project_ids:
+        requested_ids = set()
+        for raw_id in raw_ids:
             try:
-                project = Project.query.get(project_id)
-                if project:
-                    # 检查权限
-                    if (current_user.role != 'admin' and 
-                        not has_permission('delete_projects') and 
-                        (not engineer or project.assigned_engineer_id != engineer.id)):
-                        continue
-                    
-                    # 删除项目文件夹
-                    if project.materials_path and os.path.exists(project.materials_path):
-                        try:
-                            shutil.rmtree(project.materials_path)
-                        except Exception as e:
-                            print(f"无法删除项目文件夹: {project.materials_path}, 错误: {str(e)}")
-                    
-                    # 删除项目记录
-                    db.session.delete(project)
-                    deleted_count += 1
-            except Exception as e:
-                print(f"删除项目 {project_id} 失败: {str(e)}")
+                requested_ids.add(int(raw_id))
+            except (TypeError, ValueError):
+                continue
         
+        if not requested_ids:
+            return jsonify({'error': '没有选择要删除的项目'}), 400
+        
+        # 一次查询完成权限过滤：管理员或具有删除权限的用户可删除全部，工程师只能删除自己的项目
+        query = db.session.query(Project.id).filter(Project.id.in_(requested_ids))
+        if current_user.role != 'admin' and not has_permission('delete_projects'):
+            engineer = current_engineer()
+            if not engineer:
+                return jsonify({'error': '没有权限删除项目'}), 403
+            query = query.filter(Project.assigned_engineer_id == engineer.id)
+        allowed_ids = [row.id for row in query]
+        
+        deleted_count = _delete_projects_bulk(allowed_ids)
+        # 数据库删除和墓碑记录在同一事务中提交，之后再清理磁盘
         db.session.commit()
-        return jsonify({'success': True, 'deleted_count': deleted_count})
+        if allowed_ids:
+            wake_cleaner()
+        
+        return jsonify({
+            'success': True,
+            'deleted_count': deleted_count,
+            'skipped_ids': sorted(requested_ids - set(allowed_ids))
+        })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def set_project_tags(project, tag_ids):
+    """
+    把项目的标签设置为tag_ids
+
+    一次IN查询过滤掉不存在的标签，与project_tags中的现有关联比较后只插入新增的、删除移除的记录。
+    只加入当前会话，由调用方统一提交；项目必须已经有ID
+
+    Returns:
+        tuple: (新增的标签ID集合, 移除的标签ID集合)
+    """
+    wanted = set()
+    for tag_id in tag_ids:
+        try:
+            wanted.add(int(tag_id))
+        except (TypeError, ValueError):
+            continue
+    if wanted:
+        wanted = {tag_id for tag_id, in db.session.query(Tag.id).filter(Tag.id.in_(wanted))}
+    
+    current = {tag_id for tag_id, in db.session.query(project_tags.c.tag_id).filter(project_tags.c.project_id == project.id)}
+    added = wanted - current
+    removed = current - wanted
+    if removed:
+        db.session.execute(project_tags.delete().where(
+            project_tags.c.project_id == project.id, project_tags.c.tag_id.in_(removed)))
+    if added:
+        db.session.execute(project_tags.insert(), [{'project_id': project.id, 'tag_id': tag_id} for tag_id in sorted(added)])
+    if added or removed:
+        # 关联表已直接修改，下次访问project.tags时重新加载
+        db.session.expire(project, ['tags'])
+    return added, removed
+
+def bulk_assign_engineer(project_ids, engineer, changed_by):
+    """
+    把一批项目分配给同一个工程师
+
+    一次查询读取原分配情况，一条UPDATE ... WHERE id IN (...)完成分配，
+    ProjectHistory记录批量插入。只加入当前会话，由调用方提交。
+
+    Returns:
+        dict: 项目ID -> 结果（assigned / unchanged / not_found）
+    """
+    current = dict(db.session.query(Project.id, Project.assigned_engineer_id)
+                   .filter(Project.id.in_(project_ids)).all())
+    outcomes = {}
+    to_assign = []
+    for project_id in project_ids:
+        if project_id not in current:
+            outcomes[project_id] = 'not_found'
+        elif current[project_id] == engineer.id:
+            outcomes[project_id] = 'unchanged'
+        else:
+            outcomes[project_id] = 'assigned'
+            to_assign.append(project_id)
+    
+    if to_assign:
+        now = datetime.utcnow()
+        Project.query.filter(Project.id.in_(to_assign)).update({
+            Project.assigned_engineer_id: engineer.id,
+            Project.assigned_time: now,
+            Project.updated_at: now,
+            Project.updated_by: current_user.id
+        }, synchronize_session=False)
+        
+        db.session.execute(ProjectHistory.__table__.insert(), [
+            {
+                'project_id': project_id,
+                'changed_by': changed_by,
+                'changed_at': now,
+                'field_name': 'assigned_engineer_id',
+                'old_value': None if current[project_id] is None else str(current[project_id]),
+                'new_value': str(engineer.id),
+                'notes': f'批量分配给工程师 {engineer.name}'
+            }
+            for project_id in to_assign
+        ])
+    
+    return outcomes
+
+@project_management_bp.route('/batch_assign_engineer', methods=['POST'])
+@login_required
+@log_operation('批量分配工程师')
+def batch_assign_engineer():
+    """批量分配工程师的API，请求体: {"project_ids": [...], "engineer_id": ...}"""
+    from routes.decorators import has_permission
+    
+    # 权限只检查一次：超级管理员或具有分配项目权限的用户
+    if not (current_user.role_level == 0 or current_user.role == 'super_admin' or has_permission('assign_projects')):
+        return jsonify({'error': '没有权限分配工程师'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    project_ids = []
+    for raw_id in data.get('project_ids', []):
+        try:
+            project_id = int(raw_id)
+        except (TypeError, ValueError):
+            continue
+        if project_id not in project_ids:
+            project_ids.append(project_id)
+    
+    if not project_ids:
+        return jsonify({'error': '没有选择要分配的项目'}), 400
+    
+    # 目标工程师只校验一次
+    try:
+        engineer = Engineer.query.get(int(data.get('engineer_id')))
+    except (TypeError, ValueError):
+        engineer = None
+    if not engineer:
+        return jsonify({'error': '工程师不存在'}), 400
+    
+    try:
+        outcomes = bulk_assign_engineer(project_ids, engineer, current_user.username)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'分配失败: {str(e)}'}), 500
+    
+    assigned_count = sum(1 for result in outcomes.values() if result == 'assigned')
+    return jsonify({
+        'success': True,
+        'engineer': {'id': engineer.id, 'name': engineer.name},
+        'assigned_count': assigned_count,
+        'results': [{'id': project_id, 'result': outcomes[project_id]} for project_id in project_ids]
+    })
+
 @project_management_bp.route('/reject_tag/<int:request_id>')
 @login_required
 @role_required('admin')
@@ -710,7 +901,7 @@ def get_project_details(project_id):
             return jsonify({'error': '项目不存在'}), 404
         
         # 检查权限
-        engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+        engineer = current_engineer()
         if engineer and project.assigned_engineer_id != engineer.id and current_user.role != 'admin':
             return jsonify({'error': '没有权限查看此项目'}), 403
         
@@ -728,9 +919,48 @@ def get_project_details(project_id):
             'tags': [{'id': tag.id, 'name': tag.name} for tag in project.tags],
             'created_time': project.created_time.strftime('%Y-%m-%d %H:%M:%S') if project.created_time else '',
             'progress': project.progress,
-            'documents': [{'id': doc.id, 'filename': doc.filename, 'filepath': doc.filepath, 'type': doc.type} for doc in project.documents]
+            'documents': [{'id': doc.id, 'filename': doc.filename, 'filepath': doc.filepath, 'type': doc.type,
+                           'thumbnail': thumbnail_url(doc.filepath, 'card') if doc.type == 'image' else None}
+                          for doc in project.documents],
+            # 图片使用签名URL，浏览器加载时不经过Flask请求流程
+            'images': [{'id': image.id, 'filename': image.filename, 'filepath': media_url_for_path(image.filepath),
+                        'thumbnail': thumbnail_url(image.filepath, 'card')}
+                       for image in sorted(project.images, key=lambda image: image.order_index or 0)]
         }
         
         return jsonify(project_data)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@project_management_bp.route('/project_history/<int:project_id>')
+@login_required
+def project_history(project_id):
+    """获取项目变更时间线的API"""
+    from .history import project_timeline
+    
+    project = Project.query.get(project_id)
+    if not project:
+        return jsonify({'error': '项目不存在'}), 404
+    
+    # 检查权限
+    engineer = current_engineer()
+    if engineer and project.assigned_engineer_id != engineer.id and current_user.role != 'admin':
+        return jsonify({'error': '没有权限查看此项目'}), 403
+    
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    before_id = request.args.get('before_id', type=int)
+    entries = project_timeline(project_id, limit=limit, before_id=before_id)
+    
+    return jsonify({
+        'project_id': project_id,
+        'history': [{
+            'id': entry.id,
+            'field_name': entry.field_name,
+            'old_value': entry.old_value,
+            'new_value': entry.new_value,
+            'changed_by': entry.changed_by,
+            'changed_at': entry.changed_at.strftime('%Y-%m-%d %H:%M:%S') if entry.changed_at else '',
+            'notes': entry.notes
+        } for entry in entries],
+        'next_before_id': entries[-1].id if len(entries) == limit else None
+    })
@@ -0,0 +1,205 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, func, or_
+from sqlalchemy.orm import Session
+from .models import Project, Engineer, Tag, project_tags, db
+from .metrics import record_cache
+from .utils import prefix_upper_bound
+
+# 客服项目查询
+# 在数据库中完成筛选，只返回当前页需要的字段；名称使用索引范围扫描做前缀匹配，
+# 适合输入联想。相同条件的查询结果在进程内缓存一小段时间，应对客服反复查询热门项目。
+# 项目、工程师、标签或项目标签变化的事务提交后更新版本文件，所有进程的缓存随之失效（与参考数据缓存相同）；
+# 包括Project.query.update()和project_tags.insert()等通过Session执行的批量语句。
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# 热门结果缓存
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 256
+
+VERSION_FILENAME = 'project_search.version'
+# 影响查询结果的表
+_WATCHED_TABLES = {Project.__tablename__, Engineer.__tablename__, Tag.__tablename__, project_tags.name}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_state = {'stamp': None}
+
+
+def _version_path():
+    return os.path.join(current_app.instance_path, VERSION_FILENAME)
+
+
+def _current_stamp():
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _cache_get(key):
+    stamp = _current_stamp()
+    with _cache_lock:
+        if _cache_state['stamp'] != stamp:
+            # 其他进程提交了项目修改
+            _cache.clear()
+            _cache_state['stamp'] = stamp
+        item = _cache.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return value
+
+
+def _cache_set(key, value):
+    with _cache_lock:
+        _cache[key] = (time.time() + CACHE_TTL_SECONDS, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def clear_search_cache():
+    """项目数据变化后调用，使所有进程的查询缓存失效（ORM提交时自动调用）"""
+    path = _version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    now_ns = time.time_ns()
+    os.utime(path, ns=(now_ns, now_ns))
+    with _cache_lock:
+        _cache.clear()
+        _cache_state['stamp'] = None
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_project_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Project, Engineer, Tag)):
+            session.info['project_search_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_changes(orm_execute_state):
+    """批量UPDATE/DELETE/INSERT不经过flush，按语句的目标表判断"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and getattr(table, 'name', None) in _WATCHED_TABLES:
+        orm_execute_state.session.info['project_search_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('project_search_changed', False) and has_app_context():
+        clear_search_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('project_search_changed', None)
+
+
+def _prefix_filter(keyword):
+    """
+    名称前缀匹配，使用 name >= kw AND name < 上界 的范围条件（上界见prefix_upper_bound），
+    可以直接利用name列上的索引（LIKE 'kw%' 在SQLite默认设置下无法使用索引）；
+    输入纯数字时同时按项目编号匹配
+    """
+    upper = prefix_upper_bound(keyword)
+    conditions = [Project.name >= keyword if upper is None else and_(Project.name >= keyword, Project.name < upper)]
+    if keyword.isdigit():
+        conditions.append(Project.id == int(keyword))
+    return or_(*conditions)
+
+
+def search_projects(keyword='', progress='', engineer_id=None, tag_ids=None, limit=DEFAULT_LIMIT, offset=0):
+    """
+    按条件查询项目
+
+    Args:
+        keyword: 项目名称前缀或项目编号
+        progress: 项目进度
+        engineer_id: 负责工程师ID，0表示未分配
+        tag_ids: 标签ID列表，项目需要包含全部标签
+        limit: 每次返回的最大条数
+        offset: 偏移量，用于加载更多
+
+    Returns:
+        dict: {'projects': [...], 'has_more': bool, 'offset': int, 'limit': int}
+    """
+    keyword = (keyword or '').strip()
+    progress = (progress or '').strip()
+    tag_ids = sorted(set(tag_ids or []))
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    offset = max(0, offset or 0)
+
+    cache_key = (keyword, progress, engineer_id, tuple(tag_ids), limit, offset)
+    cached = _cache_get(cache_key)
+    record_cache('project_search', cached is not None)
+    if cached is not None:
+        return cached
+
+    query = db.session.query(
+        Project.id, Project.name, Project.progress, Project.project_type,
+        Project.group_name, Project.created_time, Engineer.name.label('engineer_name')
+    ).outerjoin(Engineer, Project.assigned_engineer_id == Engineer.id)
+
+    if keyword:
+        query = query.filter(_prefix_filter(keyword))
+    if progress:
+        query = query.filter(Project.progress == progress)
+    if engineer_id is not None:
+        if engineer_id == 0:
+            query = query.filter(Project.assigned_engineer_id.is_(None))
+        else:
+            query = query.filter(Project.assigned_engineer_id == engineer_id)
+    if tag_ids:
+        # 包含全部所选标签的项目
+        tagged = db.session.query(project_tags.c.project_id).filter(
+            project_tags.c.tag_id.in_(tag_ids)
+        ).group_by(project_tags.c.project_id).having(
+            func.count(project_tags.c.tag_id) == len(tag_ids)
+        )
+        query = query.filter(Project.id.in_(tagged))
+
+    # 多取一条用于判断是否还有更多结果
+    rows = query.order_by(Project.name, Project.id).offset(offset).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # 一次查询获取当前页项目的标签
+    tags_by_project = {}
+    project_ids = [row.id for row in rows]
+    if project_ids:
+        for project_id, tag_name in db.session.query(project_tags.c.project_id, Tag.name).join(
+                Tag, Tag.id == project_tags.c.tag_id).filter(project_tags.c.project_id.in_(project_ids)):
+            tags_by_project.setdefault(project_id, []).append(tag_name)
+
+    result = {
+        'projects': [{
+            'id': row.id,
+            'name': row.name,
+            'progress': row.progress,
+            'project_type': row.project_type,
+            'group_name': row.group_name or '',
+            'engineer_name': row.engineer_name or '',
+            'created_time': row.created_time.strftime('%Y-%m-%d') if row.created_time else '',
+            'tags': tags_by_project.get(row.id, [])
+        } for row in rows],
+        'has_more': has_more,
+        'offset': offset,
+        'limit': limit
+    }
+    _cache_set(cache_key, result)
+    return result
@@ -0,0 +1,125 @@
+import time
+import logging
+from flask import g, has_app_context, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# SQL执行统计
+# 在所有数据库连接的before/after_cursor_execute上计时，按应用上下文（即每个请求）累计查询次数和耗时，
+# 供访问日志等使用。另外：
+#   - 超过SLOW_QUERY_SECONDS的语句连同EXPLAIN QUERY PLAN一起记录到sql.slow日志；
+#     参数中可能有密码哈希、会话ID等，只记录参数个数
+#   - 单个请求的查询次数超过QUERY_BUDGET时记录警告，调试模式下在响应头中提示
+#
+# 相关配置:
+#   SLOW_QUERY_SECONDS: 慢查询阈值（秒），0表示不记录
+#   QUERY_BUDGET: 每个请求的查询次数上限，0表示不检查
+#   QUERY_STATS_HEADERS: 非调试模式下也返回X-Query-Count等响应头
+
+DEFAULT_SLOW_QUERY_SECONDS = 0.2
+DEFAULT_QUERY_BUDGET = 50
+MAX_LOGGED_STATEMENT = 2000
+
+logger = logging.getLogger('sql.slow')
+_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if not has_app_context():
+        return
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = {'count': 0, 'seconds': 0.0}
+    stats['count'] += 1
+    stats['seconds'] += elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_SECONDS', DEFAULT_SLOW_QUERY_SECONDS)
+    if threshold and elapsed >= threshold:
+        _log_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+
+def _explain(cursor, statement, parameters):
+    """在同一个DBAPI连接上执行EXPLAIN QUERY PLAN（只支持SQLite的SELECT语句），失败时返回None"""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())
+            return [row[-1] for row in explain_cursor.fetchall()]
+        finally:
+            explain_cursor.close()
+    except Exception:
+        return None
+
+
+def _describe_parameters(parameters, executemany):
+    """参数个数（不记录参数值）"""
+    if not parameters:
+        return '无'
+    if executemany:
+        return f'{len(parameters)}组'
+    return f'{len(parameters)}个'
+
+
+def _log_slow_query(cursor, statement, parameters, executemany, elapsed):
+    plan = None if executemany else _explain(cursor, statement, parameters)
+    endpoint = request.endpoint if request else None
+    logger.warning(
+        "慢查询 %.1fms [%s]: %s | 参数: %s | 查询计划: %s",
+        elapsed * 1000, endpoint, statement[:MAX_LOGGED_STATEMENT],
+        _describe_parameters(parameters, executemany),
+        ' / '.join(plan) if plan else '无'
+    )
+
+
+def install_query_stats(app=None):
+    """
+    注册SQLAlchemy事件（重复调用时只注册一次）
+
+    Args:
+        app: 传入时同时注册查询次数检查
+    """
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+    if app is not None:
+        app.after_request(_check_query_budget)
+
+
+def current_query_stats():
+    """
+    当前请求到目前为止的SQL统计
+
+    Returns:
+        tuple: (查询次数, 总耗时秒数)
+    """
+    stats = g.get('_query_stats') if has_app_context() else None
+    if not stats:
+        return 0, 0.0
+    return stats['count'], stats['seconds']
+
+
+def _check_query_budget(response):
+    budget = current_app.config.get('QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+    count, seconds = current_query_stats()
+    show_headers = current_app.debug or current_app.config.get('QUERY_STATS_HEADERS')
+    if show_headers:
+        response.headers['X-Query-Count'] = str(count)
+        response.headers['X-Query-Time-Ms'] = f'{seconds * 1000:.1f}'
+    if budget and count > budget:
+        logger.warning("请求查询次数超出预算: %s %s [%s] 共%d次（预算%d次），耗时%.1fms",
+                       request.method, request.path, request.endpoint, count, budget, seconds * 1000)
+        if show_headers:
+            response.headers['X-Query-Budget-Exceeded'] = f'{count}/{budget}'
+    return response
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+from datetime import datetime
+from flask import current_app
+from .models import Document, ProjectImage, TrainingMaterial, db
+from .transcode import RENDITIONS_DIRNAME
+
+# 文件系统/数据库对账扫描器
+# 只生成报告，不在页面渲染过程中删除任何记录
+
+# 默认扫描的上传目录
+SCAN_ROOTS = [
+    os.path.join('static', 'uploads', 'projects'),
+    os.path.join('static', 'uploads', 'documents'),
+    os.path.join('static', 'uploads', 'videos'),
+]
+
+# 程序生成的文件（视频转码输出），不参与对账
+EXCLUDED_DIRS = [
+    os.path.join('static', 'uploads', 'videos', RENDITIONS_DIRNAME),
+]
+
+STATE_FILENAME = 'reconcile_state.json'
+REPORT_FILENAME = 'reconcile_report.json'
+
+
+def _norm(path):
+    """统一路径格式，便于比较"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _state_path():
+    return os.path.join(current_app.instance_path, STATE_FILENAME)
+
+
+def report_path():
+    return os.path.join(current_app.instance_path, REPORT_FILENAME)
+
+
+def load_scan_state(path=None):
+    """读取上一次扫描的状态，不存在或损坏时返回空状态"""
+    path = path or _state_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if isinstance(state, dict) and 'dirs' in state:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {'dirs': {}, 'scanned_at': None}
+
+
+def save_scan_state(state, path=None):
+    """原子写入扫描状态"""
+    path = path or _state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def scan_tree(root, previous_dirs, full=False):
+    """
+    使用os.scandir遍历目录树
+
+    目录的mtime未变化时直接复用上次记录的文件列表（新增/删除/重命名文件都会改变目录mtime），
+    只有发生变化的目录才重新列举。原地覆盖文件不会改变目录的mtime，
+    所以复用的目录仍然逐个stat已知文件，刷新mtime/size。
+
+    Returns:
+        tuple: (dirs, stats)，dirs为新的目录状态，stats为本次扫描的统计
+    """
+    dirs = {}
+    stats = {'dirs_listed': 0, 'dirs_reused': 0}
+    excluded = {_norm(path) for path in EXCLUDED_DIRS}
+    pending = [_norm(root)]
+
+    while pending:
+        current = pending.pop()
+        if current in excluded:
+            continue
+        try:
+            dir_mtime = os.stat(current).st_mtime
+        except OSError:
+            continue
+
+        cached = previous_dirs.get(current)
+        if not full and cached and cached.get('mtime') == dir_mtime:
+            files = {}
+            for name in cached.get('files', {}):
+                try:
+                    st = os.stat(os.path.join(current, name), follow_symlinks=False)
+                except OSError:
+                    continue
+                files[name] = [st.st_mtime, st.st_size]
+            dirs[current] = {'mtime': dir_mtime, 'files': files, 'subdirs': cached.get('subdirs', [])}
+            stats['dirs_reused'] += 1
+            pending.extend(os.path.join(current, name) for name in cached.get('subdirs', []))
+            continue
+
+        files = {}
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            files[entry.name] = [st.st_mtime, st.st_size]
+                    except OSError:
+                        continue
+        except OSError as e:
+            current_app.logger.warning(f"扫描目录失败: {current}, 错误: {str(e)}")
+            continue
+
+        dirs[current] = {'mtime': dir_mtime, 'files': files, 'subdirs': subdirs}
+        stats['dirs_listed'] += 1
+        pending.extend(os.path.join(current, name) for name in subdirs)
+
+    return dirs, stats
+
+
+def _document_candidates(filepath):
+    """
+    Document.filepath历史上有多种写法：
+    upload_materials保存的是相对PROJECTS_DIR的路径，旧代码保存的是绝对路径或相对工作目录的路径
+    """
+    if not filepath:
+        return []
+    if os.path.isabs(filepath):
+        return [_norm(filepath)]
+    return [_norm(os.path.join(SCAN_ROOTS[0], filepath)), _norm(filepath)]
+
+
+def _under_roots(path, roots):
+    return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+
+def _diff_files(previous_dirs, dirs):
+    """对比前后两次扫描，统计新增、修改和消失的文件"""
+    def flatten(state_dirs):
+        result = {}
+        for dir_path, info in state_dirs.items():
+            for name, meta in info.get('files', {}).items():
+                result[os.path.join(dir_path, name)] = meta
+        return result
+
+    before = flatten(previous_dirs)
+    after = flatten(dirs)
+    added = [p for p in after if p not in before]
+    removed = [p for p in before if p not in after]
+    changed = [p for p, meta in after.items() if p in before and before[p] != meta]
+    return after, added, removed, changed
+
+
+def run_reconcile(roots=None, full=False, save=True):
+    """
+    执行一次对账扫描并生成报告（需要在应用上下文中调用）
+
+    Args:
+        roots: 需要扫描的目录列表，默认使用SCAN_ROOTS
+        full: 为True时忽略上次的状态，重新列举所有目录
+        save: 是否保存扫描状态和报告
+
+    Returns:
+        dict: 对账报告
+    """
+    started = time.time()
+    roots = [_norm(r) for r in (roots or SCAN_ROOTS)]
+    state = load_scan_state()
+    previous_dirs = {} if full else state.get('dirs', {})
+
+    dirs = {}
+    scan_stats = {'dirs_listed': 0, 'dirs_reused': 0}
+    for root in roots:
+        root_dirs, stats = scan_tree(root, previous_dirs, full=full)
+        dirs.update(root_dirs)
+        for key in scan_stats:
+            scan_stats[key] += stats[key]
+
+    disk_files, added, removed, changed = _diff_files(
+        {k: v for k, v in previous_dirs.items() if _under_roots(k, roots)}, dirs)
+
+    # 一次性批量读取数据库中引用的文件路径
+    referenced = set()
+    missing_documents = []
+    for doc_id, project_id, filename, filepath in db.session.query(
+            Document.id, Document.project_id, Document.filename, Document.filepath):
+        candidates = _document_candidates(filepath)
+        referenced.update(candidates)
+        if any(c in disk_files for c in candidates):
+            continue
+        # 扫描范围之外的路径无法通过扫描结果判断，单独检查
+        outside = [c for c in candidates if not _under_roots(c, roots)]
+        if outside and any(os.path.exists(c) for c in outside):
+            continue
+        missing_documents.append({
+            'id': doc_id,
+            'project_id': project_id,
+            'filename': filename,
+            'filepath': filepath
+        })
+
+    # 项目图片和培训资料也引用了上传目录中的文件，避免被误报为孤立文件
+    for (filepath,) in db.session.query(ProjectImage.filepath):
+        referenced.update(_document_candidates(filepath))
+    for (filepath,) in db.session.query(TrainingMaterial.file_path).filter(TrainingMaterial.file_path.isnot(None)):
+        referenced.add(_norm(filepath))
+
+    orphan_files = [
+        {'path': p, 'size': disk_files[p][1]} for p in sorted(disk_files) if p not in referenced
+    ]
+
+    report = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'roots': roots,
+        'incremental': not full and bool(previous_dirs),
+        'duration': round(time.time() - started, 3),
+        'scan': scan_stats,
+        'total_files': len(disk_files),
+        'added_files': sorted(added),
+        'removed_files': sorted(removed),
+        'changed_files': sorted(changed),
+        'missing_documents': missing_documents,
+        'orphan_files': orphan_files,
+    }
+
+    if save:
+        save_scan_state({'dirs': dirs, 'scanned_at': report['generated_at']})
+        with open(report_path(), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return report
+
+
+def load_last_report():
+    """读取最近一次保存的对账报告，没有则返回None"""
+    try:
+        with open(report_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
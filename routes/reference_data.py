@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from collections import namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import Engineer, Tag, db
+from .metrics import record_cache
+
+# 工程师和标签等参考数据缓存
+# 项目列表和项目表单每次都要显示全部工程师和标签，这些表很小且很少变化。
+# 这里把它们读成只读的命名元组保存在进程内，按版本文件判断是否需要重新读取（与培训资料目录相同）。
+# 通过ORM新增、修改或删除工程师/标签的事务提交后自动更新版本文件；
+# 用原生SQL修改这两张表时需要调用invalidate_reference_data。
+
+VERSION_FILENAME = 'reference_data.version'
+
+EngineerRef = namedtuple('EngineerRef', ['id', 'user_id', 'name'])
+TagRef = namedtuple('TagRef', ['id', 'name', 'created_by', 'created_at'])
+
+_cache = {'stamp': None, 'data': None}
+_lock = threading.Lock()
+
+
+def _version_path():
+    return os.path.join(current_app.instance_path, VERSION_FILENAME)
+
+
+def _current_stamp():
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def invalidate_reference_data():
+    """工程师或标签变化后调用，使所有进程的缓存失效"""
+    path = _version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    now_ns = time.time_ns()
+    os.utime(path, ns=(now_ns, now_ns))
+    with _lock:
+        _cache['stamp'] = None
+        _cache['data'] = None
+
+
+def _load():
+    engineers = tuple(EngineerRef(*row) for row in db.session.query(
+        Engineer.id, Engineer.user_id, Engineer.name).order_by(Engineer.id))
+    tags = tuple(TagRef(*row) for row in db.session.query(
+        Tag.id, Tag.name, Tag.created_by, Tag.created_at).order_by(Tag.id))
+    return {
+        'engineers': engineers,
+        'tags': tags,
+        'tags_by_name': tuple(sorted(tags, key=lambda tag: tag.name)),
+    }
+
+
+def _get(key):
+    stamp = _current_stamp()
+    data = _cache['data']
+    if data is not None and _cache['stamp'] == stamp:
+        record_cache('reference_data', True)
+    else:
+        with _lock:
+            if _cache['data'] is None or _cache['stamp'] != stamp:
+                record_cache('reference_data', False)
+                _cache['data'] = _load()
+                _cache['stamp'] = stamp
+            data = _cache['data']
+    return data[key]
+
+
+def get_engineers():
+    """全部工程师，按ID排序"""
+    return _get('engineers')
+
+
+def get_tags(order_by_name=False):
+    """全部标签，默认按ID排序"""
+    return _get('tags_by_name' if order_by_name else 'tags')
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_reference_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Engineer, Tag)):
+            session.info['reference_data_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('reference_data_changed', False) and has_app_context():
+        invalidate_reference_data()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('reference_data_changed', None)
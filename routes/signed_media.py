@@ -0,0 +1,168 @@
+import os
+import time
+import base64
+import hashlib
+import hmac
+from urllib.parse import quote, parse_qs
+from flask import current_app
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Response
+from .file_serving import x_accel_uri
+
+# 视频和项目图片的签名URL
+# URL格式: /media/<类别>/<相对路径>?e=<过期时间戳>&s=<签名>
+# 签名算法与Nginx secure_link模块兼容（secure_link_md5 "$secure_link_expires$uri $secret"），
+# 既可以由反向代理直接校验并发送文件，也可以由SignedMediaMiddleware在进入Flask之前处理，
+# 不经过会话管理、请求日志和数据库。
+#
+# 相关配置:
+#   MEDIA_URL_SECRET: 签名密钥，多进程部署或由Nginx校验时必须显式配置
+#   MEDIA_URL_TTL: 签名有效期（秒）
+#   MEDIA_URL_BUCKET: 过期时间按该粒度向上取整，同一时间段内生成的URL相同，便于浏览器缓存
+
+MEDIA_PREFIX = '/media/'
+
+# URL中的类别与本地目录的对应关系
+MEDIA_ROOTS = {
+    'videos': os.path.join('static', 'uploads', 'videos'),
+    'projects': os.path.join('static', 'uploads', 'projects'),
+}
+
+DEFAULT_TTL = 6 * 3600
+DEFAULT_BUCKET = 3600
+
+
+def _secret(config):
+    secret = config.get('MEDIA_URL_SECRET') or config.get('SECRET_KEY') or ''
+    return secret.decode('latin-1') if isinstance(secret, bytes) else secret
+
+
+def compute_signature(uri, expires, secret):
+    """计算签名：base64url(md5(expires + uri + ' ' + secret))，不带填充"""
+    digest = hashlib.md5(f'{expires}{uri} {secret}'.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+
+def signed_media_url(kind, relative_path, ttl=None):
+    """
+    生成签名URL（需要在应用上下文中调用）
+
+    Args:
+        kind: 类别，MEDIA_ROOTS中的键
+        relative_path: 相对类别目录的文件路径
+        ttl: 有效期（秒），默认使用MEDIA_URL_TTL
+    """
+    config = current_app.config
+    ttl = ttl or config.get('MEDIA_URL_TTL', DEFAULT_TTL)
+    bucket = config.get('MEDIA_URL_BUCKET', DEFAULT_BUCKET)
+    expires = int(time.time()) + ttl
+    expires += (-expires) % bucket
+
+    relative_path = relative_path.replace('\\', '/').lstrip('/')
+    uri = f'{MEDIA_PREFIX}{kind}/{relative_path}'
+    signature = compute_signature(uri, expires, _secret(config))
+    return f'{quote(uri)}?e={expires}&s={signature}'
+
+
+def media_url_for_path(filepath, ttl=None):
+    """把上传目录中的文件路径转换为签名URL，不在签名目录中的路径按原静态路径返回"""
+    if not filepath:
+        return ''
+    normalized = filepath.replace('\\', '/')
+    absolute = os.path.abspath(filepath)
+    for kind, root in MEDIA_ROOTS.items():
+        root = os.path.abspath(root)
+        if absolute.startswith(root + os.sep):
+            return signed_media_url(kind, os.path.relpath(absolute, root), ttl=ttl)
+    return '/' + normalized.lstrip('/')
+
+
+def check_media_secret(app):
+    """
+    启动时检查签名密钥
+
+    未配置MEDIA_URL_SECRET时使用SECRET_KEY，而SECRET_KEY每次启动随机生成（不预加载时每个工作进程也不同），
+    重启后已发出的链接全部失效，Nginx也无法用同一个密钥校验签名。
+    通过Nginx发送文件（FILE_OFFLOAD=x-accel）时必须配置，否则拒绝启动；其他情况记录警告。
+
+    Raises:
+        RuntimeError: FILE_OFFLOAD为x-accel且未配置MEDIA_URL_SECRET
+    """
+    if app.config.get('MEDIA_URL_SECRET'):
+        return
+    if (app.config.get('FILE_OFFLOAD') or '').lower() == 'x-accel':
+        raise RuntimeError('FILE_OFFLOAD=x-accel时必须通过环境变量MEDIA_URL_SECRET配置媒体签名密钥（与Nginx secure_link使用同一个值）')
+    app.logger.warning('未配置MEDIA_URL_SECRET，媒体签名URL使用随机生成的SECRET_KEY：'
+                       '服务重启后已发出的视频和图片链接失效，不预加载应用的多进程部署中各进程的链接互不通用')
+
+
+class SignedMediaMiddleware:
+    """在WSGI层处理/media/请求，校验签名后直接发送文件"""
+
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.config = app.config
+        self.roots = {kind: os.path.abspath(root) for kind, root in MEDIA_ROOTS.items()}
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(MEDIA_PREFIX):
+            return self.wsgi_app(environ, start_response)
+        return self._serve(environ, path)(environ, start_response)
+
+    def _serve(self, environ, path):
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return Response('Method Not Allowed', status=405)
+
+        # WSGI中的PATH_INFO按latin-1解码，还原为UTF-8路径
+        try:
+            uri = path.encode('latin-1').decode('utf-8')
+        except UnicodeError:
+            return Response('Not Found', status=404)
+
+        kind, _, relative_path = uri[len(MEDIA_PREFIX):].partition('/')
+        root = self.roots.get(kind)
+        if not root or not relative_path:
+            return Response('Not Found', status=404)
+
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        expires = query.get('e', [''])[0]
+        signature = query.get('s', [''])[0]
+        if not expires.isdigit() or not signature:
+            return Response('Forbidden', status=403)
+        expected = compute_signature(uri, expires, _secret(self.config))
+        if not hmac.compare_digest(expected, signature):
+            return Response('Forbidden', status=403)
+        remaining = int(expires) - int(time.time())
+        if remaining <= 0:
+            return Response('Link Expired', status=410)
+
+        file_path = safe_join(root, relative_path)
+        if file_path is None or not os.path.isfile(file_path):
+            return Response('Not Found', status=404)
+
+        offload = (self.config.get('FILE_OFFLOAD') or '').lower()
+        if offload == 'x-accel':
+            internal_uri = x_accel_uri(file_path, self.config.get('X_ACCEL_MAPPINGS'))
+            if internal_uri:
+                response = Response('')
+                response.headers['X-Accel-Redirect'] = internal_uri
+                response.headers['Cache-Control'] = f'private, max-age={remaining}'
+                # 由Nginx根据扩展名设置Content-Type
+                del response.headers['Content-Type']
+                return response
+
+        response = send_file(
+            file_path,
+            environ,
+            conditional=True,
+            etag=True,
+            max_age=remaining,
+            use_x_sendfile=(offload == 'x-sendfile'),
+        )
+        # 签名URL只给当前用户使用，不允许共享缓存
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
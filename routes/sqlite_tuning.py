@@ -0,0 +1,125 @@
+import re
+import weakref
+from flask import current_app
+from sqlalchemy import event
+
+# SQLite连接参数
+# PRAGMA大多只对当前连接有效（journal_mode=WAL除外，它写入数据库文件），连接池每新建一个连接都要重新设置，
+# 所以在引擎的connect事件中执行，gunicorn的每个工作进程、每个线程使用的连接都会得到同样的配置。
+#
+# 相关配置:
+#   SQLITE_PRAGMAS: 覆盖默认值的字典，如 {'cache_size': -32000, 'mmap_size': 0}；值为None时不设置该项
+#   环境变量SQLITE_PRAGMAS: 同上，格式为 cache_size=-32000,mmap_size=0
+
+DEFAULT_PRAGMAS = {
+    'foreign_keys': 'ON',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL模式下NORMAL不会损坏数据库，只可能丢失最后几个事务
+    'cache_size': -64000,  # 负数单位为KB，约64MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # 其他连接写入时最多等待5秒，而不是立即报database is locked
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+_NAME_RE = re.compile(r'^[a-z_]+$')
+_VALUE_RE = re.compile(r'^-?\d+$|^[A-Za-z_]+$')
+_registered = weakref.WeakSet()
+
+
+def parse_pragmas(value):
+    """解析环境变量中的 名称=值,名称=值"""
+    pragmas = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        name, _, setting = item.partition('=')
+        setting = setting.strip()
+        pragmas[name.strip().lower()] = None if setting.lower() in ('', 'none') else setting
+    return pragmas
+
+
+def pragma_profile(config):
+    """
+    合并默认值和配置后的PRAGMA列表
+
+    Returns:
+        list: [(名称, 值)]，按执行顺序排列
+
+    Raises:
+        ValueError: 名称或值不合法（PRAGMA不支持参数绑定，只能拼接到语句中）
+    """
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas.update(config.get('SQLITE_PRAGMAS') or {})
+    profile = []
+    for name, value in pragmas.items():
+        if value is None:
+            continue
+        value = str(value)
+        if not _NAME_RE.match(name) or not _VALUE_RE.match(value):
+            raise ValueError(f"无效的SQLite参数: {name}={value}")
+        profile.append((name, value))
+    return profile
+
+
+def _listener(profile):
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in profile:
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return apply_pragmas
+
+
+def init_sqlite_tuning(app):
+    """为应用的SQLite引擎注册connect事件（需在db.init_app之后调用）"""
+    from .models import db
+    profile = pragma_profile(app.config)
+    app.extensions['sqlite_pragmas'] = profile
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name != 'sqlite' or engine in _registered:
+            continue
+        event.listen(engine, 'connect', _listener(profile))
+        _registered.add(engine)
+
+
+def effective_settings(connection):
+    """
+    连接上实际生效的参数
+
+    Returns:
+        dict: {名称: 值}，值为PRAGMA查询的返回结果
+    """
+    settings = {}
+    for name, _ in current_app.extensions.get('sqlite_pragmas', []):
+        row = connection.exec_driver_sql(f'PRAGMA {name}').fetchone()
+        settings[name] = row[0] if row else None
+    return settings
+
+
+def report_sqlite_settings(app):
+    """
+    启动时记录实际生效的SQLite参数，与配置不一致时（如文件系统不支持WAL、mmap_size超过编译上限）给出警告
+
+    Returns:
+        dict: {名称: 值}；不是SQLite数据库时返回空字典
+    """
+    from .models import db
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            return {}
+        with db.engine.connect() as connection:
+            settings = effective_settings(connection)
+    expected = {'ON': '1', 'OFF': '0', 'NORMAL': '1', 'FULL': '2', 'EXTRA': '3', 'MEMORY': '2', 'FILE': '1', 'DEFAULT': '0'}
+    mismatched = []
+    for name, value in app.extensions.get('sqlite_pragmas', []):
+        actual = str(settings.get(name)).lower()
+        if actual not in (value.lower(), expected.get(value.upper(), '').lower()):
+            mismatched.append(f"{name}={settings.get(name)}（配置为{value}）")
+    app.logger.info("SQLite连接参数: " + ', '.join(f"{name}={value}" for name, value in settings.items()))
+    if mismatched:
+        app.logger.warning("SQLite参数未按配置生效: " + ', '.join(mismatched))
+    return settings
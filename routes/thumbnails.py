@@ -0,0 +1,144 @@
+import os
+import tempfile
+from flask import url_for
+from flask_login import current_user
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow为可选依赖，未安装时直接使用原图
+    Image = None
+
+# 项目图片缩略图
+# 按尺寸生成缩放后的图片（支持时使用WebP），缓存在THUMBNAIL_ROOT下与原图相同的相对路径中。
+# 上传时预先生成，缺失或原图更新后在第一次请求时重新生成。
+
+PROJECTS_DIR = os.path.join('static', 'uploads', 'projects')
+THUMBNAIL_ROOT = os.path.join('static', 'uploads', 'thumbnails')
+
+# 尺寸名称: 最长边像素
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'large': 1280,
+}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def _output_format():
+    if features.check('webp'):
+        return 'WEBP', '.webp'
+    return 'JPEG', '.jpg'
+
+
+def project_relative_path(filepath):
+    """
+    把图片路径转换为相对PROJECTS_DIR的路径，不在项目目录中时返回None
+
+    Document.filepath保存的是相对PROJECTS_DIR的路径，ProjectImage.filepath保存的是相对工作目录的路径
+    """
+    if not filepath:
+        return None
+    root = os.path.abspath(PROJECTS_DIR)
+    candidates = [filepath] if os.path.isabs(filepath) else [os.path.join(PROJECTS_DIR, filepath), filepath]
+    for candidate in candidates:
+        absolute = os.path.abspath(candidate)
+        if absolute.startswith(root + os.sep) and os.path.isfile(absolute):
+            return os.path.relpath(absolute, root)
+    return None
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def thumbnail_path(relative_path, size):
+    """
+    返回缩略图文件路径，需要时生成
+
+    Returns:
+        str: 缩略图路径；Pillow未安装、尺寸无效或生成失败时返回None
+    """
+    if Image is None or size not in SIZES or not is_image(relative_path):
+        return None
+    source = os.path.join(PROJECTS_DIR, relative_path)
+    try:
+        source_mtime = os.path.getmtime(source)
+    except OSError:
+        return None
+
+    image_format, ext = _output_format()
+    target = os.path.join(THUMBNAIL_ROOT, f'{relative_path}.{size}{ext}')
+    try:
+        if os.path.getmtime(target) >= source_mtime:
+            return target
+    except OSError:
+        pass
+
+    tmp_target = None
+    try:
+        with Image.open(source) as img:
+            # 按EXIF方向旋转，避免手机照片缩略图方向错误
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((SIZES[size], SIZES[size]))
+            if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            elif img.mode not in ('RGB', 'RGBA', 'L'):
+                img = img.convert('RGBA')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # 每个请求使用独立的临时文件，多个请求同时生成同一张缩略图时互不覆盖
+            fd, tmp_target = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+            os.close(fd)
+            if image_format == 'WEBP':
+                img.save(tmp_target, 'WEBP', quality=WEBP_QUALITY, method=4)
+            else:
+                img.save(tmp_target, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp_target, target)
+    except Exception:
+        if tmp_target and os.path.exists(tmp_target):
+            os.remove(tmp_target)
+        return None
+    return target
+
+
+def generate_variants(filepath):
+    """上传后预先生成所有尺寸，返回成功生成的数量"""
+    relative_path = project_relative_path(filepath)
+    if not relative_path:
+        return 0
+    return sum(1 for size in SIZES if thumbnail_path(relative_path, size))
+
+
+def project_thumbnail_dir(materials_path):
+    """项目文件夹对应的缩略图目录，删除项目时一起清理；不在项目目录中时返回None"""
+    if not materials_path:
+        return None
+    root = os.path.abspath(PROJECTS_DIR)
+    absolute = os.path.abspath(materials_path)
+    if not absolute.startswith(root + os.sep):
+        return None
+    return os.path.join(THUMBNAIL_ROOT, os.path.relpath(absolute, root))
+
+
+def _can_use_thumbnails():
+    from .profiles import current_engineer
+    if not current_user.is_authenticated:
+        return False
+    return current_user.role == 'admin' or current_engineer() is not None
+
+
+def thumbnail_url(filepath, size='thumb'):
+    """
+    图片缩略图地址（需要在请求上下文中调用）
+
+    URL中带有原图修改时间，原图变化后地址随之变化，因此可以长期缓存。
+    缩略图接口只对管理员和负责项目的工程师开放，其他角色（如客服）使用原图的签名地址
+    """
+    relative_path = project_relative_path(filepath)
+    if not relative_path or not _can_use_thumbnails():
+        from .signed_media import media_url_for_path
+        return media_url_for_path(filepath)
+    version = int(os.path.getmtime(os.path.join(PROJECTS_DIR, relative_path)))
+    return url_for('project_management.project_thumbnail', size=size,
+                   path=relative_path.replace(os.sep, '/'), v=version)
@@ -1,27 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required
+from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
 import re
 import time
+import shutil
 from .utils import allowed_file, validate_filename
 from .decorators import role_required
 from .models import db, TrainingMaterial
+from .training_catalog import invalidate_catalog
+from .transcode import enqueue_transcode, transcode_enabled, rendition_dir
+from .video_catalog import register_video, remove_video
 
 # 创建培训资料管理蓝图
 training_bp = Blueprint('training', __name__)
 
-# 文档上传目录
+# 文档上传目录，由create_app创建
 DOCUMENT_UPLOAD_FOLDER = os.path.join('static', 'uploads', 'documents')
 VIDEO_UPLOAD_FOLDER = os.path.join('static', 'uploads', 'videos')
 
-# 确保上传目录存在
-if not os.path.exists(DOCUMENT_UPLOAD_FOLDER):
-    os.makedirs(DOCUMENT_UPLOAD_FOLDER, exist_ok=True)
-
-if not os.path.exists(VIDEO_UPLOAD_FOLDER):
-    os.makedirs(VIDEO_UPLOAD_FOLDER, exist_ok=True)
-
 @training_bp.route('/training_materials_manage', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
@@ -58,6 +55,7 @@ def add_training_material():
             
             # 检查文件是否上传
             file_path = None
+            video_filename = None
             if 'file' in request.files:
                 file = request.files['file']
                 if file and file.filename != '':
@@ -79,6 +77,10 @@ def add_training_material():
                         file_path = os.path.join(save_dir, filename)
                         file.save(file_path)
                         print(f"文件保存路径: {file_path}")
+                        if save_dir == VIDEO_UPLOAD_FOLDER:
+                            register_video(filename, uploaded_by=current_user.id,
+                                           rendition_status='pending' if transcode_enabled() else None)
+                            video_filename = filename
                     except Exception as e:
                         print(f"文件保存错误: {str(e)}")
                         flash(f'文件上传失败: {str(e)}', 'danger')
@@ -98,6 +100,10 @@ def add_training_material():
             # 添加到数据库
             db.session.add(new_material)
             db.session.commit()
+            invalidate_catalog()
+            # 提交成功后再加入后台处理队列，避免处理没有记录的文件
+            if video_filename:
+                enqueue_transcode(video_filename)
             
             flash('培训资料添加成功', 'success')
             return redirect(url_for('training.training_materials_manage'))
@@ -128,6 +134,7 @@ def edit_training_material(material_id):
         material.file_type = request.form.get('file_type')
         material.is_required = request.form.get('is_required') == 'on'
         material.display_order = request.form.get('display_order', 0, type=int)
+        video_filename = None
         
         # 检查是否上传了新文件
         if 'file' in request.files:
@@ -169,9 +176,16 @@ def edit_training_material(material_id):
                 # 保存文件
                 file.save(os.path.join(save_dir, filename))
                 material.file_path = os.path.join(save_dir, filename)
+                if save_dir == VIDEO_UPLOAD_FOLDER:
+                    register_video(filename, uploaded_by=current_user.id,
+                                   rendition_status='pending' if transcode_enabled() else None)
+                    video_filename = filename
         
         # 保存更改
         db.session.commit()
+        invalidate_catalog()
+        if video_filename:
+            enqueue_transcode(video_filename)
         
         flash('培训资料更新成功', 'success')
         return redirect(url_for('training.training_materials_manage'))
@@ -192,10 +206,18 @@ def delete_training_material(material_id):
     # 如果有文件，删除文件
     if material.file_path and os.path.exists(material.file_path):
         os.remove(material.file_path)
+    # 视频文件同时删除目录记录和转码结果
+    is_video = bool(material.file_path) and \
+        os.path.dirname(os.path.abspath(material.file_path)) == os.path.abspath(VIDEO_UPLOAD_FOLDER)
+    if is_video:
+        remove_video(os.path.basename(material.file_path))
     
     # 从数据库中删除
     db.session.delete(material)
     db.session.commit()
+    invalidate_catalog()
+    if is_video:
+        shutil.rmtree(rendition_dir(material.file_path), ignore_errors=True)
     
     flash('培训资料已删除', 'success')
     return redirect(url_for('training.training_materials_manage'))
@@ -221,6 +243,7 @@ def add_training_category():
             )
             db.session.add(temp_material)
             db.session.commit()
+            invalidate_catalog()
             flash(f'类别 "{new_category}" 添加成功', 'success')
         else:
             flash(f'类别 "{new_category}" 已存在，请直接在该类别下添加资料', 'warning')
@@ -0,0 +1,153 @@
+import os
+import time
+import threading
+from flask import current_app
+from .models import TrainingMaterial
+from .metrics import record_cache
+
+# 培训资料目录缓存
+# 类别、按顺序排列的资料列表和小写搜索键预先计算好保存在进程内，
+# 培训资料页面的筛选都在内存中完成。training蓝图修改资料时更新版本文件，
+# 各个工作进程通过比较版本文件的修改时间判断是否需要重建，不需要查询数据库。
+
+VERSION_FILENAME = 'training_catalog.version'
+UNCATEGORIZED = '未分类'
+
+_cache = {'stamp': None, 'catalog': None}
+_lock = threading.Lock()
+
+
+def _version_path():
+    return os.path.join(current_app.instance_path, VERSION_FILENAME)
+
+
+def _current_stamp():
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def invalidate_catalog():
+    """资料新增、修改或删除后调用，使所有进程的缓存失效"""
+    path = _version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    # 显式设置修改时间，避免文件系统时间精度不足导致版本不变
+    now_ns = time.time_ns()
+    os.utime(path, ns=(now_ns, now_ns))
+    with _lock:
+        _cache['stamp'] = None
+        _cache['catalog'] = None
+
+
+def _material_dict(material):
+    return {
+        'id': material.id,
+        'title': material.title,
+        'description': material.description,
+        'file_path': material.file_path,
+        'file_type': material.file_type,
+        'is_required': material.is_required
+    }
+
+
+def build_catalog():
+    """从数据库构建资料目录"""
+    materials = TrainingMaterial.query.order_by(
+        TrainingMaterial.category,
+        TrainingMaterial.display_order
+    ).all()
+
+    categories = {}
+    entries = []
+    for material in materials:
+        category = material.category.strip() if material.category else ''
+        if category and category not in categories:
+            is_basic = getattr(material, 'is_basic', False)
+            categories[category] = {
+                'name': category,
+                'is_required': material.is_required,
+                'is_basic': is_basic,
+                'badge_text': '必学' if material.is_required else ('基础' if is_basic else '进阶')
+            }
+        search_key = '\n'.join([
+            material.title or '',
+            material.description or '',
+            material.category or ''
+        ]).lower()
+        entries.append((category, search_key, _material_dict(material)))
+
+    return {
+        'categories': sorted(categories.values(), key=lambda x: x['name']),
+        'category_index': categories,
+        'entries': entries
+    }
+
+
+def get_catalog():
+    """获取资料目录，版本未变化时直接返回进程内缓存"""
+    stamp = _current_stamp()
+    catalog = _cache['catalog']
+    if catalog is not None and _cache['stamp'] == stamp:
+        record_cache('training_catalog', True)
+        return catalog
+
+    with _lock:
+        if _cache['catalog'] is None or _cache['stamp'] != stamp:
+            record_cache('training_catalog', False)
+            _cache['catalog'] = build_catalog()
+            _cache['stamp'] = stamp
+        return _cache['catalog']
+
+
+def query_catalog(search_query='', selected_category=''):
+    """
+    在内存中筛选资料
+
+    Returns:
+        tuple: (materials_by_category, categories, total_materials)，结构与training_materials.html模板一致
+    """
+    catalog = get_catalog()
+    categories = catalog['categories']
+    category_index = catalog['category_index']
+    selected_category = selected_category.strip()
+
+    entries = catalog['entries']
+    if search_query:
+        keyword = search_query.lower()
+        entries = [entry for entry in entries if keyword in entry[1]]
+    if selected_category:
+        entries = [entry for entry in entries if entry[0] == selected_category]
+
+    grouped = {}
+    uncategorized = []
+    for category, _, material in entries:
+        if category:
+            grouped.setdefault(category, []).append(material)
+        else:
+            uncategorized.append(material)
+
+    if selected_category:
+        names = [selected_category] if selected_category in category_index else []
+    else:
+        names = [category['name'] for category in categories]
+
+    materials_by_category = []
+    for name in names:
+        info = category_index[name]
+        materials_by_category.append({
+            'name': name,
+            'materials': grouped.get(name, []),
+            'is_required': info['is_required'],
+            'is_basic': info['is_basic'],
+            'badge_text': info['badge_text']
+        })
+    if uncategorized:
+        materials_by_category.append({
+            'name': UNCATEGORIZED,
+            'materials': uncategorized
+        })
+
+    return materials_by_category, categories, len(entries)
@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+import subprocess
+from flask import current_app, url_for
+from .signed_media import signed_media_url
+from .models import db
+
+# 培训视频转码
+# 上传后在后台线程中调用本机安装的ffmpeg，为每个视频生成：
+#   - 若干码率的H.264/AAC MP4（带faststart，可边下边播）
+#   - 基于这些MP4切片的HLS播放列表（master.m3u8）
+#   - 封面图poster.jpg
+# 输出保存在 static/uploads/videos/renditions/<视频文件名>/ 下（含扩展名，a.mp4和a.mov互不覆盖），manifest.json记录处理状态。
+# 对账扫描跳过renditions目录（见routes/reconcile.py）。
+# 没有安装ffmpeg时不做任何处理，播放页面继续使用原始文件。
+# 队列只在内存中，工作进程退出（gunicorn按max_requests重启、HUP重新加载）时未完成的任务会丢失，
+# 退出时记录在日志中；Video表中这些视频仍为pending/processing，运行scripts/transcode_videos.py补做。
+
+VIDEO_UPLOAD_FOLDER = os.path.join('static', 'uploads', 'videos')
+RENDITIONS_DIRNAME = 'renditions'
+MANIFEST_FILENAME = 'manifest.json'
+
+# (名称, 高度, 视频码率kbps, 音频码率kbps)
+RENDITIONS = [
+    ('720p', 720, 2500, 128),
+    ('480p', 480, 1200, 96),
+    ('360p', 360, 700, 64),
+]
+HLS_SEGMENT_SECONDS = 6
+# 处理中状态超过该时间，或者处理的进程已不存在，视为已中断，可以重新处理
+STALE_PROCESSING_SECONDS = 6 * 3600
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_manifest_cache = {}
+_current = {'filename': None}
+
+
+def ffmpeg_binary(config=None):
+    """返回ffmpeg可执行文件路径，未安装时返回None"""
+    config = config if config is not None else current_app.config
+    return shutil.which(config.get('FFMPEG_PATH') or 'ffmpeg')
+
+
+def transcode_enabled(config=None):
+    """是否启用了转码并且安装了ffmpeg"""
+    config = config if config is not None else current_app.config
+    return bool(config.get('VIDEO_TRANSCODE_ENABLED', True) and ffmpeg_binary(config))
+
+
+def _ffprobe_binary(ffmpeg):
+    probe = os.path.join(os.path.dirname(ffmpeg), 'ffprobe')
+    return shutil.which(probe) or shutil.which('ffprobe')
+
+
+def rendition_dir(filename):
+    """视频对应的转码输出目录，按完整文件名区分"""
+    return os.path.join(VIDEO_UPLOAD_FOLDER, RENDITIONS_DIRNAME, os.path.basename(filename))
+
+
+def rendition_url_base(filename):
+    """转码输出目录相对视频目录的路径，用于生成签名URL"""
+    return f"{RENDITIONS_DIRNAME}/{os.path.basename(filename)}/"
+
+
+def load_manifest(filename):
+    """读取转码状态，按文件修改时间缓存，不存在时返回None"""
+    path = os.path.join(rendition_dir(filename), MANIFEST_FILENAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _run(cmd, timeout=3600):
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace')[-2000:])
+    return result.stdout.decode('utf-8', 'replace')
+
+
+def probe_video(ffmpeg, source):
+    """获取视频高度和时长，没有ffprobe时返回(None, None)"""
+    ffprobe = _ffprobe_binary(ffmpeg)
+    if not ffprobe:
+        return None, None
+    output = _run([
+        ffprobe, '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=height:format=duration', '-of', 'json', source
+    ], timeout=120)
+    info = json.loads(output or '{}')
+    streams = info.get('streams') or [{}]
+    height = streams[0].get('height')
+    duration = info.get('format', {}).get('duration')
+    return height, float(duration) if duration else None
+
+
+def _select_renditions(source_height):
+    """只生成不高于原视频分辨率的档位，至少保留最低一档"""
+    if not source_height:
+        return list(RENDITIONS)
+    selected = [r for r in RENDITIONS if r[1] <= source_height]
+    return selected or [RENDITIONS[-1]]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _still_processing(manifest):
+    """manifest为processing时，处理它的进程是否可能仍在运行"""
+    if time.time() - manifest.get('started_at', 0) >= STALE_PROCESSING_SECONDS:
+        return False
+    pid = manifest.get('pid')
+    return pid is None or _pid_alive(pid)
+
+
+def transcode_video(filename, ffmpeg=None, force=False):
+    """
+    同步转码一个视频（可在后台线程或脚本中调用）
+
+    Args:
+        filename: VIDEO_UPLOAD_FOLDER中的文件名
+        ffmpeg: ffmpeg路径，None时自动查找
+        force: 为True时忽略已有的转码结果
+
+    Returns:
+        dict: 转码后的manifest；没有ffmpeg时返回None
+    """
+    ffmpeg = ffmpeg or shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+
+    source = os.path.join(VIDEO_UPLOAD_FOLDER, filename)
+    if not os.path.isfile(source):
+        raise FileNotFoundError(source)
+    source_mtime = os.path.getmtime(source)
+
+    output_dir = rendition_dir(filename)
+    existing = load_manifest(filename)
+    if existing and not force and existing.get('source_mtime') == source_mtime:
+        if existing.get('status') == 'ready':
+            return existing
+        if existing.get('status') == 'processing' and _still_processing(existing):
+            return existing
+
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    hls_dir = os.path.join(output_dir, 'hls')
+    os.makedirs(hls_dir, exist_ok=True)
+
+    manifest = {
+        'source': filename,
+        'source_mtime': source_mtime,
+        'status': 'processing',
+        'started_at': time.time(),
+        'pid': os.getpid(),
+        'renditions': [],
+        'hls': None,
+        'poster': None,
+        'duration': None,
+        'error': None
+    }
+    _save_manifest(output_dir, manifest)
+
+    try:
+        height, duration = probe_video(ffmpeg, source)
+        manifest['duration'] = duration
+
+        variants = []
+        for name, target_height, video_kbps, audio_kbps in _select_renditions(height):
+            mp4_name = f'{name}.mp4'
+            _run([
+                ffmpeg, '-y', '-v', 'error', '-i', source,
+                '-vf', f'scale=-2:{target_height}',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+                '-b:v', f'{video_kbps}k', '-maxrate', f'{int(video_kbps * 1.07)}k', '-bufsize', f'{video_kbps * 2}k',
+                '-c:a', 'aac', '-b:a', f'{audio_kbps}k', '-ac', '2',
+                '-movflags', '+faststart',
+                os.path.join(output_dir, mp4_name)
+            ])
+            # 直接从MP4切片，不重新编码
+            _run([
+                ffmpeg, '-y', '-v', 'error', '-i', os.path.join(output_dir, mp4_name),
+                '-c', 'copy', '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS),
+                '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', os.path.join(hls_dir, f'{name}_%04d.ts'),
+                os.path.join(hls_dir, f'{name}.m3u8')
+            ])
+            manifest['renditions'].append({
+                'name': name,
+                'height': target_height,
+                'bitrate': video_kbps + audio_kbps,
+                'file': mp4_name
+            })
+            variants.append((name, target_height, (video_kbps + audio_kbps) * 1000))
+
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+        for name, target_height, bandwidth in variants:
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},NAME="{name}"')
+            lines.append(f'{name}.m3u8')
+        with open(os.path.join(hls_dir, 'master.m3u8'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        manifest['hls'] = 'hls/master.m3u8'
+
+        # 封面图，视频过短时取第一帧
+        poster_path = os.path.join(output_dir, 'poster.jpg')
+        seek = '3' if not duration or duration > 6 else '0'
+        try:
+            _run([ffmpeg, '-y', '-v', 'error', '-ss', seek, '-i', source,
+                  '-frames:v', '1', '-vf', 'scale=-2:360', poster_path], timeout=300)
+            manifest['poster'] = 'poster.jpg'
+        except RuntimeError:
+            pass
+
+        manifest['status'] = 'ready'
+    except Exception as e:
+        manifest['status'] = 'failed'
+        manifest['error'] = str(e)[-2000:]
+    manifest['finished_at'] = time.time()
+    _save_manifest(output_dir, manifest)
+    return manifest
+
+
+def _worker_loop(app):
+    from .video_catalog import fill_video_details, set_rendition_status
+    while True:
+        filename = _queue.get()
+        _current['filename'] = filename
+        try:
+            with app.app_context():
+                # 上传请求中只记录了大小，校验和与时长在这里补全
+                try:
+                    fill_video_details(filename)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"读取视频信息出错: {filename}, 错误: {str(e)}")
+                if not transcode_enabled(app.config):
+                    continue
+                set_rendition_status(filename, 'processing')
+                manifest = transcode_video(filename, ffmpeg=ffmpeg_binary(app.config))
+                if manifest:
+                    set_rendition_status(filename, manifest['status'])
+                if manifest and manifest['status'] == 'failed':
+                    app.logger.error(f"视频转码失败: {filename}, 错误: {manifest['error']}")
+                elif manifest:
+                    app.logger.info(f"视频转码完成: {filename}")
+        except Exception as e:
+            app.logger.error(f"视频转码出错: {filename}, 错误: {str(e)}")
+        finally:
+            _current['filename'] = None
+            with app.app_context():
+                db.session.remove()
+            _queue.task_done()
+
+
+def unfinished_jobs():
+    """本进程中正在处理和排队等待的视频文件名"""
+    jobs = list(_queue.queue)
+    current = _current['filename']
+    return [current] + jobs if current else jobs
+
+
+def enqueue_transcode(filename, app=None):
+    """
+    把视频加入后台处理队列：补全Video记录的校验和与时长，启用了转码并且安装了ffmpeg时再生成多码率版本。
+    需要在Video记录提交之后调用。
+
+    Args:
+        filename: VIDEO_UPLOAD_FOLDER中的文件名
+
+    Returns:
+        bool: 是否会转码
+    """
+    global _worker
+    app = app or current_app._get_current_object()
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, args=(app,), name='video-transcoder', daemon=True)
+            _worker.start()
+    _queue.put(os.path.basename(filename))
+    return transcode_enabled(app.config)
+
+
+def video_sources(filename):
+    """
+    播放页面使用的视频地址（需要在请求上下文中调用）
+
+    Returns:
+        dict: default为默认播放地址，renditions为各档位MP4，hls为自适应码率播放列表，poster为封面
+    """
+    filename = os.path.basename(filename.replace('\\', '/'))
+    sources = {
+        'default': signed_media_url('videos', filename),
+        'renditions': [],
+        'hls': None,
+        'poster': None
+    }
+    manifest = load_manifest(filename)
+    if not manifest or manifest.get('status') != 'ready' or not manifest.get('renditions'):
+        return sources
+
+    base = rendition_url_base(filename)
+    sources['renditions'] = [
+        {'name': r['name'], 'height': r['height'], 'url': signed_media_url('videos', base + r['file'])}
+        for r in manifest['renditions']
+    ]
+    # 默认使用中间档位，兼顾清晰度和加载速度
+    sources['default'] = sources['renditions'][(len(sources['renditions']) - 1) // 2]['url']
+    if manifest.get('hls'):
+        sources['hls'] = url_for('video.video_hls', filename=filename, playlist='master.m3u8')
+    if manifest.get('poster'):
+        sources['poster'] = signed_media_url('videos', base + manifest['poster'])
+    return sources
@@ -1,6 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user, logout_user
-from routes.models import User, Admin, Engineer, Project, CustomerService, Trainee, TrainingMaterial, db
+from routes.models import User, Admin, Engineer, Project, CustomerService, Trainee, TrainingMaterial, ProgressChangeRequest, db
+from routes.training_catalog import get_catalog, query_catalog
+from routes.project_search import search_projects, DEFAULT_LIMIT
+from routes.utils import VALID_PROGRESS_OPTIONS
+from routes.profiles import get_profile, set_profile, current_engineer
+from routes.user_cache import invalidate_user_cache
+from routes.reference_data import get_engineers, get_tags
 from sqlalchemy import text
 from routes.decorators import admin_required, super_admin_required
 from routes.forms import EditSuperAdminForm, EditUserForm  
@@ -26,7 +32,7 @@ def user_panel():
             return redirect(url_for('user.trainee_panel'))
     
     # 原始工程师面板逻辑作为后备
-    engineer = Engineer.query.filter_by(user_id=current_user.id).first()
+    engineer = current_engineer()
     assigned_products = Project.query.filter_by(assigned_engineer_id=engineer.id).filter(Project.status != 'completed').all() if engineer else []
     completed_products = Project.query.filter_by(assigned_engineer_id=engineer.id, status='completed').all() if engineer else []
     
@@ -122,6 +128,7 @@ def edit_user(user_id=None):
             print(f"强制提交数据库变更")
             db.session.commit()
             print(f"数据库提交成功")
+            invalidate_user_cache()
             
             # 强制重新加载数据以确保缓存被清除
             db.session.expire_all()
@@ -164,7 +171,7 @@ def edit_user(user_id=None):
 @super_admin_required
 def edit_super_admin():
     user = User.query.get(current_user.id)
-    admin_info = Admin.query.filter_by(user_id=current_user.id).first()
+    admin_info = get_profile('admin')
     
     if not user or not admin_info:
         flash('管理员信息不存在')
@@ -191,6 +198,7 @@ def edit_super_admin():
         
         try:
             db.session.commit()
+            invalidate_user_cache()
             flash('超级管理员信息更新成功')
             return redirect('/admin')
         except Exception as e:
@@ -210,20 +218,20 @@ def update_profile():
     
     # 预填充表单
     if user.role == 'admin':
-        admin_info = Admin.query.filter_by(user_id=user.id).first()
+        admin_info = get_profile('admin', user)
         form.new_name.data = admin_info.name if admin_info else ''
     elif hasattr(user, 'role_detail'):
         if user.role_detail == 'customer_service':
-            cs_info = CustomerService.query.filter_by(user_id=user.id).first()
+            cs_info = get_profile('customer_service', user)
             form.new_name.data = cs_info.name if cs_info else ''
         elif user.role_detail == 'trainee':
-            trainee_info = Trainee.query.filter_by(user_id=user.id).first()
+            trainee_info = get_profile('trainee', user)
             form.new_name.data = trainee_info.name if trainee_info else ''
         else:
-            engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+            engineer_info = get_profile('engineer', user)
             form.new_name.data = engineer_info.name if engineer_info else ''
     else:
-        engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+        engineer_info = get_profile('engineer', user)
         form.new_name.data = engineer_info.name if engineer_info else ''
     
     if form.validate_on_submit():
@@ -356,16 +364,16 @@ def update_profile():
     # 使用现有的profile.html模板代替缺失的update_profile.html模板
     # 获取用户详细信息
     if user.role == 'admin':
-        user_info = Admin.query.filter_by(user_id=user.id).first()
+        user_info = get_profile('admin', user)
     elif hasattr(user, 'role_detail'):
         if user.role_detail == 'customer_service':
-            user_info = CustomerService.query.filter_by(user_id=user.id).first()
+            user_info = get_profile('customer_service', user)
         elif user.role_detail == 'trainee':
-            user_info = Trainee.query.filter_by(user_id=user.id).first()
+            user_info = get_profile('trainee', user)
         else:
-            user_info = Engineer.query.filter_by(user_id=user.id).first()
+            user_info = get_profile('engineer', user)
     else:
-        user_info = Engineer.query.filter_by(user_id=user.id).first()
+        user_info = get_profile('engineer', user)
     
     return render_template('profile.html', form=form, user=user, user_info=user_info)
 
@@ -380,12 +388,13 @@ def engineer_projects():
        (hasattr(user, 'role_detail') and getattr(user, 'role_detail', '') == 'engineer') or \
        (hasattr(user, 'role_level') and user.role_level == 3):
         # 获取工程师相关数据
-        engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+        engineer_info = get_profile('engineer', user)
         if not engineer_info:
             # 如果没有找到工程师信息，尝试创建一个
             engineer_info = Engineer(user_id=user.id, name=user.username)
             db.session.add(engineer_info)
             db.session.commit()
+            set_profile('engineer', engineer_info)
         
         # 获取分配给该工程师的所有项目
         projects = Project.query.filter_by(assigned_engineer_id=engineer_info.id).all()
@@ -406,12 +415,13 @@ def completed_projects():
        (hasattr(user, 'role_detail') and getattr(user, 'role_detail', '') == 'engineer') or \
        (hasattr(user, 'role_level') and user.role_level == 3):
         # 获取工程师相关数据
-        engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+        engineer_info = get_profile('engineer', user)
         if not engineer_info:
             # 如果没有找到工程师信息，尝试创建一个
             engineer_info = Engineer(user_id=user.id, name=user.username)
             db.session.add(engineer_info)
             db.session.commit()
+            set_profile('engineer', engineer_info)
         
         # 获取该工程师已完成的项目
         completed_products = Project.query.filter_by(assigned_engineer_id=engineer_info.id, status='completed').all()
@@ -436,7 +446,7 @@ def engineer_panel():
         return redirect(url_for('user.user_panel'))
     
     # 获取工程师相关数据
-    engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+    engineer_info = get_profile('engineer', user)
     assigned_products = Project.query.filter_by(assigned_engineer_id=engineer_info.id).filter(Project.status != 'completed').all() if engineer_info else []
     completed_products = Project.query.filter_by(assigned_engineer_id=engineer_info.id, status='completed').all() if engineer_info else []
     
@@ -454,7 +464,7 @@ def customer_service_panel():
         return redirect(url_for('user.user_panel'))
     
     # 获取客服相关数据
-    cs_info = CustomerService.query.filter_by(user_id=user.id).first()
+    cs_info = get_profile('customer_service', user)
     
     return render_template('customer_service_panel.html', customer_service=cs_info)
 
@@ -470,7 +480,7 @@ def trainee_panel():
         return redirect(url_for('user.user_panel'))
     
     # 获取试岗员工相关数据
-    trainee_info = Trainee.query.filter_by(user_id=user.id).first()
+    trainee_info = get_profile('trainee', user)
     
     return render_template('trainee_panel.html', trainee=trainee_info)
 
@@ -493,127 +503,15 @@ def training_materials():
         flash('您没有权限访问此页面')
         return redirect(url_for('user.user_panel'))
     
-    # 获取所有培训资料，按类别和显示顺序排序
-    all_materials = TrainingMaterial.query.order_by(
-        TrainingMaterial.category,
-        TrainingMaterial.display_order
-    ).all()
-    
-    # 添加默认类别选择逻辑
-    if not search_performed and not category_selected and all_materials:
-        # 创建类别集合，确保每个类别只出现一次且去除空白字符
-        categories = set()
-        for material in all_materials:
-            if material.category and material.category.strip():
-                categories.add(material.category.strip())
-        
-        # 如果存在类别，按字母顺序排序并选择第一个
+    # 从进程内缓存的资料目录中筛选，资料未修改时不查询数据库
+    if not search_performed and not category_selected:
+        # 默认选中按名称排序的第一个类别
+        categories = get_catalog()['categories']
         if categories:
-            sorted_categories = sorted(categories)
-            first_category = sorted_categories[0]
-            # 使用重定向确保URL反映当前选中的类别
-            return redirect(url_for('user.training_materials', category=first_category))
-    
-    # 根据搜索关键词和类别过滤资料
-    materials_to_display = all_materials
-    
-    if search_query:
-        materials_to_display = [
-            m for m in materials_to_display 
-            if search_query.lower() in m.title.lower() or 
-               search_query.lower() in (m.description or '').lower() or 
-               search_query.lower() in m.category.lower()
-        ]
-    
-    if selected_category:
-        materials_to_display = [
-            m for m in materials_to_display 
-            if m.category and m.category.strip() == selected_category.strip()
-        ]
-    
-    # 构建类别信息
-    categories_dict = {}
-    for material in all_materials:
-        if material.category and material.category.strip() not in categories_dict:
-            categories_dict[material.category.strip()] = {
-                'name': material.category.strip(),
-                'is_required': material.is_required,
-                'is_basic': getattr(material, 'is_basic', False),
-                'badge_text': '必学' if material.is_required else ('基础' if getattr(material, 'is_basic', False) else '进阶')
-            }
-    
-    # 按类别组织要显示的资料
-    materials_by_category_dict = {}
-    for material in materials_to_display:
-        cat_key = material.category.strip() if material.category else '未分类'
-        if cat_key not in materials_by_category_dict:
-            materials_by_category_dict[cat_key] = []
-        materials_by_category_dict[cat_key].append({
-            'id': material.id,
-            'title': material.title,
-            'description': material.description,
-            'file_path': material.file_path,
-            'file_type': material.file_type,
-            'is_required': material.is_required
-        })
-    
-    # 准备模板所需数据
-    category_list = sorted(categories_dict.values(), key=lambda x: x['name'])
-    formatted_materials = []
-    
-    # 根据是否选择了特定类别来构建数据
-    if category_selected:
-        # 如果选择了特定类别，只构建该类别的数据
-        if selected_category in categories_dict:
-            category = categories_dict[selected_category]
-            category_materials = materials_by_category_dict.get(selected_category, [])
-            formatted_materials.append({
-                'name': selected_category,
-                'materials': category_materials,
-                'is_required': category['is_required'],
-                'is_basic': category['is_basic'],
-                'badge_text': category['badge_text']
-            })
-    else:
-        # 如果没有选择特定类别，构建所有类别的数据
-        for category in category_list:
-            category_materials = materials_by_category_dict.get(category['name'], [])
-            formatted_materials.append({
-                'name': category['name'],
-                'materials': category_materials,
-                'is_required': category['is_required'],
-                'is_basic': category['is_basic'],
-                'badge_text': category['badge_text']
-            })
-    
-    # 确保处理未分类的资料
-    uncategorized_materials = [
-        m for m in materials_to_display 
-        if not m.category or not m.category.strip()
-    ]
-    
-    # 计算总资料数
-    total_materials = len(materials_to_display)
-    if uncategorized_materials:
-        uncategorized_formatted = [
-            {
-                'id': m.id,
-                'title': m.title,
-                'description': m.description,
-                'file_path': m.file_path,
-                'file_type': m.file_type,
-                'is_required': m.is_required
-            }
-            for m in uncategorized_materials
-        ]
-        formatted_materials.append({
-            'name': '未分类',
-            'materials': uncategorized_formatted
-        })
-    
-    # 确保至少传递一个空数组而不是None
-    formatted_materials = formatted_materials or []
-    category_list = category_list or []
+            selected_category = categories[0]['name']
+            category_selected = True
+    
+    formatted_materials, category_list, total_materials = query_catalog(search_query, selected_category)
     
     return render_template(
         'training_materials.html',
@@ -638,6 +536,13 @@ def customer_inquiries():
     
     return render_template('customer_inquiries.html')
 
+def _can_search_projects(user):
+    """客服、管理员和超级管理员可以使用项目查询"""
+    return (user.role == 'customer_service' or 
+            (hasattr(user, 'role_detail') and getattr(user, 'role_detail', '') == 'customer_service') or 
+            user.role == 'admin' or 
+            user.role == 'super_admin')
+
 @user_bp.route('/project_search')
 @login_required
 def project_search():
@@ -645,17 +550,34 @@ def project_search():
     user = current_user
     
     # 验证用户是否为客服、管理员或超级管理员
-    if not (user.role == 'customer_service' or 
-           (hasattr(user, 'role_detail') and getattr(user, 'role_detail', '') == 'customer_service') or 
-           user.role == 'admin' or 
-           user.role == 'super_admin'):
+    if not _can_search_projects(user):
         flash('您没有权限访问此页面')
         return redirect(url_for('user.user_panel'))
     
-    # 获取所有项目用于查询
-    projects = Project.query.all()
+    # 页面只加载筛选条件，项目列表通过查询接口按需获取
+    engineers = sorted(get_engineers(), key=lambda engineer: engineer.name)
+    tags = get_tags(order_by_name=True)
     
-    return render_template('product_search.html', projects=projects)
+    return render_template('product_search.html', engineers=engineers, tags=tags,
+                           progress_options=VALID_PROGRESS_OPTIONS)
+
+@user_bp.route('/api/project_search')
+@login_required
+def project_search_api():
+    """项目查询接口，支持名称前缀/编号、进度、工程师和标签筛选"""
+    if not _can_search_projects(current_user):
+        return jsonify({'error': '没有权限查询项目'}), 403
+    
+    tag_ids = [tag_id for tag_id in request.args.getlist('tag_id', type=int) if tag_id]
+    result = search_projects(
+        keyword=request.args.get('q', ''),
+        progress=request.args.get('progress', ''),
+        engineer_id=request.args.get('engineer_id', type=int),
+        tag_ids=tag_ids,
+        limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+        offset=request.args.get('offset', 0, type=int)
+    )
+    return jsonify(result)
 
 @user_bp.route('/update_project_progress', methods=['POST'])    
 @login_required
@@ -680,7 +602,7 @@ def update_project_progress():
             return redirect(url_for('user.engineer_projects'))
         
         # 获取工程师信息
-        engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+        engineer_info = get_profile('engineer', user)
         if not engineer_info:
             flash('工程师信息不存在')
             return redirect(url_for('user.engineer_projects'))
@@ -761,7 +683,7 @@ def request_progress_change(project_id):
         return redirect(url_for('user.user_panel'))
     
     # 获取工程师信息
-    engineer_info = Engineer.query.filter_by(user_id=user.id).first()
+    engineer_info = get_profile('engineer', user)
     if not engineer_info:
         flash('工程师信息不存在')
         return redirect(url_for('user.engineer_projects'))
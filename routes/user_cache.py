@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from .models import User, db
+from .profiles import PROFILE_MODELS, load_user_with_profiles
+from .metrics import record_cache
+
+# 登录用户缓存
+# 进程内保存 用户ID -> (用户字段, 各角色资料字段) 的只读快照，有效期较短。
+# 命中时直接用快照构造持久化对象并放入当前会话，不查询数据库；视图修改这些对象后照常提交。
+#   - 通过Session修改用户或角色资料（包括登录、会话校验写入active_session_id和批量UPDATE）的事务提交后
+#     更新版本文件，所有工作进程的缓存随之失效；flush时先删除本进程的对应条目
+#   - 原生SQL更新或命令行工具修改用户后调用invalidate_user_cache
+#
+# 相关配置:
+#   USER_CACHE_TTL: 缓存有效期（秒），0表示不缓存
+
+VERSION_FILENAME = 'user_cache.version'
+DEFAULT_TTL = 30
+MAX_ENTRIES = 1024
+
+_cache = {}
+_state = {'stamp': None}
+_lock = threading.Lock()
+
+
+def _version_path(instance_path=None):
+    return os.path.join(instance_path or current_app.instance_path, VERSION_FILENAME)
+
+
+def _current_stamp():
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def invalidate_user_cache(instance_path=None):
+    """
+    使所有进程的用户缓存失效
+
+    Args:
+        instance_path: 实例目录，在应用上下文之外调用（如命令行工具）时需要指定
+    """
+    path = _version_path(instance_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    now_ns = time.time_ns()
+    os.utime(path, ns=(now_ns, now_ns))
+    with _lock:
+        _cache.clear()
+
+
+def forget_user(user_id):
+    """只删除本进程中某个用户的缓存"""
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def _snapshot(obj):
+    if obj is None:
+        return None
+    return tuple((attr.key, getattr(obj, attr.key)) for attr in obj.__mapper__.column_attrs)
+
+
+def _restore(model, snapshot):
+    """用快照构造持久化对象；当前会话中已有同一行时直接使用已有对象"""
+    if snapshot is None:
+        return None
+    values = dict(snapshot)
+    key = db.session.identity_key(model, values['id'])
+    existing = db.session.identity_map.get(key)
+    if existing is not None:
+        return existing
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    db.session.add(obj)
+    return obj
+
+
+def load_user_cached(user_id):
+    """Flask-Login的user_loader，未命中时按load_user_with_profiles查询"""
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    if not ttl:
+        return load_user_with_profiles(user_id)
+
+    stamp = _current_stamp()
+    now = time.monotonic()
+    with _lock:
+        if _state['stamp'] != stamp:
+            _cache.clear()
+            _state['stamp'] = stamp
+        entry = _cache.get(user_id)
+
+    if entry is not None and entry[0] > now:
+        record_cache('user', True)
+        user = _restore(User, entry[1])
+        user._role_profiles = {kind: _restore(PROFILE_MODELS[kind], snapshot) for kind, snapshot in entry[2]}
+        return user
+
+    record_cache('user', False)
+    user = load_user_with_profiles(user_id)
+    if user is None:
+        forget_user(user_id)
+        return None
+    profiles = tuple((kind, _snapshot(profile)) for kind, profile in user._role_profiles.items())
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            _cache.clear()
+        _cache[user_id] = (now + ttl, _snapshot(user), profiles)
+    return user
+
+
+@event.listens_for(Session, 'after_flush')
+def _forget_modified_users(session, flush_context):
+    """通过ORM修改了用户或角色资料时删除本进程的对应缓存，并标记提交后通知其他进程"""
+    profile_models = tuple(PROFILE_MODELS.values())
+    for obj in list(session.dirty) + list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            forget_user(obj.id)
+        elif isinstance(obj, profile_models):
+            forget_user(obj.user_id)
+        else:
+            continue
+        session.info['user_cache_changed'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_changes(orm_execute_state):
+    """批量UPDATE/DELETE/INSERT不经过flush，按语句的目标表判断"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    watched = {User.__tablename__} | {model.__tablename__ for model in PROFILE_MODELS.values()}
+    if table is not None and getattr(table, 'name', None) in watched:
+        orm_execute_state.session.info['user_cache_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('user_cache_changed', False) and has_app_context():
+        invalidate_user_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('user_cache_changed', None)
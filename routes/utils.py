@@ -2,8 +2,34 @@ import os
 import re
 from werkzeug.utils import secure_filename
 
+# 项目进度选项，项目管理、客服查询等页面共用
+VALID_PROGRESS_OPTIONS = [
+    '无方案', '需要方案', '方案未确认', '确认方案不制作',
+    '待制作', '制作中', '完成待确认', '确认不发货',
+    '确认待发货', '已完成', '结单', '售后修改'
+]
+
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'jpg', 'jpeg', 'png', 'gif', 'mp4', 'avi', 'mov', 'wmv', 'md'}
 
+def prefix_upper_bound(prefix):
+    """
+    前缀范围查询的上界：所有以prefix开头的字符串都小于它
+    
+    SQLite默认按UTF-8字节比较，与码点顺序一致；把最后一个字符加1得到上界，
+    不能用 prefix + '\uffff'，否则prefix后面跟U+FFFF以上字符（如CJK扩展B区汉字）的名称会被漏掉
+    
+    Returns:
+        str: 上界；prefix为空或全部由U+10FFFF组成时返回None（没有上界）
+    """
+    prefix = (prefix or '').rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # 代理区不是合法字符，跳到代理区之后
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
 def allowed_file(filename):
     print(f"检查文件类型: {filename}")
     result = '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
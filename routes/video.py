@@ -1,25 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, current_app
-from flask_login import login_required
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, Response
+from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
 import time
 import re
+import shutil
 from .utils import allowed_file, validate_filename
 from .decorators import role_required
+from .file_serving import serve_from_directory
+from .signed_media import signed_media_url
+from .transcode import enqueue_transcode, transcode_enabled, rendition_dir, rendition_url_base
+from .video_catalog import register_video, remove_video, list_videos
+from .models import db
+from werkzeug.security import safe_join
 
 video_bp = Blueprint('video', __name__)
 
-# 视频上传目录
+# 视频上传目录，由create_app创建
 VIDEO_UPLOAD_FOLDER = os.path.join('static', 'uploads', 'videos')
 
-# 确保视频上传目录存在
-if not os.path.exists(VIDEO_UPLOAD_FOLDER):
-    os.makedirs(VIDEO_UPLOAD_FOLDER, exist_ok=True)
-    print(f"创建视频上传目录: {VIDEO_UPLOAD_FOLDER}")
-# 检查目录权限
-if os.path.exists(VIDEO_UPLOAD_FOLDER) and not os.access(VIDEO_UPLOAD_FOLDER, os.W_OK):
-    print(f"警告: 视频上传目录没有写入权限: {VIDEO_UPLOAD_FOLDER}")
-
 @video_bp.route('/upload_video', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
@@ -103,7 +102,15 @@ def upload_video():
                 # 保存文件，添加错误处理
                 try:
                     file.save(file_path)
-                    flash(f'视频文件 "{filename}" 上传成功', 'success')
+                    # 登记到视频目录表，安装了ffmpeg时在后台生成适合网页播放的多码率版本
+                    transcoding = transcode_enabled()
+                    register_video(filename, uploaded_by=current_user.id,
+                                   rendition_status='pending' if transcoding else None)
+                    db.session.commit()
+                    if enqueue_transcode(filename):
+                        flash(f'视频文件 "{filename}" 上传成功，正在后台转码', 'success')
+                    else:
+                        flash(f'视频文件 "{filename}" 上传成功', 'success')
                 except Exception as e:
                     print(f"文件保存错误: {str(e)}")
                     # 检测权限错误并显示中文提示
@@ -122,12 +129,15 @@ def upload_video():
             flash(f'上传过程发生错误: {str(e)}', 'danger')
             return redirect(request.url)
             
-    # 获取当前已上传的视频列表
-    videos = []
-    if os.path.exists(VIDEO_UPLOAD_FOLDER):
-        videos = [f for f in os.listdir(VIDEO_UPLOAD_FOLDER) if allowed_file(f)]
+    # 从视频目录表分页查询已上传的视频
+    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'newest')
+    keyword = request.args.get('search', '').strip()
+    status = request.args.get('status', '')
+    pagination = list_videos(page=page, per_page=20, sort=sort, keyword=keyword, status=status)
         
-    return render_template('upload_video.html', videos=videos)
+    return render_template('upload_video.html', videos=pagination.items, pagination=pagination,
+                           sort=sort, search_query=keyword, status=status)
 
 @video_bp.route('/serve_video/<filename>')
 def serve_video(filename):
@@ -135,7 +145,6 @@ def serve_video(filename):
     # 使用绝对路径以确保在Windows环境下正确工作
     video_upload_folder = os.path.join(current_app.root_path, VIDEO_UPLOAD_FOLDER)
     file_path = os.path.join(video_upload_folder, filename)
-    print(f"服务视频文件: {filename} 来自: {video_upload_folder}")
     
     # 确保文件存在
     if not os.path.exists(file_path):
@@ -151,17 +160,13 @@ def serve_video(filename):
     }
     content_type = mime_types.get(ext, 'application/octet-stream')
     
-    # 使用send_file替代send_from_directory，以便更好地控制响应头
-    from flask import send_file
-    
-    # 发送文件，设置适当的响应头以确保高质量视频传输
-    response = send_file(
-        file_path,
+    # 通过统一的文件发送层发送，支持断点续传、条件请求和代理卸载
+    response = serve_from_directory(
+        video_upload_folder,
+        filename,
         mimetype=content_type,
         as_attachment=False,  # 在线播放而不是下载
-        conditional=True,     # 启用条件请求以支持断点续传
-        etag=True,            # 添加ETag支持缓存优化
-        last_modified=os.path.getmtime(file_path)  # 添加最后修改时间
+        max_age=31536000
     )
     
     # 添加额外的响应头以优化视频播放
@@ -183,9 +188,40 @@ def delete_video(filename):
     file_path = os.path.join(video_upload_folder, filename)
     if os.path.exists(file_path):
         os.remove(file_path)
+        # 同时删除目录记录和转码结果
+        remove_video(filename)
+        db.session.commit()
+        shutil.rmtree(rendition_dir(filename), ignore_errors=True)
         flash(f'视频文件 "{filename}" 已删除', 'success')
         print(f"删除视频文件: {file_path}")
     else:
         print(f"删除失败，文件不存在: {file_path}")
         flash('视频文件不存在', 'danger')
-    return redirect(url_for('video.upload_video'))
\ No newline at end of file
+    return redirect(url_for('video.upload_video'))
+
+@video_bp.route('/video_hls/<filename>/<playlist>')
+@login_required
+def video_hls(filename, playlist):
+    """HLS播放列表，把其中的子列表和切片地址改写为签名URL"""
+    if not playlist.endswith('.m3u8'):
+        abort(404)
+    hls_dir = os.path.join(rendition_dir(filename), 'hls')
+    path = safe_join(os.path.abspath(hls_dir), playlist)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    
+    base = rendition_url_base(filename) + 'hls/'
+    lines = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                if line.endswith('.m3u8'):
+                    line = url_for('video.video_hls', filename=filename, playlist=line)
+                else:
+                    line = signed_media_url('videos', base + line)
+            lines.append(line)
+    
+    response = Response('\n'.join(lines) + '\n', mimetype='application/vnd.apple.mpegurl')
+    response.headers['Cache-Control'] = 'private, max-age=300'
+    return response
@@ -0,0 +1,214 @@
+import os
+import hashlib
+from datetime import datetime
+from .models import Video, User, db
+from .utils import prefix_upper_bound
+from .transcode import VIDEO_UPLOAD_FOLDER, load_manifest, ffmpeg_binary, probe_video
+
+# 视频目录
+# 上传时写入Video表（只记录大小和修改时间），校验和与时长由后台任务补全（见routes/transcode.py），
+# 管理页面从表中分页查询；scan_videos用于把已有文件补录到表中，以及在文件被直接替换或删除后重新对齐
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv'}
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+# 列表页支持的排序方式
+SORT_OPTIONS = {
+    'newest': Video.uploaded_at.desc(),
+    'oldest': Video.uploaded_at.asc(),
+    'name': Video.filename.asc(),
+    'size': Video.size.desc(),
+    'duration': Video.duration.desc(),
+}
+
+
+def is_video_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS
+
+
+def compute_checksum(path):
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _rendition_status(filename):
+    manifest = load_manifest(filename)
+    return manifest.get('status', 'none') if manifest else 'none'
+
+
+def _probe_duration(path):
+    ffmpeg = ffmpeg_binary()
+    if not ffmpeg:
+        return None
+    try:
+        return probe_video(ffmpeg, path)[1]
+    except Exception:
+        return None
+
+
+def _file_fields(filename, details=True):
+    """
+    读取文件的大小和修改时间
+
+    Args:
+        details: 为True时同时计算校验和与时长（大文件需要数秒，不要在请求中使用）
+    """
+    path = os.path.join(VIDEO_UPLOAD_FOLDER, filename)
+    st = os.stat(path)
+    fields = {
+        'size': st.st_size,
+        'file_mtime': st.st_mtime,
+    }
+    if details:
+        fields['checksum'] = compute_checksum(path)
+        fields['duration'] = _probe_duration(path)
+    else:
+        # 文件已变化，旧的校验和与时长不再有效，等待后台补全
+        fields['checksum'] = None
+        fields['duration'] = None
+    return fields
+
+
+def register_video(filename, uploaded_by=None, rendition_status=None):
+    """
+    上传后登记视频（加入当前会话，由调用方提交）
+
+    只读取大小和修改时间；提交后调用enqueue_transcode，由后台任务补全校验和与时长
+
+    Args:
+        filename: VIDEO_UPLOAD_FOLDER中的文件名
+        uploaded_by: 上传者用户ID
+        rendition_status: 转码状态，None时根据转码结果判断
+    """
+    fields = _file_fields(filename, details=False)
+    video = Video.query.filter_by(filename=filename).first()
+    if video is None:
+        video = Video(filename=filename, title=os.path.splitext(filename)[0], uploaded_by=uploaded_by)
+        db.session.add(video)
+    elif uploaded_by:
+        # 同名文件被重新上传
+        video.uploaded_by = uploaded_by
+        video.uploaded_at = datetime.utcnow()
+    for key, value in fields.items():
+        setattr(video, key, value)
+    video.rendition_status = rendition_status or _rendition_status(filename)
+    return video
+
+
+def fill_video_details(filename):
+    """
+    计算校验和与时长并提交（后台任务中调用）
+
+    Returns:
+        bool: 文件不存在时返回False
+    """
+    path = os.path.join(VIDEO_UPLOAD_FOLDER, filename)
+    if not os.path.isfile(path):
+        return False
+    Video.query.filter_by(filename=filename).update({
+        'checksum': compute_checksum(path),
+        'duration': _probe_duration(path),
+        'updated_at': datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    return True
+
+
+def set_rendition_status(filename, status):
+    """更新转码状态并提交"""
+    Video.query.filter_by(filename=filename).update({'rendition_status': status}, synchronize_session=False)
+    db.session.commit()
+
+
+def remove_video(filename):
+    """删除视频记录（加入当前会话，由调用方提交）"""
+    Video.query.filter_by(filename=filename).delete(synchronize_session=False)
+
+
+def scan_videos(prune=False):
+    """
+    对比上传目录和Video表：补录新文件，更新大小或修改时间变化的文件，同步转码状态
+
+    Args:
+        prune: 为True时删除文件已不存在的记录
+
+    Returns:
+        dict: 各类变化的数量和缺失文件列表
+    """
+    on_disk = {}
+    if os.path.isdir(VIDEO_UPLOAD_FOLDER):
+        with os.scandir(VIDEO_UPLOAD_FOLDER) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and is_video_file(entry.name):
+                    st = entry.stat(follow_symlinks=False)
+                    on_disk[entry.name] = (st.st_size, st.st_mtime)
+
+    existing = {
+        filename: (video_id, size, mtime, status)
+        for video_id, filename, size, mtime, status in db.session.query(
+            Video.id, Video.filename, Video.size, Video.file_mtime, Video.rendition_status)
+    }
+
+    stats = {'added': 0, 'updated': 0, 'status_synced': 0, 'pruned': 0, 'missing': []}
+    new_rows = []
+    for filename, (size, mtime) in sorted(on_disk.items()):
+        current = existing.get(filename)
+        if current is None:
+            row = {'filename': filename, 'title': os.path.splitext(filename)[0],
+                   'uploaded_at': datetime.utcfromtimestamp(mtime), 'updated_at': datetime.utcnow(),
+                   'rendition_status': _rendition_status(filename)}
+            row.update(_file_fields(filename))
+            new_rows.append(row)
+            stats['added'] += 1
+            continue
+
+        video_id, old_size, old_mtime, old_status = current
+        values = {}
+        if old_size != size or old_mtime != mtime:
+            values.update(_file_fields(filename))
+            stats['updated'] += 1
+        status = _rendition_status(filename)
+        # 转码任务在排队时目录中还没有manifest，保留pending状态
+        if status != old_status and not (status == 'none' and old_status == 'pending'):
+            values['rendition_status'] = status
+            stats['status_synced'] += 1
+        if values:
+            values['updated_at'] = datetime.utcnow()
+            Video.query.filter_by(id=video_id).update(values, synchronize_session=False)
+
+    if new_rows:
+        db.session.execute(Video.__table__.insert(), new_rows)
+
+    missing = [filename for filename in existing if filename not in on_disk]
+    stats['missing'] = sorted(missing)
+    if prune and missing:
+        stats['pruned'] = Video.query.filter(Video.filename.in_(missing)).delete(synchronize_session=False)
+
+    db.session.commit()
+    return stats
+
+
+def list_videos(page=1, per_page=20, sort='newest', keyword='', status=''):
+    """
+    分页查询视频
+
+    Args:
+        keyword: 文件名前缀
+        status: 转码状态
+    """
+    query = db.session.query(Video, User.username).outerjoin(User, Video.uploaded_by == User.id)
+    keyword = (keyword or '').strip()
+    if keyword:
+        # 前缀范围条件，可以使用filename上的索引
+        upper = prefix_upper_bound(keyword)
+        query = query.filter(Video.filename >= keyword)
+        if upper is not None:
+            query = query.filter(Video.filename < upper)
+    if status:
+        query = query.filter(Video.rendition_status == status)
+    order = SORT_OPTIONS.get(sort, SORT_OPTIONS['newest'])
+    return query.order_by(order, Video.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+
+在独立的数据库（默认 instance/benchmark/bench.db）中用scripts/generate_data.py生成指定规模的模拟数据，
+依次请求登录、项目列表、项目详情、管理员面板、培训资料、文档查看和视频播放等主要接口，
+输出每个接口的吞吐量、p50/p95/p99延迟和平均SQL次数，并可与保存的基准结果对比。
+
+两种运行方式:
+    测试客户端模式（默认）: 在本进程内通过Flask测试客户端顺序请求，结果稳定，适合对比代码改动
+    HTTP模式（--http）: 启动独立的服务进程（安装了gunicorn时使用多个工作进程），
+                       多个并发客户端通过HTTP请求，包含会话、CSRF和网络开销
+
+用法:
+    python scripts/benchmark.py                                  # 默认数据量，测试客户端模式
+    python scripts/benchmark.py --projects 20000 --reseed        # 重新生成更大的数据集
+    python scripts/benchmark.py --http --workers 4 --concurrency 8
+    python scripts/benchmark.py --only projects_list,admin_panel
+    python scripts/benchmark.py --save baseline.json             # 保存结果作为基准
+    python scripts/benchmark.py --baseline baseline.json         # 与基准对比，--fail-on-regression时退化返回1
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.parse
+import urllib.error
+import urllib.request
+import http.cookiejar
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# 项目根目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# 上传目录都是相对项目根目录的路径
+os.chdir(PROJECT_ROOT)
+
+DEFAULT_WORKDIR = os.path.join(PROJECT_ROOT, 'instance', 'benchmark')
+BENCH_PASSWORD = 'bench123456'
+VIDEO_FIXTURE = '_benchmark_fixture.mp4'
+VIDEO_FIXTURE_SIZE = 4 * 1024 * 1024
+VIDEO_RANGE = 'bytes=0-1048575'
+
+# 数据集规模默认比scripts/generate_data.py小，便于反复运行
+DEFAULT_COUNTS = {
+    'users': 50,
+    'engineers': 20,
+    'projects': 2000,
+    'tags': 60,
+    'documents': 400,
+    'archives': 100,
+    'logs': 5000,
+    'fixtures': 10,
+}
+
+
+def _prepare_environment(workdir):
+    """在导入app之前设置环境变量，使应用使用基准测试自己的数据库和目录"""
+    os.makedirs(workdir, exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    os.environ['QUERY_STATS_HEADERS'] = '1'
+    os.environ.setdefault('QUERY_BUDGET', '0')
+    for name in ('PROFILING_SAMPLE_RATE', 'PROFILING_ENDPOINTS', 'PROFILING_USERS'):
+        os.environ.pop(name, None)
+
+
+# ---- 数据准备 ----
+
+BENCH_ROLES = {
+    # 账号前缀: (role, role_level, role_detail, 角色资料表)
+    'bench_admin': ('admin', 1, None, 'Admin'),
+    'bench_engineer': ('engineer', 3, 'engineer', 'Engineer'),
+    'bench_login': ('admin', 1, None, 'Admin'),
+}
+
+
+def ensure_bench_users(count):
+    """
+    基准测试使用的账号：每个并发客户端各有一个管理员和工程师账号（避免登录互斥互相影响），
+    另有只用于登录场景的账号
+    """
+    from werkzeug.security import generate_password_hash
+    from routes import models
+    from routes.models import db, User
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    existing = {username for (username,) in db.session.query(User.username).filter(User.username.like('bench_%'))}
+    for i in range(count):
+        for prefix, (role, role_level, role_detail, profile_model) in BENCH_ROLES.items():
+            username = f'{prefix}{i}'
+            if username in existing:
+                continue
+            user = User(username=username, password=password_hash, role=role, role_level=role_level,
+                        role_detail=role_detail)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(getattr(models, profile_model)(user_id=user.id, name=username))
+    db.session.commit()
+
+
+def prepare_dataset(workdir, counts, seed, reseed):
+    """数据集参数未变化时复用已有数据库"""
+    from app import app
+    from routes.models import db
+    from generate_data import generate
+
+    meta_path = os.path.join(workdir, 'dataset.json')
+    wanted = {'counts': counts, 'seed': seed}
+    current = None
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+
+    with app.app_context():
+        if reseed or current != wanted:
+            started = time.perf_counter()
+            print(f"生成数据集: {counts} (seed={seed})")
+            generate(counts, seed=seed, fixtures_dir=os.path.join(workdir, 'fixtures'),
+                     password=BENCH_PASSWORD, log=lambda message: None)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(wanted, f, ensure_ascii=False)
+            print(f"数据集生成完成，耗时 {time.perf_counter() - started:.1f} 秒")
+        else:
+            db.create_all()
+            print(f"复用已有数据集: {counts} (seed={seed})")
+
+
+def _ensure_video_fixture():
+    from app import app
+    folder = os.path.join(app.root_path, app.config['VIDEO_UPLOAD_FOLDER'])
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, VIDEO_FIXTURE)
+    if not os.path.exists(path) or os.path.getsize(path) != VIDEO_FIXTURE_SIZE:
+        with open(path, 'wb') as f:
+            f.write(random.Random(0).randbytes(VIDEO_FIXTURE_SIZE))
+    return path
+
+
+def _sample_ids():
+    """各场景轮流请求的项目ID和文档ID"""
+    from app import app
+    from routes.models import db, Project, Document
+    with app.app_context():
+        project_ids = [row[0] for row in db.session.query(Project.id).order_by(Project.id).limit(5000)]
+        document_ids = [row[0] for row in db.session.query(Document.id).order_by(Document.id).limit(5000)]
+    rng = random.Random(1)
+    rng.shuffle(project_ids)
+    rng.shuffle(document_ids)
+    return project_ids, document_ids
+
+
+# ---- 场景 ----
+
+class Scenario:
+    def __init__(self, name, path, method='GET', expect=(200,), headers=None, role='admin'):
+        self.name = name
+        self.path = path          # 字符串，或接收序号返回路径的函数
+        self.method = method
+        self.expect = expect
+        self.headers = headers or {}
+        self.role = role          # 使用哪个角色的已登录客户端，None表示每次用新客户端登录
+
+    def path_for(self, index):
+        return self.path(index) if callable(self.path) else self.path
+
+
+def build_scenarios(project_ids, document_ids):
+    scenarios = [
+        Scenario('login', '/login', method='POST', expect=(302,), role=None),
+        Scenario('projects_list', '/project_management/projects_list'),
+        Scenario('admin_panel', '/admin/'),
+        Scenario('training_materials', '/user/training_materials', role='engineer'),
+        Scenario('serve_video', f'/serve_video/{VIDEO_FIXTURE}', expect=(206,), headers={'Range': VIDEO_RANGE}),
+    ]
+    if project_ids:
+        scenarios.insert(2, Scenario('get_project_details',
+                                     lambda i: f'/project_management/get_project_details/{project_ids[i % len(project_ids)]}'))
+    if document_ids:
+        scenarios.insert(-1, Scenario('view_document', lambda i: f'/view_document/{document_ids[i % len(document_ids)]}'))
+    return scenarios
+
+
+# ---- 测试客户端模式 ----
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _login_test_client(app, username):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'{username} 登录失败: {response.status_code}')
+    return client
+
+
+def run_test_client(scenarios, requests_per_scenario, warmup):
+    from app import app
+    from routes.models import db
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    results = {}
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    clients = {'admin': _login_test_client(app, 'bench_admin0'),
+               'engineer': _login_test_client(app, 'bench_engineer0')}
+
+    for scenario in scenarios:
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for i in range(-warmup, requests_per_scenario):
+            if scenario.role:
+                client = clients[scenario.role]
+                request_args = {'headers': scenario.headers}
+            else:
+                client = app.test_client()
+                request_args = {'data': {'username': 'bench_login0', 'password': BENCH_PASSWORD}}
+            if i == 0:
+                started = time.perf_counter()
+            before = counter.count
+            t0 = time.perf_counter()
+            response = client.open(scenario.path_for(i), method=scenario.method, **request_args)
+            response.get_data()
+            elapsed = time.perf_counter() - t0
+            response.close()
+            if i < 0:
+                continue
+            latencies.append(elapsed)
+            queries.append(counter.count - before)
+            if response.status_code not in scenario.expect:
+                errors += 1
+        results[scenario.name] = summarize(latencies, queries, errors, time.perf_counter() - started)
+    return results
+
+
+# ---- HTTP模式 ----
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    """带Cookie的简单HTTP客户端，不跟随重定向"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, path, method='GET', data=None, headers=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            response = self.opener.open(req, timeout=60)
+        except urllib.error.HTTPError as e:
+            response = e
+        with response:
+            content = response.read()
+            return response.status if hasattr(response, 'status') else response.code, response.headers, content
+
+    def login_form(self, username):
+        """打开登录页取得CSRF令牌，返回登录表单数据"""
+        _, _, content = self.request('/login')
+        match = re.search(rb'name="csrf_token"[^>]*value="([^"]+)"', content)
+        data = {'username': username, 'password': BENCH_PASSWORD}
+        if match:
+            data['csrf_token'] = match.group(1).decode()
+        return data
+
+    def login(self, username):
+        return self.request('/login', method='POST', data=self.login_form(username))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers):
+    """启动服务进程：有gunicorn时使用多个工作进程，否则使用werkzeug多线程服务器"""
+    try:
+        import gunicorn  # noqa: F401
+        # 使用生产环境的gunicorn.conf.py，只覆盖进程数、地址和日志级别
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers),
+                   '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app']
+        mode = f'gunicorn {workers} 个工作进程'
+    except ImportError:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port)]
+        mode = 'werkzeug 单进程多线程（未安装gunicorn）'
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=os.environ.copy(),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('服务进程启动失败')
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=2).read()
+            print(f"服务已启动: {base_url}（{mode}）")
+            return process, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError('等待服务启动超时')
+
+
+def _serve(port):
+    from werkzeug.serving import run_simple
+    from app import app
+    run_simple('127.0.0.1', port, app, threaded=True, use_reloader=False)
+
+
+def run_http(scenarios, requests_per_scenario, warmup, workers, concurrency):
+    process, base_url = start_server(_free_port(), workers)
+    try:
+        clients = []
+        for i in range(concurrency):
+            clients.append({})
+            for role in ('admin', 'engineer'):
+                client = HttpClient(base_url)
+                status, _, _ = client.login(f'bench_{role}{i}')
+                if status != 302:
+                    raise RuntimeError(f'bench_{role}{i} 登录失败: {status}')
+                clients[i][role] = client
+
+        results = {}
+        for scenario in scenarios:
+            lock = threading.Lock()
+            latencies, queries, errors = [], [], [0]
+
+            def worker(worker_index, indexes, record):
+                for i in indexes:
+                    if scenario.role:
+                        t0 = time.perf_counter()
+                        status, headers, _ = clients[worker_index][scenario.role].request(
+                            scenario.path_for(i), method=scenario.method, headers=scenario.headers)
+                    else:
+                        client = HttpClient(base_url)
+                        data = client.login_form(f'bench_login{worker_index}')
+                        t0 = time.perf_counter()
+                        status, headers, _ = client.request('/login', method='POST', data=data)
+                    elapsed = time.perf_counter() - t0
+                    if not record:
+                        continue
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(int(headers.get('X-Query-Count', 0)))
+                        if status not in scenario.expect:
+                            errors[0] += 1
+
+            def run(total, record):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    futures = [executor.submit(worker, w, range(w, total, concurrency), record)
+                               for w in range(concurrency)]
+                    for future in futures:
+                        future.result()
+
+            run(warmup, record=False)
+            started = time.perf_counter()
+            run(requests_per_scenario, record=True)
+            results[scenario.name] = summarize(latencies, queries, errors[0], time.perf_counter() - started)
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+# ---- 统计和报告 ----
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, queries, errors, wall_seconds):
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 2),
+        'queries': round(sum(queries) / len(queries), 1) if queries else 0.0,
+    }
+
+
+def print_report(results):
+    print(f"\n{'场景':<22}{'请求':>7}{'错误':>6}{'吞吐(次/秒)':>13}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'SQL/请求':>10}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['requests']:>7}{r['errors']:>6}{r['throughput']:>13}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['queries']:>10}")
+
+
+def _change(new, old):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    与基准结果对比，p95延迟或吞吐量变差超过threshold百分比、或SQL次数增加时视为退化
+
+    Returns:
+        list: 退化的场景名
+    """
+    regressions = []
+    print(f"\n与基准对比（{baseline.get('created_at', '')}，阈值 {threshold}%）")
+    print(f"{'场景':<22}{'p50变化':>10}{'p95变化':>10}{'吞吐变化':>10}{'SQL/请求':>14}")
+    for name, r in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            print(f"{name:<22}{'（基准中没有此场景）':>30}")
+            continue
+        p50 = _change(r['p50_ms'], old['p50_ms'])
+        p95 = _change(r['p95_ms'], old['p95_ms'])
+        throughput = _change(r['throughput'], old['throughput'])
+        regressed = p95 > threshold or throughput < -threshold or r['queries'] > old['queries']
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<22}{p50:>+9.1f}%{p95:>+9.1f}%{throughput:>+9.1f}%"
+              f"{old['queries']:>7} -> {r['queries']:<5}{'  退化' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='主要接口的性能基准测试')
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default, help=f'生成的{name}数量（默认{default}）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，相同种子生成相同的数据')
+    parser.add_argument('--reseed', action='store_true', help='即使参数未变化也重新生成数据')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='数据库和样例文件目录')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数')
+    parser.add_argument('--warmup', type=int, default=10, help='每个场景正式计时前的预热请求数')
+    parser.add_argument('--only', help='只运行指定场景，逗号分隔')
+    parser.add_argument('--http', action='store_true', help='启动服务进程并通过HTTP并发请求')
+    parser.add_argument('--workers', type=int, default=4, help='HTTP模式的gunicorn工作进程数')
+    parser.add_argument('--concurrency', type=int, default=4, help='HTTP模式的并发客户端数')
+    parser.add_argument('--save', help='把结果保存为JSON文件')
+    parser.add_argument('--baseline', help='与之前保存的JSON结果对比')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定为退化的变化百分比')
+    parser.add_argument('--fail-on-regression', action='store_true', help='出现退化时返回退出码1')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        # HTTP模式下没有gunicorn时由父进程以这种方式启动服务（环境变量已由父进程设置）
+        _serve(args.port)
+        return
+
+    workdir = os.path.abspath(args.workdir)
+    _prepare_environment(workdir)
+    counts = {name: getattr(args, name) for name in DEFAULT_COUNTS}
+    prepare_dataset(workdir, counts, args.seed, args.reseed)
+
+    from app import app
+    with app.app_context():
+        ensure_bench_users(max(1, args.concurrency if args.http else 1))
+    video_path = _ensure_video_fixture()
+
+    scenarios = build_scenarios(*_sample_ids())
+    if args.only:
+        wanted = {name.strip() for name in args.only.split(',')}
+        scenarios = [s for s in scenarios if s.name in wanted]
+
+    try:
+        if args.http:
+            results = run_http(scenarios, args.requests, args.warmup, args.workers, args.concurrency)
+        else:
+            results = run_test_client(scenarios, args.requests, args.warmup)
+    finally:
+        os.remove(video_path)
+
+    print_report(results)
+    output = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'mode': 'http' if args.http else 'test_client',
+        'workers': args.workers if args.http else 1,
+        'concurrency': args.concurrency if args.http else 1,
+        'counts': counts,
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.save}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('mode') != output['mode']:
+            print(f"\n注意: 基准结果的运行方式为 {baseline.get('mode')}，本次为 {output['mode']}")
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
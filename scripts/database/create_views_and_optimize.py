@@ -261,6 +261,8 @@ def create_additional_indexes():
                 # 在project表上添加复合索引
                 ('CREATE INDEX IF NOT EXISTS idx_project_engineer_status ON project (assigned_engineer_id, status)'),
                 ('CREATE INDEX IF NOT EXISTS idx_project_created_time ON project (created_time DESC)'),
+                # 客服项目查询按进度筛选并按名称前缀匹配
+                ('CREATE INDEX IF NOT EXISTS idx_project_progress_name ON project (progress, name)'),
                 # 在document表上添加索引
                 ('CREATE INDEX IF NOT EXISTS idx_document_project_type ON document (project_id, type)'),
                 # 在operation_log表上添加复合索引
@@ -268,6 +270,9 @@ def create_additional_indexes():
                 ('CREATE INDEX IF NOT EXISTS idx_log_module_time ON operation_log (module, create_time DESC)'),
                 # 为project_history添加索引
                 ('CREATE INDEX IF NOT EXISTS idx_project_history_time ON project_history (changed_at DESC)'),
+                # 项目时间线按ID倒序分页；替换旧的 (project_id, changed_at) 索引，它无法避免排序
+                ('CREATE INDEX IF NOT EXISTS idx_project_history_project_id ON project_history (project_id, id)'),
+                ('DROP INDEX IF EXISTS idx_project_history_timeline'),
                 # 为document_version添加索引
                 ('CREATE INDEX IF NOT EXISTS idx_doc_version_time ON document_version (uploaded_at DESC)')
             ]
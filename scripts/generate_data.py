@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模拟数据生成脚本
+
+按生产环境的数据规模批量生成用户、工程师、标签、项目、文档（引用磁盘上真实的DOCX/ZIP样例文件）、
+培训资料和操作日志，用于在接近真实的数据量下开发和做性能测试。
+相同的 --seed 生成完全相同的数据；全部使用批量INSERT，10万项目约需几十秒。
+
+默认写入独立的数据库 instance/scale_test.db、样例文件写入 instance/generated_fixtures，不会影响正在使用的数据库
+和上传目录；生成后用
+DATABASE_URL=sqlite:///<数据库路径> python app.py 启动应用即可使用这份数据。
+所有账号的密码相同（--password），超级管理员账号为 admin。
+
+用法:
+    python scripts/generate_data.py                            # 默认规模（10万项目）
+    python scripts/generate_data.py --projects 5000 --logs 0   # 小规模
+    python scripts/generate_data.py --database instance/a.db --seed 7
+    python scripts/generate_data.py --database instance/database.db --force   # 清空并覆盖已有数据库
+"""
+
+import os
+import sys
+import time
+import random
+import zipfile
+import argparse
+from datetime import datetime, timedelta
+
+# 项目根目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# 上传目录都是相对项目根目录的路径
+os.chdir(PROJECT_ROOT)
+
+DEFAULT_DATABASE = os.path.join(PROJECT_ROOT, 'instance', 'scale_test.db')
+# 样例文件放在instance下：不在公开的static目录中，也不会被对账扫描当作上传目录中的孤立文件
+DEFAULT_FIXTURES_DIR = os.path.join(PROJECT_ROOT, 'instance', 'generated_fixtures')
+DEFAULT_PASSWORD = 'admin123'
+BASE_TIME = datetime(2023, 1, 1, 8, 0, 0)
+BATCH_SIZE = 10000
+
+DEFAULT_COUNTS = {
+    'users': 500,          # 客服和试岗员工
+    'engineers': 200,
+    'tags': 300,
+    'projects': 100000,
+    'documents': 60000,
+    'archives': 15000,
+    'logs': 300000,
+    'fixtures': 40,        # 磁盘上的DOCX/ZIP样例文件数（文档记录轮流引用）
+}
+
+# 进度及其在数据中的大致比例
+PROGRESS_WEIGHTS = [
+    ('无方案', 6), ('需要方案', 5), ('方案未确认', 6), ('待制作', 8), ('制作中', 12),
+    ('完成待确认', 6), ('售后修改', 3), ('确认待发货', 4), ('确认不发货', 2), ('确认方案不制作', 3),
+    ('已完成', 35), ('结单', 10),
+]
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈'
+GIVEN_CHARS = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英文辉建华玉兰红志鹏宇浩然思雨子涵欣怡梓轩俊杰'
+REGIONS = ['华东', '华南', '华北', '西南', '东北', '西北', '华中', '长三角', '珠三角', '京津冀']
+CLIENTS = ['星河', '恒信', '远航', '瑞丰', '博雅', '天成', '鼎盛', '蓝海', '云帆', '金桥', '宏达', '启明',
+           '锦程', '华章', '新锐', '同创', '卓越', '东方', '正元', '永联']
+INDUSTRIES = ['物流', '医疗', '教育', '零售', '制造', '餐饮', '地产', '金融', '能源', '农业', '文旅', '政务']
+PRODUCTS = ['仓储管理系统', '小程序商城', '数据看板', '客户关系管理平台', '智能排班系统', '设备监控平台',
+            '会员积分系统', '在线考试系统', '供应链协同平台', '门店收银系统', '财务报销系统', '质检追溯系统',
+            '巡检APP', '预约挂号系统', '电子合同平台', '能耗分析系统']
+SUFFIXES = ['', '', '一期', '二期', '升级版', '定制版', '移动端', '后台改造', '数据迁移', '接口对接']
+TAG_WORDS = ['Python', 'Java', 'Vue', 'React', '小程序', '数据分析', '爬虫', '大屏', '支付', '物联网',
+             '报表', '权限', '工作流', '地图', 'OCR', '音视频', '微服务', '部署', '安卓', 'iOS', '加急', '复杂']
+OPERATIONS = [('查看项目列表', 'project_management', 30), ('获取项目详情', 'project_management', 25),
+              ('login', 'auth', 15), ('编辑项目', 'project_management', 8), ('上传项目资料', 'project_management', 6),
+              ('访问管理员面板', 'admin_blueprint', 6), ('访问用户管理页面', 'admin_blueprint', 3),
+              ('添加项目', 'project_management', 4), ('访问统计页面', 'admin_blueprint', 3)]
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+]
+
+
+def person_name(rng):
+    return rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2))))
+
+
+def project_name(rng):
+    return (f"{rng.choice(REGIONS)}{rng.choice(CLIENTS)}{rng.choice(INDUSTRIES)}"
+            f"{rng.choice(PRODUCTS)}{rng.choice(SUFFIXES)}")
+
+
+def _bulk_insert(table, rows):
+    from routes.models import db
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+# ---- 样例文件 ----
+
+def make_fixtures(fixtures_dir, count, seed):
+    """
+    生成大小不同的DOCX和ZIP样例文件（已存在的文件不重新生成）
+
+    Returns:
+        tuple: (docx文件路径列表, zip文件路径列表)
+    """
+    from docx import Document as DocxDocument
+
+    rng = random.Random(seed)
+    os.makedirs(fixtures_dir, exist_ok=True)
+    docx_paths, zip_paths = [], []
+    for i in range(max(1, count // 2)):
+        paragraphs = rng.randint(10, 400)
+        path = os.path.join(fixtures_dir, f'需求说明_{i:03d}.docx')
+        if not os.path.exists(path):
+            document = DocxDocument()
+            document.add_heading(project_name(rng), level=1)
+            for j in range(paragraphs):
+                if j % 25 == 0:
+                    document.add_heading(f'{j // 25 + 1}. {rng.choice(PRODUCTS)}模块', level=2)
+                document.add_paragraph(f'{j + 1}. 功能说明：{rng.choice(PRODUCTS)}需要支持{rng.choice(TAG_WORDS)}，'
+                                       f'负责人{person_name(rng)}，预计{rng.randint(1, 30)}个工作日完成。')
+            document.save(path)
+        docx_paths.append(path)
+
+        files = rng.randint(5, 600)
+        path = os.path.join(fixtures_dir, f'项目资料_{i:03d}.zip')
+        if not os.path.exists(path):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('README.md', f'# {project_name(rng)}\n\n交付资料包\n')
+                for j in range(files):
+                    folder = rng.choice(['src', 'src/api', 'src/views', 'docs', 'tests', 'static/js', 'static/css'])
+                    archive.writestr(f'{folder}/file_{j}.txt', f'第{j}个文件\n' * rng.randint(1, 200))
+                archive.write(docx_paths[-1], f'docs/{os.path.basename(docx_paths[-1])}')
+        zip_paths.append(path)
+    return docx_paths, zip_paths
+
+
+# ---- 数据 ----
+
+def generate(counts, seed=42, fixtures_dir=DEFAULT_FIXTURES_DIR, password=DEFAULT_PASSWORD, log=print):
+    """
+    清空当前应用上下文的数据库并批量生成数据，需要在app.app_context()中调用
+
+    Args:
+        counts: 各类数据的数量，缺少的键使用DEFAULT_COUNTS
+        seed: 随机种子
+        fixtures_dir: 样例文件目录
+        password: 所有账号的密码
+        log: 进度输出函数
+    """
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import text
+    from routes.models import (db, User, Admin, Engineer, CustomerService, Trainee, Tag, Project, Document,
+                               TrainingMaterial, OperationLog, project_tags)
+
+    counts = {**DEFAULT_COUNTS, **counts}
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(password)
+
+    def step(message):
+        log(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+
+    step('重建数据表')
+    db.drop_all()
+    db.create_all()
+    db.session.execute(text('PRAGMA synchronous = OFF'))
+
+    step(f"用户: 工程师 {counts['engineers']}，其他用户 {counts['users']}")
+    users, admins, engineers, customer_services, trainees = [], [], [], [], []
+    users.append({'id': 1, 'username': 'admin', 'password': password_hash, 'role': 'super_admin',
+                  'role_level': 0, 'role_detail': None, 'created_at': BASE_TIME})
+    admins.append({'user_id': 1, 'name': '系统管理员'})
+    user_id = 1
+    for i in range(counts['engineers']):
+        user_id += 1
+        users.append({'id': user_id, 'username': f'engineer{i:04d}', 'password': password_hash, 'role': 'engineer',
+                      'role_level': 3, 'role_detail': 'engineer',
+                      'created_at': BASE_TIME + timedelta(days=rng.randint(0, 600))})
+        engineers.append({'id': i + 1, 'user_id': user_id, 'name': person_name(rng)})
+    for i in range(counts['users']):
+        user_id += 1
+        is_service = i % 3 == 0
+        users.append({'id': user_id, 'username': f"{'service' if is_service else 'trainee'}{i:04d}",
+                      'password': password_hash, 'role': 'customer_service' if is_service else 'trainee',
+                      'role_level': 3 if is_service else 4,
+                      'role_detail': 'customer_service' if is_service else None,
+                      'created_at': BASE_TIME + timedelta(days=rng.randint(0, 600))})
+        if is_service:
+            customer_services.append({'user_id': user_id, 'name': person_name(rng)})
+        else:
+            trainees.append({'user_id': user_id, 'name': person_name(rng), 'start_date': BASE_TIME,
+                             'evaluation_status': 'pending'})
+    _bulk_insert(User.__table__, users)
+    _bulk_insert(Admin.__table__, admins)
+    _bulk_insert(Engineer.__table__, engineers)
+    _bulk_insert(CustomerService.__table__, customer_services)
+    _bulk_insert(Trainee.__table__, trainees)
+
+    step(f"标签: {counts['tags']}")
+    tag_names = []
+    for i in range(counts['tags']):
+        name = TAG_WORDS[i] if i < len(TAG_WORDS) else f'{rng.choice(INDUSTRIES)}{rng.choice(TAG_WORDS)}{i}'
+        tag_names.append(name)
+    _bulk_insert(Tag.__table__, [{'id': i + 1, 'name': name, 'created_by': 'admin', 'created_by_user_id': 1,
+                                  'created_at': BASE_TIME} for i, name in enumerate(tag_names)])
+
+    step(f"项目: {counts['projects']}")
+    progress_values = [value for value, _ in PROGRESS_WEIGHTS]
+    progress_weights = [weight for _, weight in PROGRESS_WEIGHTS]
+    projects, links = [], []
+    span_minutes = 3 * 365 * 24 * 60
+    for i in range(counts['projects']):
+        created = BASE_TIME + timedelta(minutes=int(i * span_minutes / max(1, counts['projects'])))
+        progress = rng.choices(progress_values, progress_weights)[0]
+        engineer_id = rng.randint(1, counts['engineers']) if counts['engineers'] and progress != '无方案' else None
+        price = round(rng.lognormvariate(7.5, 0.8), 2)
+        projects.append({
+            'id': i + 1,
+            'name': project_name(rng),
+            'project_type': 'custom',
+            'group_name': f"{rng.choice(CLIENTS)}客户{rng.randint(1, 500)}群",
+            'description': f"{rng.choice(INDUSTRIES)}行业{rng.choice(PRODUCTS)}，要求{rng.choice(TAG_WORDS)}",
+            'price': price,
+            'cost': round(price * rng.uniform(0.3, 0.7), 2),
+            'unit_price': None,
+            'assigned_engineer_id': engineer_id,
+            'status': 'completed' if progress in ('已完成', '结单') else 'in_progress',
+            'progress': progress,
+            'created_time': created,
+            'assigned_time': created + timedelta(hours=rng.randint(1, 72)) if engineer_id else None,
+            'completed_time': created + timedelta(days=rng.randint(3, 60)) if progress in ('已完成', '结单') else None,
+            'created_by': 1,
+            'updated_by': 1,
+            'updated_at': created,
+        })
+        for tag_id in rng.sample(range(1, counts['tags'] + 1), min(counts['tags'], rng.choice((0, 1, 1, 2, 2, 3, 4)))):
+            links.append({'project_id': i + 1, 'tag_id': tag_id})
+    _bulk_insert(Project.__table__, projects)
+    _bulk_insert(project_tags, links)
+    del projects, links
+
+    documents_total = counts['documents'] + counts['archives']
+    if counts['projects'] and documents_total:
+        step(f"样例文件: {counts['fixtures']}（{fixtures_dir}）")
+        docx_paths, zip_paths = make_fixtures(fixtures_dir, counts['fixtures'], seed)
+        step(f"文档: {counts['documents']}，压缩包: {counts['archives']}")
+        documents = []
+        for i in range(documents_total):
+            is_archive = i >= counts['documents']
+            path = rng.choice(zip_paths if is_archive else docx_paths)
+            project_id = rng.randint(1, counts['projects'])
+            documents.append({
+                'id': i + 1,
+                'project_id': project_id,
+                'filename': os.path.basename(path),
+                'filepath': path,
+                'type': 'document',
+                'version': 1,
+                'is_latest': True,
+                'uploaded_at': BASE_TIME + timedelta(minutes=rng.randint(0, span_minutes)),
+                'uploaded_by': engineers[rng.randrange(len(engineers))]['user_id'] if engineers else 1,
+                'title': os.path.splitext(os.path.basename(path))[0],
+                'filetype': 'zip' if is_archive else 'docx',
+                'is_package': is_archive,
+            })
+        _bulk_insert(Document.__table__, documents)
+        del documents
+
+    step('培训资料')
+    categories = ['入职培训', '技术规范', '产品知识', '客服话术', '安全规范']
+    _bulk_insert(TrainingMaterial.__table__, [{
+        'category': categories[i % len(categories)], 'title': f'{categories[i % len(categories)]}第{i // len(categories) + 1}讲',
+        'description': f'{rng.choice(PRODUCTS)}相关资料', 'file_path': None, 'file_type': 'document',
+        'is_required': i % 4 == 0, 'display_order': i, 'created_at': BASE_TIME} for i in range(60)])
+
+    if counts['logs']:
+        step(f"操作日志: {counts['logs']}")
+        operation_weights = [weight for _, _, weight in OPERATIONS]
+        usernames = [user['username'] for user in users]
+        logs = []
+        for i in range(counts['logs']):
+            operation, module, _ = rng.choices(OPERATIONS, operation_weights)[0]
+            success = rng.random() > 0.02
+            logs.append({
+                'username': rng.choice(usernames),
+                'operation': operation,
+                'module': module,
+                'ip': f'192.168.{rng.randint(0, 10)}.{rng.randint(2, 254)}',
+                'user_agent': rng.choice(USER_AGENTS),
+                'params': f"{{'project_id': {rng.randint(1, max(1, counts['projects']))}}}" if module == 'project_management' else None,
+                'result': '操作成功' if success else '操作失败: 模拟错误',
+                'success': success,
+                'create_time': BASE_TIME + timedelta(seconds=int(i * span_minutes * 60 / counts['logs'])),
+            })
+            if len(logs) >= BATCH_SIZE:
+                _bulk_insert(OperationLog.__table__, logs)
+                logs = []
+        _bulk_insert(OperationLog.__table__, logs)
+
+    db.session.commit()
+    step('更新统计信息')
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def _invalidate_caches():
+    from routes.user_cache import invalidate_user_cache
+    from routes.reference_data import invalidate_reference_data
+    from routes.training_catalog import invalidate_catalog
+    invalidate_user_cache()
+    invalidate_reference_data()
+    invalidate_catalog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按生产规模生成模拟数据')
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default, help=f'{name}数量（默认{default}）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，相同种子生成相同的数据')
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLite数据库文件')
+    parser.add_argument('--fixtures-dir', default=DEFAULT_FIXTURES_DIR, help='DOCX/ZIP样例文件目录')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='所有生成账号的密码')
+    parser.add_argument('--force', action='store_true', help='数据库中已有数据时仍然清空重建')
+    args = parser.parse_args()
+
+    database = os.path.abspath(args.database)
+    os.makedirs(os.path.dirname(database), exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+
+    from app import app
+    from sqlalchemy import inspect
+    from routes.models import db, Project
+
+    with app.app_context():
+        if inspect(db.engine).has_table(Project.__tablename__) and Project.query.count() and not args.force:
+            print(f"数据库 {database} 中已有项目数据，如需清空重建请加 --force")
+            sys.exit(1)
+
+        started = time.perf_counter()
+        counts = {name: getattr(args, name) for name in DEFAULT_COUNTS}
+        generate(counts, seed=args.seed, fixtures_dir=os.path.abspath(args.fixtures_dir), password=args.password)
+        _invalidate_caches()
+        print(f"\n生成完成，耗时 {time.perf_counter() - started:.1f} 秒，数据库: {database}")
+        print(f"启动: DATABASE_URL=sqlite:///{database} python app.py（账号 admin / {args.password}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件系统/数据库对账脚本
+
+扫描项目资料和上传目录，与Document等表中记录的文件路径对比，
+输出缺失文件的记录和没有被引用的孤立文件。脚本只生成报告，不修改数据库。
+
+用法:
+    python scripts/reconcile_files.py          # 增量扫描
+    python scripts/reconcile_files.py --full   # 忽略上次状态，完整扫描
+"""
+
+import os
+import sys
+import argparse
+
+# 项目根目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# 上传目录都是相对项目根目录的路径
+os.chdir(PROJECT_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件系统/数据库对账')
+    parser.add_argument('--full', action='store_true', help='忽略上次扫描状态，完整扫描')
+    parser.add_argument('--limit', type=int, default=20, help='每类问题最多打印的条数')
+    args = parser.parse_args()
+
+    from app import app
+    from routes.reconcile import run_reconcile, report_path
+
+    with app.app_context():
+        report = run_reconcile(full=args.full)
+        print(f"扫描完成，耗时 {report['duration']} 秒（{'增量' if report['incremental'] else '完整'}扫描）")
+        print(f"重新列举目录: {report['scan']['dirs_listed']}，复用目录: {report['scan']['dirs_reused']}")
+        print(f"磁盘文件总数: {report['total_files']}，"
+              f"新增: {len(report['added_files'])}，修改: {len(report['changed_files'])}，消失: {len(report['removed_files'])}")
+
+        print(f"\n文件缺失的文档记录: {len(report['missing_documents'])}")
+        for doc in report['missing_documents'][:args.limit]:
+            print(f"  文档ID {doc['id']} (项目 {doc['project_id']}): {doc['filepath']}")
+
+        print(f"\n未被引用的孤立文件: {len(report['orphan_files'])}")
+        for item in report['orphan_files'][:args.limit]:
+            print(f"  {item['path']} ({item['size']} 字节)")
+
+        print(f"\n完整报告已保存到: {report_path()}")
+
+
+if __name__ == '__main__':
+    main()
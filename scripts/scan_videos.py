@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+视频目录补录脚本
+
+扫描视频上传目录，把还没有记录的视频写入Video表，更新被替换过的文件信息，
+并同步转码状态。首次部署视频目录表后运行一次即可补录已有视频。
+
+用法:
+    python scripts/scan_videos.py           # 补录和更新
+    python scripts/scan_videos.py --prune   # 同时删除文件已不存在的记录
+"""
+
+import os
+import sys
+import argparse
+
+# 项目根目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# 上传目录都是相对项目根目录的路径
+os.chdir(PROJECT_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频目录补录')
+    parser.add_argument('--prune', action='store_true', help='删除文件已不存在的记录')
+    args = parser.parse_args()
+
+    from app import app
+    from routes.models import db
+    from routes.video_catalog import scan_videos
+
+    with app.app_context():
+        db.create_all()
+        stats = scan_videos(prune=args.prune)
+        print(f"新增: {stats['added']}，更新: {stats['updated']}，同步转码状态: {stats['status_synced']}")
+        if stats['missing']:
+            action = '已删除记录' if args.prune else '可使用--prune删除记录'
+            print(f"\n文件已不存在的视频 {len(stats['missing'])} 个（{action}）:")
+            for filename in stats['missing']:
+                print(f"  {filename}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+培训视频批量转码脚本
+
+为视频上传目录中尚未转码（或原文件已更新）的视频生成多码率MP4、HLS和封面图，
+同时补全视频目录中缺少的校验和与时长，并更新转码状态。
+gunicorn工作进程重启时中断的后台转码任务（日志中有记录）也用本脚本补做。
+需要本机安装ffmpeg，可通过环境变量FFMPEG_PATH指定路径。
+
+用法:
+    python scripts/transcode_videos.py           # 只处理未转码的视频
+    python scripts/transcode_videos.py --force   # 重新转码全部视频
+"""
+
+import os
+import sys
+import argparse
+
+# 项目根目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+# 上传目录都是相对项目根目录的路径
+os.chdir(PROJECT_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='培训视频批量转码')
+    parser.add_argument('--force', action='store_true', help='忽略已有结果，重新转码')
+    args = parser.parse_args()
+
+    from app import app
+    from routes.utils import allowed_file
+    from routes.models import Video
+    from routes.transcode import VIDEO_UPLOAD_FOLDER, ffmpeg_binary, transcode_video
+    from routes.video_catalog import fill_video_details, set_rendition_status
+
+    with app.app_context():
+        ffmpeg = ffmpeg_binary()
+        if not ffmpeg:
+            print('未找到ffmpeg，请安装后重试或设置FFMPEG_PATH')
+            return 1
+
+        videos = sorted(
+            name for name in os.listdir(VIDEO_UPLOAD_FOLDER)
+            if os.path.isfile(os.path.join(VIDEO_UPLOAD_FOLDER, name)) and allowed_file(name)
+        )
+        # 上传后还没来得及由后台任务补全的记录
+        incomplete = {filename for (filename,) in Video.query.filter(Video.checksum.is_(None)).with_entities(Video.filename)}
+        failed = 0
+        for index, name in enumerate(videos, 1):
+            print(f"[{index}/{len(videos)}] {name} ... ", end='', flush=True)
+            if name in incomplete:
+                fill_video_details(name)
+            manifest = transcode_video(name, ffmpeg=ffmpeg, force=args.force)
+            set_rendition_status(name, manifest['status'])
+            if manifest['status'] == 'failed':
+                failed += 1
+                print(f"失败: {manifest['error'][-200:]}")
+            else:
+                print(f"{manifest['status']}，档位: {', '.join(r['name'] for r in manifest['renditions'])}")
+
+        print(f"\n处理完成，共 {len(videos)} 个视频，失败 {failed} 个")
+        return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -764,18 +764,30 @@ function batchDeleteProjects() {
     
     if (selectedIds.length > 0) {
         if (confirm(`确定要删除选中的 ${selectedIds.length} 个项目吗？此操作不可撤销。`)) {
-            const form = document.createElement('form');
-            form.method = 'POST';
-            form.action = '/project_management/batch_delete_projects';
-            
-            const idsInput = document.createElement('input');
-            idsInput.type = 'hidden';
-            idsInput.name = 'project_ids';
-            idsInput.value = JSON.stringify(selectedIds);
-            form.appendChild(idsInput);
-            
-            document.body.appendChild(form);
-            form.submit();
+            const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+            fetch('/project_management/batch_delete_projects', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfMeta ? csrfMeta.getAttribute('content') : ''
+                },
+                body: JSON.stringify({ project_ids: selectedIds })
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    if (data.skipped_ids && data.skipped_ids.length > 0) {
+                        alert(`已删除 ${data.deleted_count} 个项目，${data.skipped_ids.length} 个项目无权限或不存在`);
+                    }
+                    location.reload();
+                } else {
+                    alert('删除失败: ' + (data.error || '未知错误'));
+                }
+            })
+            .catch(error => {
+                console.error('批量删除项目出错:', error);
+                alert('批量删除项目失败，请稍后再试');
+            });
         }
     }
 }
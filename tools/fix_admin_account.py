@@ -120,6 +120,11 @@ def fix_admin_account():
             db.session.commit()
             print("已创建管理员资料")
         
+        # 使运行中应用的登录用户缓存失效
+        sys.path.insert(0, project_root)
+        from routes.user_cache import invalidate_user_cache
+        invalidate_user_cache(os.path.join(project_root, 'instance'))
+        
         print("\n修复完成！请使用以下信息登录:")
         print(f"用户名: {admin_username}")
         print(f"密码: admin123")
@@ -2,6 +2,10 @@ import os
 import sys
 from flask import Flask
 from routes.models import db, User
+from routes.user_cache import invalidate_user_cache
+
+# 项目根目录下的instance目录，与主应用共用
+INSTANCE_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')), 'instance')
 
 # 创建Flask应用实例
 app = Flask(__name__)
@@ -31,6 +35,8 @@ def reset_admin_password():
             
             # 提交更改
             db.session.commit()
+            # 使运行中应用的登录用户缓存失效
+            invalidate_user_cache(INSTANCE_PATH)
             
             print(f"超级管理员密码已重置为: {new_password}")
             print("请使用此密码登录系统，并在登录后立即修改密码")
@@ -50,6 +56,8 @@ def reset_admin_password():
                 
                 # 提交更改
                 db.session.commit()
+                # 使运行中应用的登录用户缓存失效
+                invalidate_user_cache(INSTANCE_PATH)
                 
                 print(f"账号密码已重置为: {new_password}")
                 print("请使用此密码登录系统，并在登录后立即修改密码")
@@ -1,6 +1,7 @@
 import requests
 import time
 import os
+import glob
 
 # 服务器地址
 BASE_URL = 'http://192.168.31.47:5001'
@@ -49,8 +50,9 @@ time.sleep(1)
 print("\n检查日志文件:")
 log_dir = 'logs'
 today = time.strftime('%Y%m%d')
-log_filename = f'error_log_{today}.log'
-log_path = os.path.join(log_dir, log_filename)
+# 每个进程写自己的文件: error_log_<日期>_<进程号>.log，取最近修改的一个
+candidates = glob.glob(os.path.join(log_dir, f'error_log_{today}_*.log'))
+log_path = max(candidates, key=os.path.getmtime) if candidates else os.path.join(log_dir, f'error_log_{today}_*.log')
 
 if os.path.exists(log_path):
     file_size = os.path.getsize(log_path)
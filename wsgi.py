@@ -0,0 +1,19 @@
+"""
+生产环境WSGI入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+配置见gunicorn.conf.py。开启preload_app时本模块只在主进程导入一次，工作进程由主进程fork得到。
+"""
+from app import create_app
+from routes.models import db
+from routes.sqlite_tuning import report_sqlite_settings
+
+app = create_app()
+
+# 在主进程中建表，工作进程不再重复执行；SQLite参数在每个连接建立时设置（见routes/sqlite_tuning.py）
+with app.app_context():
+    db.create_all()
+    report_sqlite_settings(app)
+    # 主进程不处理请求，fork前关闭连接，避免工作进程继承同一个SQLite连接
+    db.engine.dispose()